@@ -3,58 +3,100 @@ import os
 import sys
 from concolic.loader import loaderFactory, generate_quantum_version
 from concolic.explore import ExplorationEngine
+from concolic.search_strategy import strategies
+from concolic.cex_cache import CounterexampleCache
+from concolic.symbolic_types.symbolic_circuit import NewQuantumCircuit
+from quantum_constraint_solver.symqv.gate_cache import gate_cache
+from quantum_constraint_solver.statevector_cache import statevector_cache
 import time
 
-print("Quantum Concolic with dreal")
-
-# 接受命令行指令
-usage = "usage: %prog [options] <path to a *.py file>"
-parser = OptionParser(usage=usage)
-
-parser.add_option("-s", "--start", dest="entry", action="store", help="Specify entry point", default="")
-parser.add_option("-n", "--number", dest="qbit_num", type="int", help="Circuit qubit number", default=3)
-parser.add_option("-m", "--max-iters", dest="max_iters", type="int", help="Run specified number of iterations", default=0)
-parser.add_option("-r", "--repeat", dest="repeat_times", type="int", help="Exection repeated times", default=3)
-
-(options, args) = parser.parse_args()
-
-filename = os.path.abspath(args[0])
-
-# 将目标文件转化为Loader，名字为app
-# app = loaderFactory(filename, options.entry, options.qbit_num)
-
-new_filename = generate_quantum_version(filename, options.entry)
-app = loaderFactory(new_filename, "", options.qbit_num)
-
-if app == None:
-    sys.exit(1)
-
-print("Exploring.......................")
-
-result = None
-
-solver = "z3"
-
-try:
-    engine = ExplorationEngine(funcinv=app.createInvocation(), solver=solver, repeated_times=options.repeat_times)
-    # engine._updateSymbolicParameter("x", 0)
-    # engine._updateSymbolicParameter("qc",[(0.651125781587849-0.09097659994144289j), (0.019986152913620502-0.13175366600751648j), (-0.041714839098245665+0.09434689585540013j), (0.38889892898833905-0.6229896937134527j)])
-    # engine._oneExecution()
-
-    # 进行concolic的探索过程
-    expected_result =  app.get_expected_result()
-    engine.expected = expected_result
-    start_zeus = time.time()
-    generatedInputs, returnVals, path = engine.explore(10)
-    result = app.executionComplete(returnVals)
-    finish_zeus = time.time()
-    print("Finish Time:",finish_zeus-start_zeus)
-
-
-except ImportError:
-    sys.exit(1)
-
-if result is None or result == True:
-    sys.exit(0)
-else:
-    sys.exit(1)
+# 并行探索的worker进程会重新导入这个文件，因此需要保护主程序
+if __name__ == "__main__":
+    print("Quantum Concolic with dreal")
+
+    # 接受命令行指令
+    usage = "usage: %prog [options] <path to a *.py file>"
+    parser = OptionParser(usage=usage)
+
+    parser.add_option("-s", "--start", dest="entry", action="store", help="Specify entry point", default="")
+    parser.add_option("-n", "--number", dest="qbit_num", type="int", help="Circuit qubit number", default=3)
+    parser.add_option("-m", "--max-iters", dest="max_iters", type="int", help="Run specified number of iterations", default=0)
+    parser.add_option("-r", "--repeat", dest="repeat_times", type="int", help="Exection repeated times", default=3)
+    parser.add_option("--sampling", dest="sampling", action="store_true",
+                      help="Estimate state probabilities by sampling with aer_simulator instead of the exact statevector "
+                           "(executions are repeated --repeat times)", default=False)
+    parser.add_option("-w", "--workers", dest="workers", type="int", help="Number of parallel worker processes", default=1)
+    parser.add_option("--strategy", dest="strategy", type="choice", choices=list(strategies.keys()),
+                      help="Search strategy: " + ", ".join(strategies.keys()), default="bfs")
+    parser.add_option("--cache-size", dest="cache_size", type="int", help="Counterexample cache size, 0 disables it", default=1024)
+    parser.add_option("--cache", dest="cache_file", action="store", help="Counterexample cache file shared between runs", default=None)
+    parser.add_option("-k", "--candidates", dest="candidates", type="int",
+                      help="Random initial states evaluated at once for a quantum branch, 1 draws a single state",
+                      default=64)
+    parser.add_option("--quantum-solver", dest="quantum_solver", type="choice", choices=["numeric", "smt"],
+                      help="Solve quantum branches with the quantum constraint solver (numeric: closed form, "
+                           "smt: dReal encoding) before falling back to random candidate states", default=None)
+    parser.add_option("--statevector-cache", dest="statevector_cache_mb", type="int",
+                      help="Memory budget in MB of the cached intermediate statevectors", default=64)
+
+    (options, args) = parser.parse_args()
+
+    NewQuantumCircuit.sampling = options.sampling
+    statevector_cache.max_bytes = options.statevector_cache_mb * 1024 * 1024
+
+    filename = os.path.abspath(args[0])
+
+    # 将目标文件转化为Loader，名字为app
+    # app = loaderFactory(filename, options.entry, options.qbit_num)
+
+    new_filename = generate_quantum_version(filename, options.entry)
+    app = loaderFactory(new_filename, "", options.qbit_num)
+
+    if app == None:
+        sys.exit(1)
+
+    print("Exploring.......................")
+
+    result = None
+
+    solver = "z3"
+
+    try:
+        cache = CounterexampleCache(options.cache_size, options.cache_file) if options.cache_size > 0 else None
+        engine = ExplorationEngine(funcinv=app.createInvocation(), solver=solver, repeated_times=options.repeat_times,
+                                   strategy=options.strategy, cache=cache, candidates=options.candidates,
+                                   quantum_solver=options.quantum_solver)
+        # engine._updateSymbolicParameter("x", 0)
+        # engine._updateSymbolicParameter("qc",[(0.651125781587849-0.09097659994144289j), (0.019986152913620502-0.13175366600751648j), (-0.041714839098245665+0.09434689585540013j), (0.38889892898833905-0.6229896937134527j)])
+        # engine._oneExecution()
+
+        # 进行concolic的探索过程
+        expected_result =  app.get_expected_result()
+        engine.expected = expected_result
+        start_zeus = time.time()
+        if options.workers > 1:
+            # worker进程根据文件路径重新读取目标程序
+            target = (os.path.abspath(new_filename), "", options.qbit_num)
+            generatedInputs, returnVals, path = engine.exploreParallel(options.workers, target, 10)
+        else:
+            generatedInputs, returnVals, path = engine.explore(10)
+        result = app.executionComplete(returnVals)
+        finish_zeus = time.time()
+        print("Finish Time:",finish_zeus-start_zeus)
+        print("Iterations to full coverage:", engine.coverage_iterations)
+        print("Iterations per new result: %.2f" % (len(generatedInputs) / max(len(set(returnVals)), 1)))
+        print(engine.candidateReport())
+        print(engine.solver.report())
+        print(gate_cache.report())
+        print(statevector_cache.report())
+        if cache is not None:
+            print(cache.report())
+
+
+    except ImportError:
+        sys.exit(1)
+
+    if result is None or result == True:
+        sys.exit(0)
+    else:
+        sys.exit(1)
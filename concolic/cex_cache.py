@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import json
+import sqlite3
+
+
+def _canonical(expr):
+    # 不包含具体值的表达式文本，相同结构的约束得到相同的文本
+    # 表达式节点会缓存自己的文本
+    if expr.isVariable():
+        return expr.name
+    return expr.expr.canonical()
+
+
+def constraintKey(asserts, query):
+    # 约束集合的规范形式，和约束的顺序无关
+    # 求解器需要满足的是取反后的query，因此query的结果取反
+    key = set(["%s:%s" % (_canonical(a.symtype), a.result) for a in asserts])
+    key.add("%s:%s" % (_canonical(query.symtype), not query.result))
+    return frozenset(key)
+
+
+class CounterexampleCache:
+    # 和KLEE的counterexample cache一样，缓存约束集合的求解结果
+    # model为None表示该约束集合无解
+    def __init__(self, max_size=1024, path=None, probes=32):
+        self.max_size = max_size
+        self.path = path
+        # probes: 子集/超集查找时最多检查的条目数
+        self.probes = probes
+        self.entries = OrderedDict()
+        # 约束 -> 包含该约束的条目，查找时只检查和当前集合有共同约束的条目
+        self.index = {}
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path is not None:
+            # 多个Zeus.py进程可以通过同一个文件共享缓存
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("CREATE TABLE IF NOT EXISTS cex (key TEXT PRIMARY KEY, model TEXT)")
+            self.db.commit()
+            rows = self.db.execute("SELECT key, model FROM cex ORDER BY rowid DESC LIMIT ?", (max_size,))
+            for (key, model) in reversed(rows.fetchall()):
+                self._insert(frozenset(key.split("\n")), json.loads(model))
+
+    def lookup(self, key, satisfies):
+        # 返回 (是否命中, model)
+        # satisfies(model) 检查一个model是否满足当前的约束集合
+        if key in self.entries:
+            return self._hit(key, self.entries[key])
+
+        subsets = []
+        for k in self._candidates(key):
+            model = self.entries[k]
+            if k <= key:
+                # 无解集合的超集一定无解
+                if model is None:
+                    return self._hit(k, None)
+                subsets.append(k)
+            elif model is not None and k >= key:
+                # 超集的解一定满足当前集合
+                return self._hit(k, model)
+
+        for k in subsets:
+            # 子集的解也可能满足当前集合，需要检查
+            if satisfies(self.entries[k]):
+                return self._hit(k, self.entries[k])
+
+        if self.db is not None:
+            row = self.db.execute("SELECT model FROM cex WHERE key = ?", (self._dbKey(key),)).fetchone()
+            if row is not None:
+                model = json.loads(row[0])
+                self._insert(key, model)
+                return self._hit(key, model)
+
+        self.misses += 1
+        return False, None
+
+    def store(self, key, model):
+        self._insert(key, model)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO cex (key, model) VALUES (?, ?)",
+                            (self._dbKey(key), json.dumps(model)))
+            self.db.commit()
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total > 0 else 0.0
+        return "Counterexample cache: %d hits, %d misses (%.1f%% hit rate)" % (self.hits, self.misses, rate)
+
+    def _hit(self, key, model):
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return True, model
+
+    def _candidates(self, key):
+        # 从包含它的条目最少的约束开始，超集一定包含所有约束，因此都在第一个约束的条目中
+        seen = set()
+        for constraint in sorted(key, key=lambda c: len(self.index.get(c, ()))):
+            for k in self.index.get(constraint, ()):
+                if k in seen:
+                    continue
+                seen.add(k)
+                yield k
+                if len(seen) >= self.probes:
+                    return
+
+    def _insert(self, key, model):
+        if key not in self.entries:
+            for constraint in key:
+                self.index.setdefault(constraint, set()).add(key)
+        self.entries[key] = model
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            (evicted, _) = self.entries.popitem(last=False)
+            for constraint in evicted:
+                keys = self.index[constraint]
+                keys.discard(evicted)
+                if len(keys) == 0:
+                    del self.index[constraint]
+
+    def _dbKey(self, key):
+        return "\n".join(sorted(key))
@@ -1,18 +1,27 @@
-from collections import deque
+from concolic.cex_cache import CounterexampleCache
+from concolic.loader import loaderFactory
 from concolic.path_to_constraint import PathToConstraint
+from concolic.search_strategy import createFrontier
 from concolic.symbolic_types import symbolic_type
-from concolic.symbolic_types import SymbolicType
+from concolic.symbolic_types import SymbolicType, SymbolicCircuit
+from concolic.symbolic_types.symbolic_circuit import NewQuantumCircuit, MeasurementSchedule, state_bounds, \
+    check_bounds_batch
+from quantum_constraint_solver import statevector
 from quantum_constraint_solver.quantum_solver import quantum_constraint_solver
 from concolic.z3_wrap import Z3Wrapper
+import multiprocessing
+import queue
 import random
-import re
 import time
 
+import numpy as np
+
 bin_op = {"==": "!=", "!=": "==", ">": "<", "<": ">"}
 
 
 class ExplorationEngine:
-    def __init__(self, funcinv, solver="z3", repeated_times=10):
+    def __init__(self, funcinv, solver="z3", repeated_times=10, strategy="bfs", cache=None, candidates=64,
+                 quantum_solver=None):
         self.invocation = funcinv
         self.symbolic_inputs = {}
         self.repeated_times = repeated_times
@@ -21,26 +30,48 @@ class ExplorationEngine:
             # 对于函数中每个输入变量，都用对应的构建器产生一个预设值和预设类型
             self.symbolic_inputs[n] = funcinv.createArgumentValue(n)
 
-        self.constraint_to_solve = deque([])
+        # 待求解的约束，由搜索策略决定求解的顺序
+        self.strategy = strategy
+        self.constraint_to_solve = createFrontier(strategy)
         self.num_processed_constraints = 0
+        # 覆盖所有预期输出时所用的迭代次数
+        self.coverage_iterations = None
 
         self.path = PathToConstraint(lambda c: self.addConstraint(c))
 
         # 设定当前需要探索的路径数值
         symbolic_type.SymbolicObject.SI = self.path
 
-        self.solver = Z3Wrapper()
+        # cache是可选的CounterexampleCache，用于复用求解器的结果
+        self.solver = Z3Wrapper(cache)
 
         # outputs
         self.generated_inputs = []
         self.execution_return_values = []
 
+        # 量子分支的候选初始状态：每次抽取candidates个随机状态，只保留能让分支取反的状态
+        # candidates不大于1时和原来一样，只抽取一个随机状态
+        self.candidates = candidates
+        self.candidate_queries = 0
+        self.candidate_found = 0
+        self.candidate_flips = 0
+        self.candidate_total = 0
+
+        # 量子分支的约束求解器："numeric"或"smt"(quantum_constraint_solver的method)，None时不使用
+        # 求解器的结果不能让分支取反时，再使用随机的候选状态
+        self.quantum_solver = quantum_solver
+        self.solver_queries = 0
+        self.solver_flips = 0
+
         # 计时器
         self.start_time = time.time()
 
+        # 是否打印每次执行的输入和新的结果，worker进程中由主进程负责打印
+        self.verbose = True
+
     def addConstraint(self, constraint):
         # 该函数的作用：对于每个约束，保存在constraint_to_solve，并且保存产生这个路径的inputs
-        self.constraint_to_solve.append(constraint)
+        self.constraint_to_solve.add(constraint)
         # 由于约束路径是由一次concrete执行产生的，因此需要保存这个产生路径的inputs
         constraint.inputs = self._getInputs()
 
@@ -50,6 +81,21 @@ class ExplorationEngine:
     def _setInputs(self, d):
         self.symbolic_inputs = d
 
+    def _getInputValues(self, inputs):
+        # 将符号变量还原为可以在进程之间传递的具体值
+        # 对于量子电路，传递的是它的初始量子态
+        values = {}
+        for name in inputs:
+            if isinstance(inputs[name], SymbolicCircuit):
+                values[name] = inputs[name].state
+            else:
+                values[name] = self._getConcrValue(inputs[name])
+        return values
+
+    def _createInputs(self, values):
+        # 根据具体值重新构建符号变量
+        return dict([(name, self.invocation.createArgumentValue(name, values[name])) for name in values])
+
     def _getConcrValue(self, v):
         if isinstance(v, SymbolicType):
             return v.getConcrValue()
@@ -61,16 +107,32 @@ class ExplorationEngine:
         args = self.symbolic_inputs
         inputs = [(k, self._getConcrValue(args[k])) for k in args]
         self.generated_inputs.append(inputs)
+        if not self.verbose:
+            return
         print(inputs)
         if "qc" in self.symbolic_inputs.keys():
             print("qc-state:", self.symbolic_inputs["qc"].state)
 
     def _oneExecution(self, expected_path=None):
         self._recordInputs()
-        self.path.reset(expected_path)
-        
-        # 由于量子程序的输出存在概率的差异，以及每次测量都不一致，因此需要多次重复读取
-        for exe_num in range(self.repeated_times):
+        new_result = False
+
+        # 精确计算概率时量子分支是确定的，执行一次就足够
+        # 采样时量子分支的结果是随机的，不再重复执行等待新的结果，而是按概率从大到小枚举量子分支可能的结果
+        # 最多执行repeated_times次
+        schedule = None
+        repeated_times = self.repeated_times
+        if "qc" in self.symbolic_inputs.keys():
+            if NewQuantumCircuit.sampling:
+                schedule = MeasurementSchedule()
+            else:
+                repeated_times = 1
+        NewQuantumCircuit.schedule = schedule
+
+        for exe_num in range(repeated_times):
+            if schedule is not None and exe_num > 0 and schedule.next() is None:
+                break
+            self.path.reset(expected_path)
             # 每次执行前，都把量子符号电路中保存的gate操作清空
             if "qc" in self.symbolic_inputs.keys():
                 self.symbolic_inputs["qc"].gates = []
@@ -78,11 +140,13 @@ class ExplorationEngine:
             # print("-------------------------------(Result:", ret, ")-------------------------------")
             if ret not in self.execution_return_values:
                 # self.execution_return_values.append(ret)
-                new_result_time = time.time()
-                print("---------------------------(Time:", new_result_time-self.start_time, ")-------------")
-                print("-------------------------------(New Result:", ret, ")-------------------------------")
+                if self.verbose:
+                    new_result_time = time.time()
+                    print("---------------------------(Time:", new_result_time-self.start_time, ")-------------")
+                    print("-------------------------------(New Result:", ret, ")-------------------------------")
                 if expected_path:
                     expected_path.unaccepted_results = []
+                new_result = True
                 break
 
         # print(ret)
@@ -93,6 +157,7 @@ class ExplorationEngine:
         # ret = self.invocation.callFunction(self.symbolic_inputs)
         # print(ret)
         self.execution_return_values.append(ret)
+        self.constraint_to_solve.executionFinished(new_result)
 
     def _isExplorationComplete(self):
         # 判断探索的程度，是否需要探索的路径都被解决
@@ -102,9 +167,137 @@ class ExplorationEngine:
         else:
             return False
 
+    def _isCoverageComplete(self, iterations):
+        # 所有预期的输出都被覆盖时，记录所用的迭代次数，用于比较不同搜索策略的效果
+        if set(self.execution_return_values) != set(self.expected):
+            return False
+        if self.coverage_iterations is None:
+            self.coverage_iterations = iterations
+            print("Full coverage after %d iterations (strategy: %s)" % (iterations, self.strategy))
+        return True
+
     def _updateSymbolicParameter(self, name, val):
         self.symbolic_inputs[name] = self.invocation.createArgumentValue(name, val)
 
+    def _findModel(self, asserts, query):
+        # 求解当前节点取反后的约束，返回新的变量取值
+        if query.getVars() == ["qc"]:
+            # quantum concolic by symQV part
+            if self.quantum_solver is not None:
+                state = self._solveCircuitState(query)
+                if state is not None:
+                    return {"qc": state}
+
+            if self.candidates > 1:
+                return {"qc": self._findCircuitState(asserts, query)}
+
+            # random concolic vector generator
+            state_num = pow(2, self.symbolic_inputs["qc"].qubits_num)
+            complex_num = [complex(random.uniform(-1, 1), random.uniform(-1, 1)) for i in range(state_num)]
+            abs_complex = [abs(i) for i in complex_num]
+            result = [i / sum(abs_complex) for i in complex_num]
+            return {"qc": result}
+        else:
+            return self.solver.findCounterexample(asserts, query)
+
+    def _solveCircuitState(self, query):
+        # 用量子约束求解器计算初始状态，只有在状态向量上确实让分支取反时才使用
+        expr = query.symtype.expr
+        (qc, gates, target, delta) = expr.args
+        num_qubits = self.symbolic_inputs["qc"].qubits_num
+        flag, gates, target_prob = process_qc_constraint(query)
+
+        self.solver_queries += 1
+        try:
+            result = quantum_constraint_solver(num_qubits, gates, target_prob, flag, self.quantum_solver, delta)
+        except Exception as e:
+            print("Quantum constraint solver failed:", e)
+            return None
+        if result is None:
+            return None
+
+        state = np.array(result[0], dtype=complex)
+        norm = np.linalg.norm(state)
+        if not norm > 0:
+            return None
+        state = state / norm
+        probabilities = statevector.probabilities(statevector.simulate(num_qubits, gates, state))
+        satisfied = check_bounds_batch(state_bounds(expr.op, target, delta), probabilities[:, None])[0]
+        if satisfied == bool(query.result):
+            return None
+        self.solver_flips += 1
+        return list(state)
+
+    def _checkCircuitPredicate(self, predicate, states):
+        # 量子分支在每一列候选状态上的结果，所有候选一起经过电路的矩阵(一次矩阵乘法)
+        expr = predicate.symtype.expr
+        (qc, gates, target, delta) = expr.args
+        num_qubits = self.symbolic_inputs["qc"].qubits_num
+        probabilities = np.abs(statevector.unitary(num_qubits, gates) @ states) ** 2
+        return check_bounds_batch(state_bounds(expr.op, target, delta), probabilities)
+
+    def _findCircuitState(self, asserts, query):
+        # 随机抽取的候选状态，在所有候选上同时判断量子分支
+        # 候选还需要满足路径上之前的量子分支，否则执行到不了要取反的分支
+        # 返回第一个满足路径并让分支取反的状态，没有时返回任意一个候选状态
+        num_qubits = self.symbolic_inputs["qc"].qubits_num
+        states = statevector.random_states(num_qubits, self.candidates)
+        reaches = np.ones(self.candidates, dtype=bool)
+        for predicate in asserts:
+            if predicate.getVars() == ["qc"]:
+                reaches &= self._checkCircuitPredicate(predicate, states) == bool(predicate.result)
+        flips = np.nonzero(reaches & (self._checkCircuitPredicate(query, states) != bool(query.result)))[0]
+
+        self.candidate_queries += 1
+        self.candidate_flips += len(flips)
+        self.candidate_total += self.candidates
+        if len(flips) == 0:
+            return list(states[:, 0])
+        self.candidate_found += 1
+        return list(states[:, flips[0]])
+
+    def candidateReport(self):
+        # 单个随机状态让分支取反的比例为p时，不过滤平均需要1/p次迭代
+        if self.quantum_solver is not None:
+            solver_report = "Quantum constraint solver (%s): %d of %d queries flipped\n" % \
+                            (self.quantum_solver, self.solver_flips, self.solver_queries)
+        else:
+            solver_report = ""
+        if self.candidate_queries == 0:
+            return solver_report + "Quantum candidate filter: no quantum queries"
+        rate = self.candidate_flips / self.candidate_total
+        report = "Quantum candidate filter: K=%d, %d of %d queries flipped, %.1f%% of the candidates flip the branch" % \
+                 (self.candidates, self.candidate_found, self.candidate_queries, 100 * rate)
+        if rate > 0:
+            report += " (%.1f iterations per flip with a single random state, %.2f with the filter)" % \
+                      (1 / rate, self.candidate_queries / max(self.candidate_found, 1))
+        return solver_report + report
+
+    def _statsSnapshot(self):
+        # 求解器、量子分支候选和反例缓存的计数，worker进程用它计算每个任务的增量
+        cache = self.solver.cache
+        return {"counters": dict((name, getattr(self, name)) for name in _stat_counters),
+                "query_stats": len(self.solver.query_stats),
+                "cache": (cache.hits, cache.misses) if cache is not None else (0, 0)}
+
+    def _statsSince(self, snapshot):
+        cache = self.solver.cache
+        (hits, misses) = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        return {"counters": dict((name, getattr(self, name) - snapshot["counters"][name])
+                                 for name in _stat_counters),
+                "query_stats": self.solver.query_stats[snapshot["query_stats"]:],
+                "cache": (hits - snapshot["cache"][0], misses - snapshot["cache"][1])}
+
+    def _addStats(self, stats):
+        # 主进程汇总worker的统计数据，报告和串行探索时一致
+        for (name, value) in stats["counters"].items():
+            setattr(self, name, getattr(self, name) + value)
+        self.solver.query_stats.extend(stats["query_stats"])
+        cache = self.solver.cache
+        if cache is not None:
+            cache.hits += stats["cache"][0]
+            cache.misses += stats["cache"][1]
+
     def explore(self, max_iterations=0):
         # 首先先动态执行一次，从而获取这次执行路径上的约束条件
         self._oneExecution()
@@ -116,7 +309,7 @@ class ExplorationEngine:
         # 未能获取所有的结果的情况下，重复路径的探索与生成
         while not self._isExplorationComplete():
             # 获取当前的路径约束
-            selected = self.constraint_to_solve.popleft()
+            selected = self.constraint_to_solve.select()
 
             # print("explore.py:", selected)
 
@@ -131,27 +324,7 @@ class ExplorationEngine:
             # 目标是保证该节点之前的约束不发生改变，只修改当前节点的约束
             asserts, query = selected.getAssertsAndQuery()
 
-            if query.getVars() == ["qc"]:
-                qc_constraint = str(query)
-                # quantum concolic by symQV part
-                # flag, gates, target_prob = process_qc_constraint(qc_constraint)
-                # # print("explore.py Now we use quantum solver!!!!!!!!!!!")
-                # result, time, result_dict = quantum_constraint_solver(self.symbolic_inputs["qc"].qubits_num, \
-                #                                   gates, \
-                #                                   target_prob, \
-                #                                   flag, \
-                #                                   unaccepted_results=selected.unaccepted_results)
-                # selected.unaccepted_results.append(result_dict)
-                # print("Now we finish the solver!!!!!!!!!!!!!!!")
-
-                # random concolic vector generator
-                state_num = pow(2, self.symbolic_inputs["qc"].qubits_num)
-                complex_num = [complex(random.uniform(-1, 1), random.uniform(-1, 1)) for i in range(state_num)]
-                abs_complex = [abs(i) for i in complex_num]
-                result = [i / sum(abs_complex) for i in complex_num]
-                model = {"qc": result}
-            else:
-                model = self.solver.findCounterexample(asserts, query)
+            model = self._findModel(asserts, query)
 
             if model == None:
                 continue
@@ -164,7 +337,7 @@ class ExplorationEngine:
 
             self.num_processed_constraints += 1
 
-            if set(self.execution_return_values) == set(self.expected):
+            if self._isCoverageComplete(iterations):
                 break
 
             if max_iterations != 0 and iterations >= max_iterations:
@@ -172,23 +345,135 @@ class ExplorationEngine:
 
         return self.generated_inputs, self.execution_return_values, self.path
 
+    def exploreParallel(self, workers, target, max_iterations=0):
+        # 并行探索：主进程维护约束树并合并结果，worker进程负责求解约束和执行目标程序
+        # target 是 (filename, entry, qbit_num)，worker进程需要根据它重新读取目标程序
+        self._oneExecution()
+
+        iterations = 1
+        if max_iterations != 0 and iterations >= max_iterations:
+            return self.generated_inputs, self.execution_return_values, self.path
+
+        results = queue.Queue()
+
+        def failed(e):
+            print("Worker failed:", e)
+            results.put(None)
+
+        # 使用spawn，保证worker进程中目标程序是重新读取的，并且在Windows上也可以运行
+        # 每个worker使用和主进程相同设置的缓存，有缓存文件时所有进程共享同一个文件
+        cache = self.solver.cache
+        cache_args = (cache.max_size, cache.path) if cache is not None else (0, None)
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_initWorker,
+                                                         initargs=tuple(target) + (self.repeated_times,
+                                                                                   NewQuantumCircuit.sampling,
+                                                                                   self.candidates,
+                                                                                   self.quantum_solver) + cache_args)
+        running = 0
+        try:
+            while True:
+                # 让每个worker进程都拿到一个待求解的约束
+                while running < workers and not self._isExplorationComplete():
+                    selected = self.constraint_to_solve.select()
+                    if selected.processed:
+                        continue
+                    asserts, query = selected.getAssertsAndQuery()
+                    pool.apply_async(_workerExplore,
+                                     (self._getInputValues(selected.inputs), asserts, query,
+                                      self.execution_return_values),
+                                     callback=results.put, error_callback=failed)
+                    running += 1
+
+                if running == 0:
+                    break
+
+                result = results.get()
+                running -= 1
+                if result is None:
+                    continue
+                stats, result = result
+                self._addStats(stats)
+                if result is None:
+                    continue
+
+                # 记录worker的输入和输出，并将它的执行路径合并到约束树上
+                values, ret, predicates = result
+                self._setInputs(self._createInputs(values))
+                self._recordInputs()
+                self.path.mergePath(predicates)
+                self.constraint_to_solve.executionFinished(ret not in self.execution_return_values)
+                if ret not in self.execution_return_values:
+                    new_result_time = time.time()
+                    print("---------------------------(Time:", new_result_time-self.start_time, ")-------------")
+                    print("-------------------------------(New Result:", ret, ")-------------------------------")
+                self.execution_return_values.append(ret)
+                iterations += 1
+
+                self.num_processed_constraints += 1
+
+                if self._isCoverageComplete(iterations):
+                    break
+
+                if max_iterations != 0 and iterations >= max_iterations:
+                    break
+        finally:
+            pool.terminate()
+
+        return self.generated_inputs, self.execution_return_values, self.path
+
+
+# worker进程中的探索引擎，由_initWorker创建
+_worker = None
+
+# 由worker进程返回给主进程汇总的计数器
+_stat_counters = ["candidate_queries", "candidate_found", "candidate_flips", "candidate_total",
+                  "solver_queries", "solver_flips"]
+
+
+def _initWorker(filename, entry, qbit_num, repeated_times, sampling, candidates, quantum_solver, cache_size,
+                cache_path):
+    global _worker
+    NewQuantumCircuit.sampling = sampling
+    app = loaderFactory(filename, entry, qbit_num)
+    cache = CounterexampleCache(cache_size, cache_path) if cache_size > 0 else None
+    _worker = ExplorationEngine(funcinv=app.createInvocation(), repeated_times=repeated_times, cache=cache,
+                                candidates=candidates, quantum_solver=quantum_solver)
+    _worker.verbose = False
+
+
+def _workerExplore(values, asserts, query, return_values):
+    # 在worker进程中求解一个约束并执行目标程序
+    # 返回 (统计数据的增量, (新的输入, 执行结果, 执行路径上的predicates))，无解时后者为None
+    engine = _worker
+    snapshot = engine._statsSnapshot()
+    engine._setInputs(engine._createInputs(values))
+    model = engine._findModel(asserts, query)
+    if model == None:
+        return engine._statsSince(snapshot), None
+    for name in model.keys():
+        engine._updateSymbolicParameter(name, model[name])
+
+    # 约束树由主进程维护，worker只需要记录这一次执行的路径
+    engine.path = PathToConstraint(lambda c: None)
+    symbolic_type.SymbolicObject.SI = engine.path
+    engine.generated_inputs = []
+    engine.execution_return_values = list(return_values)
+    engine._oneExecution()
+    return engine._statsSince(snapshot), (engine._getInputValues(engine.symbolic_inputs),
+                                          engine.execution_return_values[-1], engine.path.getCurrentPath())
+
 
 def process_qc_constraint(qc_constraint):
-    if "False" in qc_constraint:
-        flag = qc_constraint.split("{")[0][1:]
+    # 量子分支的表达式为 (op qc gates target delta)，门和目标概率直接从表达式中读取
+    expr = qc_constraint.symtype.expr
+    (qc, gates, target, delta) = expr.args
+    if qc_constraint.result == False:
+        flag = expr.op
     else:
-        flag = bin_op[qc_constraint.split("{")[0][1:]]
-
+        flag = bin_op[expr.op]
 
     if flag == "==" or flag == "!=":
-        matches = re.findall(r'\[[^\]]*\]', qc_constraint)
-        gates = eval(matches[0])
-        target_prob = eval(matches[-1])
+        target_prob = list(target)
     elif flag == ">" or flag == "<":
-        matches = re.findall(r'\[[^\]]*\]', qc_constraint)
-        gates = eval(matches[0])
-        target_prob = []
-        for i in matches[2:]:
-            i = i.replace("[[", "[")
-            target_prob.append(eval(i))
-    return flag, gates, target_prob
+        target_prob = [list(t) for t in target]
+    return flag, list(gates), target_prob
@@ -68,6 +68,36 @@ class PathToConstraint:
         # 锁定当前的约束节点目标为c
         self.current_constraint = c
 
+    def getCurrentPath(self):
+        # 返回从根节点到当前约束节点的所有predicate，用于在进程之间传递一次执行的路径
+        path = []
+        tmp = self.current_constraint
+        while tmp.predicate is not None:
+            path.append(tmp.predicate)
+            tmp = tmp.parent
+        path.reverse()
+        return path
+
+    def mergePath(self, predicates):
+        # 将其他进程中执行得到的路径合并到当前的约束树上
+        # 和whichBranch的逻辑一致：新出现的节点会通过add变为待求解的约束
+        self.current_constraint = self.root_constraint
+        for p in predicates:
+            p.negate()
+            cneg = self.current_constraint.findChild(p)
+            p.negate()
+            c = self.current_constraint.findChild(p)
+
+            if c is None:
+                c = self.current_constraint.addChild(p)
+                self.add(c)
+
+            if cneg is not None:
+                cneg.processed = True
+                c.processed = True
+
+            self.current_constraint = c
+
 
 
 
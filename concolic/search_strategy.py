@@ -0,0 +1,149 @@
+from collections import deque
+import heapq
+import random
+
+
+class Frontier:
+    # 待求解约束的集合，不同的搜索策略决定下一个被求解的约束
+    def add(self, constraint):
+        raise NotImplementedError()
+
+    def select(self):
+        # 取出下一个需要求解的约束
+        raise NotImplementedError()
+
+    def executionFinished(self, new_result):
+        # 每次执行结束后调用，new_result表示这次执行是否产生了新的输出
+        pass
+
+    def __len__(self):
+        raise NotImplementedError()
+
+
+class BFSFrontier(Frontier):
+    # 先进先出，按照约束树的层次进行探索
+    def __init__(self):
+        self.constraints = deque([])
+
+    def add(self, constraint):
+        self.constraints.append(constraint)
+
+    def select(self):
+        return self.constraints.popleft()
+
+    def __len__(self):
+        return len(self.constraints)
+
+
+class DFSFrontier(Frontier):
+    # 后进先出，优先探索最近一次执行产生的最深的约束
+    def __init__(self):
+        self.constraints = []
+
+    def add(self, constraint):
+        self.constraints.append(constraint)
+
+    def select(self):
+        return self.constraints.pop()
+
+    def __len__(self):
+        return len(self.constraints)
+
+
+class RandomPathFrontier(Frontier):
+    # 和KLEE的random-path一样：从根节点出发，每一层随机选择一个含有待求解约束的子树
+    # 因此浅层的约束被选中的概率更高，而不会被某一条很深的路径淹没
+    def __init__(self):
+        self.pending = set()
+        # 每个节点的子树中待求解约束的数量
+        self.counts = {}
+        self.root = None
+
+    def add(self, constraint):
+        self.pending.add(constraint.id)
+        tmp = constraint
+        while tmp is not None:
+            self.counts[tmp.id] = self.counts.get(tmp.id, 0) + 1
+            if tmp.parent is None:
+                self.root = tmp
+            tmp = tmp.parent
+
+    def select(self):
+        node = self.root
+        while True:
+            candidates = [c for c in node.children if self.counts.get(c.id, 0) > 0]
+            if node.id in self.pending:
+                candidates.append(node)
+            selected = random.choice(candidates)
+            if selected is node:
+                break
+            node = selected
+
+        self.pending.remove(node.id)
+        tmp = node
+        while tmp is not None:
+            self.counts[tmp.id] -= 1
+            tmp = tmp.parent
+        return node
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class ShortestPathFrontier(Frontier):
+    # 优先求解路径最短的约束，路径长度由Constraint.getLength计算
+    def __init__(self):
+        self.constraints = []
+
+    def add(self, constraint):
+        # id保证长度相同的约束按照创建顺序取出
+        heapq.heappush(self.constraints, (constraint.getLength(), constraint.id, constraint))
+
+    def select(self):
+        return heapq.heappop(self.constraints)[2]
+
+    def __len__(self):
+        return len(self.constraints)
+
+
+class NewResultFirstFrontier(Frontier):
+    # 如果一次执行产生了新的输出，那么这次执行中产生的约束优先被求解
+    # 同一个优先级内部按照先进先出的顺序
+    def __init__(self):
+        self.promising = deque([])
+        self.others = deque([])
+        # 当前这次执行中新增的约束
+        self.recent = []
+
+    def add(self, constraint):
+        self.recent.append(constraint)
+
+    def executionFinished(self, new_result):
+        if new_result:
+            self.promising.extend(self.recent)
+        else:
+            self.others.extend(self.recent)
+        self.recent = []
+
+    def select(self):
+        if len(self.recent) > 0:
+            self.executionFinished(False)
+        if len(self.promising) > 0:
+            return self.promising.popleft()
+        return self.others.popleft()
+
+    def __len__(self):
+        return len(self.promising) + len(self.others) + len(self.recent)
+
+
+strategies = {"bfs": BFSFrontier,
+              "dfs": DFSFrontier,
+              "random-path": RandomPathFrontier,
+              "shortest": ShortestPathFrontier,
+              "new-result": NewResultFirstFrontier}
+
+
+def createFrontier(strategy):
+    if strategy not in strategies:
+        raise ValueError("Unknown search strategy: %s" % strategy)
+    return strategies[strategy]()
@@ -0,0 +1,124 @@
+import weakref
+
+from concolic.symbolic_types.symbolic_type import SymbolicType, SymbolicExpr, makeExpr, _exprKey
+
+
+# 在构建整数表达式时进行化简：
+# 常数直接计算，线性的部分(+, -, 乘以常数)整理为按照固定顺序排列的项之和，
+# == 和 != 两边的线性部分移到左边，常数移到右边
+# 这些变换在整数和定长的bitvector上都成立，因此不会影响求解的结果
+# < 这类比较在bitvector上移项会受到溢出的影响，因此不做移项
+
+# 已经计算过的线性形式，key为表达式节点
+_forms = weakref.WeakKeyDictionary()
+
+
+def _isConstant(e):
+    # bool和浮点数不参与线性化
+    return type(e) is int
+
+
+def _termKey(e):
+    # 同一个变量可能对应多个对象(例如化简后重新创建的变量)，按名字合并
+    return ("var", e.name) if isinstance(e, SymbolicType) else _exprKey(e)
+
+
+def _atom(e):
+    # 不能继续展开的项，系数为1
+    return ({_termKey(e): (e, 1)}, 0)
+
+
+def _linear(e):
+    # 返回 (terms, const)，terms中每一项为 key -> (atom, 系数)
+    # 不是整数表达式时返回None
+    if _isConstant(e):
+        return ({}, e)
+    elif isinstance(e, SymbolicType):
+        return _atom(e)
+    elif not isinstance(e, SymbolicExpr):
+        return None
+
+    form = _forms.get(e)
+    if form is not None:
+        return form
+
+    form = None
+    if e.op in ("+", "-", "*"):
+        form = _combine(e.op, _linear(e.args[0]), _linear(e.args[1]))
+    if form is None:
+        return _atom(e)
+    _forms[e] = form
+    return form
+
+
+def _combine(op, left, right):
+    if left is None or right is None:
+        return None
+    if op == "*":
+        # 只有乘以常数的情况是线性的
+        if len(left[0]) == 0:
+            return _scale(right, left[1])
+        elif len(right[0]) == 0:
+            return _scale(left, right[1])
+        return None
+
+    sign = 1 if op == "+" else -1
+    terms = dict(left[0])
+    for (key, (atom, coef)) in right[0].items():
+        old = terms[key][1] if key in terms else 0
+        terms[key] = (atom, old + sign * coef)
+    return (terms, left[1] + sign * right[1])
+
+
+def _scale(form, factor):
+    terms = dict([(key, (atom, coef * factor)) for (key, (atom, coef)) in form[0].items()])
+    return (terms, form[1] * factor)
+
+
+def _term(atom, coef):
+    return atom if coef == 1 else makeExpr("*", [atom, coef])
+
+
+def _build(terms, const):
+    # 按照项的文本排序，保证相同的线性表达式得到相同的节点
+    items = [(atom, coef) for (atom, coef) in terms.values() if coef != 0]
+    items.sort(key=lambda t: t[0].canonical() if isinstance(t[0], SymbolicExpr) else t[0].name)
+
+    expr = None
+    for (atom, coef) in items:
+        if expr is None:
+            expr = _term(atom, coef)
+        elif coef > 0:
+            expr = makeExpr("+", [expr, _term(atom, coef)])
+        else:
+            expr = makeExpr("-", [expr, _term(atom, -coef)])
+
+    if expr is None:
+        return const
+    if const > 0:
+        expr = makeExpr("+", [expr, const])
+    elif const < 0:
+        expr = makeExpr("-", [expr, -const])
+    if isinstance(expr, SymbolicExpr) and not (len(items) == 1 and expr is items[0][0]):
+        _forms[expr] = (dict([(_termKey(atom), (atom, coef)) for (atom, coef) in items]), const)
+    return expr
+
+
+def simplify(op, args):
+    # 返回化简后的表达式：表达式节点，单独的变量，或者常数
+    if op in ("+", "-", "*") and len(args) == 2:
+        form = _combine(op, _linear(args[0]), _linear(args[1]))
+        if form is not None:
+            return _build(form[0], form[1])
+
+    elif op in ("==", "!=") and len(args) == 2:
+        form = _combine("-", _linear(args[0]), _linear(args[1]))
+        if form is not None:
+            (terms, const) = form
+            lhs = _build(terms, 0)
+            if not isinstance(lhs, (SymbolicExpr, SymbolicType)):
+                # 两边相减之后不再包含变量
+                return (const == 0) == (op == "==")
+            return makeExpr(op, [lhs, -const])
+
+    return makeExpr(op, args)
@@ -0,0 +1,228 @@
+from typing import Optional
+
+from concolic.symbolic_types.symbolic_int import SymbolicObject, SymbolicInteger
+from qiskit import QuantumCircuit, Aer, transpile
+from qiskit.quantum_info import Statevector
+import numpy as np
+import math
+
+from quantum_constraint_solver.gate_ops import make_gate_op
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.statevector_cache import statevector_cache
+
+
+def _normal_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def frequency_probability(p, low, high, shots):
+    # 采样shots次时，概率为p的状态的频率落在[low, high]中的概率(二项分布的正态近似)
+    low_count = math.ceil(max(low, 0) * shots - 1e-9)
+    high_count = math.floor(min(high, 1) * shots + 1e-9)
+    if low_count > high_count:
+        return 0.0
+    mean = p * shots
+    sd = math.sqrt(shots * p * (1 - p))
+    if sd == 0:
+        return 1.0 if low_count <= mean <= high_count else 0.0
+    return max(_normal_cdf((high_count + 0.5 - mean) / sd) - _normal_cdf((low_count - 0.5 - mean) / sd), 0.0)
+
+
+def state_bounds(op, target_probability, delta):
+    # check_state_eq/gt/lt对应的每个状态的概率范围(状态, 下界, 上界)，op和量子分支表达式中的相同
+    if op == "==":
+        return [(i, target_probability[i] - delta, target_probability[i] + delta)
+                for i in range(len(target_probability))]
+    elif op == ">":
+        return [(target_state, prob - delta, float("inf")) for (target_state, prob) in target_probability]
+    elif op == "<":
+        return [(target_state, float("-inf"), prob + delta) for (target_state, prob) in target_probability]
+    raise ValueError("Unsupported quantum predicate: %s" % op)
+
+
+def check_bounds_batch(bounds, probabilities):
+    # probabilities的每一列是一个状态向量的概率，返回每一列是否满足所有的范围
+    satisfied = np.ones(probabilities.shape[1], dtype=bool)
+    for (state, low, high) in bounds:
+        satisfied &= (low <= probabilities[state]) & (probabilities[state] <= high)
+    return satisfied
+
+
+class MeasurementSchedule:
+    # 采样模式下量子分支的结果是随机的，把每个量子分支的结果作为一个分支维度
+    # 每次执行时按照forced依次决定量子分支的结果，之后的分支选择概率较大的结果
+    # 另一个结果的概率不可忽略时，记录下来，之后按照路径的概率从大到小执行
+    def __init__(self, threshold=0.001):
+        self.threshold = threshold
+        self.pending = []
+        self.forced = []
+        self.taken = []
+        self.probability = 1.0
+
+    def start(self, forced, probability=1.0):
+        self.forced = forced
+        self.taken = []
+        self.probability = probability
+
+    def next(self):
+        # 概率最大的未执行的结果序列，没有时返回None
+        if len(self.pending) == 0:
+            return None
+        self.pending.sort(key=lambda alternative: alternative[0])
+        (probability, forced) = self.pending.pop()
+        self.start(forced, probability)
+        return forced
+
+    def decide(self, probability_true):
+        index = len(self.taken)
+        if index < len(self.forced):
+            outcome = self.forced[index]
+        else:
+            outcome = probability_true >= 0.5
+            probability_other = 1 - probability_true if outcome else probability_true
+            if self.probability * probability_other > self.threshold:
+                self.pending.append((self.probability * probability_other, self.taken + [not outcome]))
+            self.probability *= 1 - probability_other
+        self.taken.append(outcome)
+        return outcome
+
+
+class NewQuantumCircuit(QuantumCircuit):
+    # 默认根据状态向量精确计算每个状态的概率，分支的结果是确定的
+    # sampling为True时进行repeat次测量采样，用频率估计概率
+    # 符号电路的具体值使用内置的状态向量模拟器计算和采样，其他电路使用qiskit的Statevector和aer_simulator
+    sampling = False
+    # 采样模式下由探索引擎设置，量子分支的结果不再随机采样，而是由schedule按概率依次枚举
+    schedule = None
+
+    def __init__(self, qubits_num, repeat=100000, sampling=None):
+        QuantumCircuit.__init__(self, qubits_num)
+        self.repeat = repeat
+        if sampling is not None:
+            self.sampling = sampling
+        # 由符号电路设置：初始状态和依次执行的GateOp，设置后使用内置的状态向量模拟器
+        self.initial_state = None
+        self.gate_ops = None
+
+    def exact_probabilities(self):
+        # 第i项是测量得到状态i的概率(qiskit的qubit顺序)
+        if self.gate_ops is not None:
+            # 不同的执行共享门序列的前缀，从缓存的中间状态继续模拟
+            return statevector.probabilities(
+                statevector_cache.simulate(self.num_qubits, self.gate_ops, self.initial_state))
+        return Statevector(self).probabilities()
+
+    def probabilities(self):
+        if not self.sampling:
+            return self.exact_probabilities()
+        if self.gate_ops is not None:
+            return statevector.sample(self.exact_probabilities(), self.repeat)[0] / self.repeat
+        qc = self.copy()
+        qc.measure_all()
+        simulator = Aer.get_backend('aer_simulator')
+        compiled_circuit = transpile(qc, simulator)
+        job = simulator.run(compiled_circuit, shots=self.repeat).result().get_counts()
+        probabilities = np.zeros(2 ** self.num_qubits)
+        for i in job.keys():
+            probabilities[int(i.replace(" ", ""), 2)] += job[i] / self.repeat
+        return probabilities
+
+    def check_bounds(self, bounds):
+        # bounds中的每一项是(状态, 概率下界, 概率上界)，所有状态的概率都在范围内时为True
+        if self.sampling and self.schedule is not None:
+            # 每个状态的频率近似看作相互独立
+            probability_true = 1.0
+            exact = self.exact_probabilities()
+            for (state, low, high) in bounds:
+                probability_true *= frequency_probability(exact[state], low, high, self.repeat)
+            return self.schedule.decide(probability_true)
+        probabilities = self.probabilities()
+        return all([low <= probabilities[state] <= high for (state, low, high) in bounds])
+
+    def check_state_eq(self, target_probability, delta=0.01):
+        return self.check_bounds(state_bounds("==", target_probability, delta))
+
+    def check_state_gt(self, target_probability, delta=0.01):
+        return self.check_bounds(state_bounds(">", target_probability, delta))
+
+    def check_state_lt(self, target_probability, delta=0.01):
+        return self.check_bounds(state_bounds("<", target_probability, delta))
+
+    def usr_defined(self):
+        pass
+
+
+def _freeze(value):
+    # 目标概率中的list转换为tuple，才能作为表达式中的常数
+    if isinstance(value, (list, tuple)):
+        return tuple([_freeze(v) for v in value])
+    return value
+
+
+class SymbolicCircuit(SymbolicObject, NewQuantumCircuit):
+    def __init__(self, name, value, expr=None):
+        value /= np.linalg.norm(value)
+        self.state = value
+        self.qubits_num = int(math.log(len(self.state), 2))
+        SymbolicObject.__init__(self, name, expr)
+        NewQuantumCircuit.__init__(self, self.qubits_num)
+        self.initialize(self.state)
+        self.name = name
+        # 程序中依次执行的量子门，每一项是一个GateOp
+        self.gates = []
+
+    def getConcrValue(self):
+        qc = NewQuantumCircuit(self.qubits_num)
+        qc.initialize(self.state)
+        for gate in self.gates:
+            getattr(qc, gate.name)(*(gate.params + gate.qubits))
+        qc.initial_state = self.state
+        qc.gate_ops = list(self.gates)
+        return qc
+
+    def __str__(self):
+        return self.name
+
+    def __reduce__(self):
+        # 并行探索时，predicate中的电路变量只需要名字和初始状态
+        return (SymbolicCircuit, (self.name, self.state))
+
+    def wrap(conc, sym):
+        return SymbolicCircuit("se", conc, sym)
+
+    # 量子分支的表达式为 (op qc gates target delta)，gates是执行到这里的所有GateOp
+    # 求解器直接从表达式中读取门和目标概率
+    def check_state_eq(self, target_probability, delta=0.01):
+        return self._op_worker([self, tuple(self.gates), _freeze(target_probability), delta],
+                               lambda x, gates, target, delta: x.check_state_eq(target, delta),
+                               op="==")
+
+    def check_state_gt(self, target_probability, delta=0.01):
+        return self._op_worker([self, tuple(self.gates), _freeze(target_probability), delta],
+                               lambda x, gates, target, delta: x.check_state_gt(target, delta),
+                               op=">")
+
+    def check_state_lt(self, target_probability, delta=0.01):
+        return self._op_worker([self, tuple(self.gates), _freeze(target_probability), delta],
+                               lambda x, gates, target, delta: x.check_state_lt(target, delta),
+                               op="<")
+
+    def _op_worker(self, args, fun, op):
+        return self._do_sexpr(args, fun, op, SymbolicInteger.wrap)
+
+
+# 被测程序中调用的量子门，除了在电路上执行以外，还需要记录下来
+ops = ["h", "x", "ccx", "ccz", "s", "z", "y", "sdg", "t", "tdg", "ch", "cs", "cz", "csdg", "p", "cp",
+       "rx", "crx", "ry", "cu", "cry", "rz", "crz", "swap", "iswap", "cswap", "sx", "sxdg", "csx", "cx", "u"]
+
+
+def make_method(method):
+    def gate_method(self, *args):
+        self.gates.append(make_gate_op(method, args))
+        getattr(super(SymbolicObject, self), method)(*args)
+    gate_method.__name__ = method
+    setattr(SymbolicCircuit, method, gate_method)
+
+
+for gate in ops:
+    make_method(gate)
@@ -1,4 +1,7 @@
+import operator
+
 from concolic.symbolic_types.symbolic_type import SymbolicObject
+from concolic.symbolic_types.simplify import simplify
 
 
 # we use multiple inheritance to achieve concrete execution for any
@@ -25,32 +28,41 @@ class SymbolicInteger(SymbolicObject, int):
     def __hash__(self):
         return hash(self.val)
 
+    def __reduce__(self):
+        # int的子类默认只会按照int的值进行序列化，这里需要保留名字和表达式
+        # 从而让predicate可以在并行探索的进程之间传递
+        return (SymbolicInteger, (self.name, self.val, self.expr))
+
     def _op_worker(self, args, fun, op):
         return self._do_sexpr(args, fun, op, SymbolicInteger.wrap)
 
+    def _makeExpr(self, op, args):
+        # 整数表达式在构建时折叠常数并整理线性项
+        return simplify(op, args)
+
 
 # 构建一些基本的运算逻辑，当符号变量遇到这些符号，就会记录下来
+# 每个运算对应operator模块中的函数，直接用来计算具体值
 
-ops = [("add", "+"), \
-       ("sub", "-"), \
-       ("mul", "*"), \
-       ("mod", "%"), \
-       ("floordiv", "//"), \
-       ("and", "&"), \
-       ("or", "|"), \
-       ("xor", "^"), \
-       ("lshift", "<<"), \
-       ("rshift", ">>")]
+ops = [("add", operator.add, "+"), \
+       ("sub", operator.sub, "-"), \
+       ("mul", operator.mul, "*"), \
+       ("mod", operator.mod, "%"), \
+       ("floordiv", operator.floordiv, "//"), \
+       ("and", operator.and_, "&"), \
+       ("or", operator.or_, "|"), \
+       ("xor", operator.xor, "^"), \
+       ("lshift", operator.lshift, "<<"), \
+       ("rshift", operator.rshift, ">>")]
 
 
-def make_method(method, op, a):
-    code = "def %s(self,other):\n" % method
-    code += "   return self._op_worker(%s,lambda x,y : x %s y, \"%s\")" % (a, op, op)
-    locals_dict = {}
-    exec(code, globals(), locals_dict)
-    setattr(SymbolicInteger, method, locals_dict[method])
+def make_method(method, fun, op):
+    def op_method(self, other):
+        return self._op_worker([self, other], fun, op)
+    op_method.__name__ = method
+    setattr(SymbolicInteger, method, op_method)
 
 
-for (name, op) in ops:
+for (name, fun, op) in ops:
     method = "__%s__" % name
-    make_method(method, op, "[self,other]")
+    make_method(method, fun, op)
@@ -1,6 +1,79 @@
-import functools
-import inspect
+import operator
 import traceback
+import weakref
+
+
+class SymbolicExpr(object):
+    # 符号表达式的节点，取代原来的嵌套list ["+", a, b]
+    # 节点只能通过makeExpr创建并且会被intern：同一次执行中结构相同的表达式只对应一个节点
+    # 节点中的变量带有当次执行的具体值，因此不同执行中的同名变量不会共享节点
+    __slots__ = ("op", "args", "vars", "_hash", "_text", "__weakref__")
+
+    def __init__(self, op, args, vars, key_hash):
+        self.op = op
+        # args中的元素可以是SymbolicExpr，作为变量的SymbolicType，或者常数
+        self.args = args
+        # 表达式中出现的所有变量名，由子节点的变量合并得到
+        self.vars = vars
+        self._hash = key_hash
+        self._text = None
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # 反序列化时重新intern，保证并行探索的进程中结构相同的表达式仍然是同一个节点
+        return (makeExpr, (self.op, list(self.args)))
+
+    def canonical(self):
+        # 不包含具体值的表达式文本，只计算一次
+        if self._text is None:
+            self._text = "(" + self.op + " " + " ".join([_canonical(a) for a in self.args]) + ")"
+        return self._text
+
+    def __repr__(self):
+        return self.canonical()
+
+
+# 所有已经创建的节点，不再被引用的节点会被自动移除
+_expr_table = weakref.WeakValueDictionary()
+
+
+def _exprKey(arg):
+    if isinstance(arg, SymbolicExpr):
+        return arg
+    elif isinstance(arg, SymbolicType):
+        # 变量按对象区分，否则之后的表达式会复用第一次遇到的变量(以及它的具体值和电路)
+        # 节点保存了变量，只要表中还有这个节点，id就不会被其他对象复用
+        return ("var", id(arg))
+    else:
+        # 常数需要区分类型，例如True和1
+        return (type(arg), arg)
+
+
+def _canonical(arg):
+    if isinstance(arg, SymbolicExpr):
+        return arg.canonical()
+    elif isinstance(arg, SymbolicType):
+        return arg.name
+    else:
+        return repr(arg)
+
+
+def makeExpr(op, args):
+    # 返回op和args对应的唯一节点，不存在时创建
+    key = (op,) + tuple([_exprKey(a) for a in args])
+    node = _expr_table.get(key)
+    if node is None:
+        vars = frozenset()
+        for a in args:
+            if isinstance(a, SymbolicExpr):
+                vars = vars | a.vars
+            elif isinstance(a, SymbolicType):
+                vars = vars | frozenset([a.name])
+        node = SymbolicExpr(op, tuple(args), vars, hash(key))
+        _expr_table[key] = node
+    return node
 
 
 class SymbolicType(object):
@@ -36,18 +109,9 @@ class SymbolicType(object):
         # 获取变量名
         if self.isVariable():
             return [self.name]
-        elif isinstance(self.expr, list):
-            return self._getVarsLeaves(self.expr)
-        else:
-            return []
-
-
-    def _getVarsLeaves(self, l):
-        if isinstance(l, list):
-            # 使用递归的方法，将list中的所有SymbolicType对象的name都获取
-            return functools.reduce(lambda a, x: self._getVarsLeaves(x) + a, l, [])
-        elif isinstance(l, SymbolicType):
-            return [l.name]
+        elif isinstance(self.expr, SymbolicExpr):
+            # 表达式节点在创建时已经合并了子节点的变量
+            return sorted(self.expr.vars)
         else:
             return []
 
@@ -56,39 +120,34 @@ class SymbolicType(object):
         # 对于所有参数，如果是SymbolicType，则还原为原本的样子
         unwrapped = [(a.unwrap() if isinstance(a, SymbolicType) else (a,a)) for a in args]
 
-        # 将fun中的每个输入符号，和对应的具体值构建tuple， 存在args中
-        args = zip(inspect.getfullargspec(fun).args, [c for (c,s) in unwrapped])
+        # concrete就是将具体值按照顺序传入函数计算得到的结果
+        concrete = fun(*[c for (c,s) in unwrapped])
 
-        # concrete就是将对应的变量名和变量值，用字典的形式传入函数
-        concrete = fun(**dict([a for a in args]))
+        # symbolic是将op和符号化本身组合在一起，结构相同的表达式共享同一个节点
+        symbolic = self._makeExpr(op, [s for (c,s) in unwrapped])
 
-        # symbolic是将op和符号化本身组合在一起
-        symbolic = [ op ] + [ s for (c,s) in unwrapped]
+        if isinstance(symbolic, SymbolicType):
+            # 化简之后只剩下一个变量，用当前的具体值重新创建这个变量
+            return type(symbolic)(symbolic.name, concrete)
+        if not isinstance(symbolic, SymbolicExpr) or len(symbolic.vars) == 0:
+            # 不包含变量，不需要符号化
+            return concrete
 
         # 用wrap将concrete值用symbolic进行符号化
         return wrap(concrete, symbolic)
 
+    def _makeExpr(self, op, args):
+        # 子类可以在这里对表达式进行化简
+        return makeExpr(op, args)
+
     def symbolicEq(self, other):
         # 判断两个SymbolicType是否一致
         if not isinstance(other, SymbolicType):
             return False
         if self.isVariable() or other.isVariable():
             return self.name == other.name
-        return self._eq_worker(self.expr, other.expr)
-
-    def _eq_worker(self, expr1, expr2):
-        # 判断两个非variable的SymbolicType对象是否一致
-        if type(expr1) != type(expr2):
-            return False
-        if isinstance(expr1, list):
-            # 用递归法判断list元素是否相同
-            return len(expr1) == len(expr2) and\
-                type(expr1[0]) == type(expr2[0]) and\
-                all([self._eq_worker(x,y) for x,y in zip(expr1[1:], expr2[1:])])
-        elif isinstance(expr1, SymbolicType):
-            return expr1.name == expr2.name
-        else:
-            return expr1 == expr2
+        # 同一次执行中结构相同就是同一个节点，不同执行的节点比较不包含具体值的文本
+        return self.expr is other.expr or self.expr.canonical() == other.expr.canonical()
 
     def toString(self):
         if self.isVariable():
@@ -100,8 +159,8 @@ class SymbolicType(object):
             return self._toString(self.expr)
 
     def _toString(self, expr):
-        if isinstance(expr, list):
-            return "(" + expr[0] + " " + ", ".join([self._toString(a) for a in expr[1:]]) + ")"
+        if isinstance(expr, SymbolicExpr):
+            return "(" + expr.op + " " + ", ".join([self._toString(a) for a in expr.args]) + ")"
         elif isinstance(expr, SymbolicType):
             return expr.toString()
         else:
@@ -138,22 +197,22 @@ class SymbolicObject(SymbolicType, object):
 
     def __eq__(self, other):
         # 当SymbolicObject类的对象识别到"=="的时候，执行判断
-        return self._do_bin_op(other, lambda x, y: x == y, "==", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.eq, "==", SymbolicObject.wrap)
 
     def __ne__(self, other):
-        return self._do_bin_op(other, lambda x, y: x != y, "!=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.ne, "!=", SymbolicObject.wrap)
 
     def __lt__(self, other):
-        return self._do_bin_op(other, lambda x, y: x < y, "<", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.lt, "<", SymbolicObject.wrap)
 
     def __le__(self, other):
-        return self._do_bin_op(other, lambda x, y: x <= y, "<=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.le, "<=", SymbolicObject.wrap)
 
     def __gt__(self, other):
-        return self._do_bin_op(other, lambda x, y: x > y, ">", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.gt, ">", SymbolicObject.wrap)
 
     def __ge__(self, other):
-        return self._do_bin_op(other, lambda x, y: x >= y, ">=", SymbolicObject.wrap)
+        return self._do_bin_op(other, operator.ge, ">=", SymbolicObject.wrap)
 
 
 
@@ -1,15 +1,20 @@
 import utils
+import weakref
 
 from concolic.symbolic_types.symbolic_int import SymbolicInteger
-from concolic.symbolic_types.symbolic_type import SymbolicType
+from concolic.symbolic_types.symbolic_type import SymbolicType, SymbolicExpr
 from z3 import *
 
 class Z3Expression(object):
 	def __init__(self):
 		self.z3_vars = {}
+		# symbolic expression nodes are interned, so a node translated once can be
+		# reused by every later query; entries go away together with the nodes
+		self.z3_cache = weakref.WeakKeyDictionary()
 
 	def toZ3(self,solver,asserts,query):
 		self.z3_vars = {}
+		self.z3_cache = weakref.WeakKeyDictionary()
 		solver.assert_exprs([self.predToZ3(p,solver) for p in asserts])
 		solver.assert_exprs(Not(self.predToZ3(query,solver)))
 
@@ -52,51 +57,14 @@ class Z3Expression(object):
 
 	# add concrete evaluation to this, to check
 	def _astToZ3Expr(self,expr,solver,env=None):
-		if isinstance(expr, list):
-			op = expr[0]
-			args = [ self._astToZ3Expr(a,solver,env) for a in expr[1:] ]
-			z3_l,z3_r = args[0],args[1]
-
-			# arithmetical operations
-			if op == "+":
-				return self._add(z3_l, z3_r, solver)
-			elif op == "-":
-				return self._sub(z3_l, z3_r, solver)
-			elif op == "*":
-				return self._mul(z3_l, z3_r, solver)
-			elif op == "//":
-				return self._div(z3_l, z3_r, solver)
-			elif op == "%":
-				return self._mod(z3_l, z3_r, solver)
-
-			# bitwise
-			elif op == "<<":
-				return self._lsh(z3_l, z3_r, solver)
-			elif op == ">>":
-				return self._rsh(z3_l, z3_r, solver)
-			elif op == "^":
-				return self._xor(z3_l, z3_r, solver)
-			elif op == "|":
-				return self._or(z3_l, z3_r, solver)
-			elif op == "&":
-				return self._and(z3_l, z3_r, solver)
-
-			# equality gets coerced to integer
-			elif op == "==":
-				return self._wrapIf(z3_l == z3_r,solver,env)
-			elif op == "!=":
-				return self._wrapIf(z3_l != z3_r,solver,env)
-			elif op == "<":
-				return self._wrapIf(z3_l < z3_r,solver,env)
-			elif op == ">":
-				return self._wrapIf(z3_l > z3_r,solver,env)
-			elif op == "<=":
-				return self._wrapIf(z3_l <= z3_r,solver,env)
-			elif op == ">=":
-				return self._wrapIf(z3_l >= z3_r,solver,env)
-			else:
-				utils.crash("Unknown BinOp during conversion from ast to Z3 (expressions): %s" % op)
-
+		if isinstance(expr, SymbolicExpr) and env == None:
+			z3_ast = self.z3_cache.get(expr)
+			if z3_ast is None:
+				z3_ast = self._nodeToZ3Expr(expr,solver,env)
+				self.z3_cache[expr] = z3_ast
+			return z3_ast
+		elif isinstance(expr, SymbolicExpr):
+			return self._nodeToZ3Expr(expr,solver,env)
 		elif isinstance(expr, SymbolicInteger):
 			if expr.isVariable():
 				if env == None:
@@ -118,6 +86,51 @@ class Z3Expression(object):
 		else:
 			utils.crash("Unknown node during conversion from ast to Z3 (expressions): %s" % expr)
 
+	def _nodeToZ3Expr(self,expr,solver,env):
+		op = expr.op
+		args = [ self._astToZ3Expr(a,solver,env) for a in expr.args ]
+		z3_l,z3_r = args[0],args[1]
+
+		# arithmetical operations
+		if op == "+":
+			return self._add(z3_l, z3_r, solver)
+		elif op == "-":
+			return self._sub(z3_l, z3_r, solver)
+		elif op == "*":
+			return self._mul(z3_l, z3_r, solver)
+		elif op == "//":
+			return self._div(z3_l, z3_r, solver)
+		elif op == "%":
+			return self._mod(z3_l, z3_r, solver)
+
+		# bitwise
+		elif op == "<<":
+			return self._lsh(z3_l, z3_r, solver)
+		elif op == ">>":
+			return self._rsh(z3_l, z3_r, solver)
+		elif op == "^":
+			return self._xor(z3_l, z3_r, solver)
+		elif op == "|":
+			return self._or(z3_l, z3_r, solver)
+		elif op == "&":
+			return self._and(z3_l, z3_r, solver)
+
+		# equality gets coerced to integer
+		elif op == "==":
+			return self._wrapIf(z3_l == z3_r,solver,env)
+		elif op == "!=":
+			return self._wrapIf(z3_l != z3_r,solver,env)
+		elif op == "<":
+			return self._wrapIf(z3_l < z3_r,solver,env)
+		elif op == ">":
+			return self._wrapIf(z3_l > z3_r,solver,env)
+		elif op == "<=":
+			return self._wrapIf(z3_l <= z3_r,solver,env)
+		elif op == ">=":
+			return self._wrapIf(z3_l >= z3_r,solver,env)
+		else:
+			utils.crash("Unknown BinOp during conversion from ast to Z3 (expressions): %s" % op)
+
 	def _add(self, l, r, solver):
 		return l + r
 
@@ -128,6 +141,9 @@ class Z3Expression(object):
 		return l * r
 
 	def _div(self, l, r, solver):
+		# concrete evaluation follows the floor division of the program
+		if isinstance(l, int) and isinstance(r, int):
+			return l // r
 		return l / r
 
 	def _mod(self, l, r, solver):
@@ -7,119 +7,276 @@ import logging
 from z3 import *
 from concolic.z3_expr.integer import Z3Integer
 from concolic.z3_expr.bitvector import Z3BitVector
+from concolic.cex_cache import constraintKey
 
 
-class Z3Wrapper(object):
+class Z3Session(object):
+	"""An incremental solver that mirrors one path of the Constraint tree,
+	with one scope per predicate. Moving to another path pops back to the
+	common ancestor, so only the differing predicates are re-encoded.
+	Every predicate is guarded by an assumption literal, a check only enables
+	the predicates it needs (the cone of influence of the query)."""
+	def __init__(self, z3_expr):
+		self.solver = Solver()
+		self.z3_expr = z3_expr
+		self.path = []
+		self.literals = []
+
+	def sync(self, path):
+		common = 0
+		while common < len(self.path) and common < len(path) and self.path[common] == path[common]:
+			common += 1
+		if common < len(self.path):
+			self.solver.pop(len(self.path) - common)
+			del self.path[common:]
+			del self.literals[common:]
+		for p in path[common:]:
+			self.solver.push()
+			# quantum predicates are not handled by z3, they only occupy a scope
+			literal = None
+			if not _isQuantum(p):
+				literal = Bool("path_%d" % len(self.path),self.solver.ctx)
+				self.solver.assert_exprs(Implies(literal,self.z3_expr.predToZ3(p,self.solver)))
+			self.path.append(p)
+			self.literals.append(literal)
+
+	def assumptions(self, path, preds):
+		"""Literals enabling the given predicates, path is the one the
+		session was synced with and preds a subset of its predicates."""
+		ids = set([ id(p) for p in preds ])
+		return [ l for (p,l) in zip(path,self.literals) if l is not None and id(p) in ids ]
+
+
+def _isQuantum(pred):
+	return "qc" in pred.getVars()
+
+
+class VariablePartition(object):
+	"""Union-find over variable names that mirrors one path of predicates.
+	Pushing a predicate joins its variables, popping it undoes those unions,
+	so the partition always matches the path without being recomputed."""
 	def __init__(self):
+		self.parent = {}
+		self.size = {}
+		self.path = []
+		# for each predicate of the path, what has to be undone when it is popped
+		self.undo = []
+
+	def find(self, v):
+		# no path compression, it would make undoing unions impossible
+		while self.parent[v] != v:
+			v = self.parent[v]
+		return v
+
+	def sync(self, path):
+		common = 0
+		while common < len(self.path) and common < len(path) and self.path[common] == path[common]:
+			common += 1
+		while len(self.path) > common:
+			self._pop()
+		# equal predicates may come from another run, keep those of the current path
+		self.path[:common] = path[:common]
+		for p in path[common:]:
+			self._push(p)
+
+	def cone(self, query):
+		"""Predicates of the path that share a partition with the query."""
+		roots = set([ self.find(v) for v in query.getVars() if v in self.parent ])
+		return [ p for p in self.path if self._root(p) in roots ]
+
+	def partitions(self):
+		"""Predicates of the path grouped into independent partitions."""
+		groups = {}
+		for p in self.path:
+			root = self._root(p)
+			if root is not None:
+				groups.setdefault(root,[]).append(p)
+		return list(groups.values())
+
+	def _root(self, pred):
+		vars = pred.getVars()
+		if len(vars) == 0:
+			return None
+		return self.find(vars[0])
+
+	def _push(self, pred):
+		log = []
+		vars = pred.getVars()
+		for v in vars:
+			if v not in self.parent:
+				self.parent[v] = v
+				self.size[v] = 1
+				log.append((v,None))
+		for v in vars[1:]:
+			a = self.find(vars[0])
+			b = self.find(v)
+			if a == b:
+				continue
+			if self.size[a] < self.size[b]:
+				a,b = b,a
+			self.parent[b] = a
+			self.size[a] += self.size[b]
+			log.append((b,a))
+		self.path.append(pred)
+		self.undo.append(log)
+
+	def _pop(self):
+		self.path.pop()
+		for (v,root) in reversed(self.undo.pop()):
+			if root is None:
+				del self.parent[v]
+				del self.size[v]
+			else:
+				self.parent[v] = v
+				self.size[root] -= self.size[v]
+
+
+class Z3Wrapper(object):
+	def __init__(self, cache=None):
 		self.N = 32
 		self.asserts = None
+		self.assumptions = []
 		self.query = None
 		self.use_lia = True
 		self.z3_expr = None
+		# one incremental session per encoding: "int" and each bit width
+		self.sessions = {}
+		self.path = []
+		self.partition = VariablePartition()
+		# optional CounterexampleCache shared by all queries
+		self.cache = cache
+		self.unsat = False
+		# escalation statistics of the last query, and of every query solved so far
+		self.stats = None
+		self.query_stats = []
 
 	def findCounterexample(self, asserts, query):
 		"""Tries to find a counterexample to the query while
 	  	 asserts remains valid."""
-		self.solver = Solver()
 		self.query = query
+		# asserts are ordered from the query up to the root
+		self.path = asserts[::-1]
 		self.asserts = self._coneOfInfluence(asserts,query)
+		if self.cache is not None:
+			key = constraintKey(self.asserts,query)
+			(found,res) = self.cache.lookup(key,self._satisfies)
+			if found:
+				return None if res is None else self._restrictToCone(res)
+		self.unsat = False
 		res = self._findModel()
+		# only proven unsat results are cached, not unknown or mismatching ones;
+		# the checks only enable the cone predicates, so unsat holds for the key
+		if self.cache is not None and (res is not None or self.unsat):
+			self.cache.store(key,res)
 		return res
 
 	# private
 
-	# this is very inefficient
+	def _useSession(self, key):
+		if key not in self.sessions:
+			z3_expr = Z3Integer() if key == "int" else Z3BitVector(key)
+			self.sessions[key] = Z3Session(z3_expr)
+		session = self.sessions[key]
+		session.sync(self.path)
+		self.solver = session.solver
+		self.z3_expr = session.z3_expr
+		# only the predicates in the cone of influence take part in the checks
+		self.assumptions = session.assumptions(self.path,self.asserts)
+
 	def _coneOfInfluence(self,asserts,query):
-		cone = []
-		cone_vars = set(query.getVars())
-		ws = [ a for a in asserts if len(set(a.getVars()) & cone_vars) > 0 ]
-		remaining = [ a for a in asserts if a not in ws ]
-		while len(ws) > 0:
-			a = ws.pop()
-			a_vars = set(a.getVars())
-			cone_vars = cone_vars.union(a_vars)
-			cone.append(a)
-			new_ws = [ a for a in remaining if len(set(a.getVars()) & cone_vars) > 0 ]
-			remaining = [ a for a in remaining if a not in new_ws ]
-			ws = ws + new_ws
-		return cone
+		self.partition.sync(self.path)
+		return self.partition.cone(query)
+
+	def independentPartitions(self):
+		"""Independent partitions of the current path, each of them can be
+		solved or cached on its own."""
+		return self.partition.partitions()
 
 	def _findModel(self):
+		self.stats = { "checks": 0, "bound_steps": 0, "width_steps": 0 }
+		self.query_stats.append(self.stats)
 		# Try QF_LIA first (as it may fairly easily recognize unsat instances)
 		if self.use_lia:
+			self._useSession("int")
 			self.solver.push()
-			self.z3_expr = Z3Integer()
-			self.z3_expr.toZ3(self.solver,self.asserts,self.query)
-			res = self.solver.check()
+			self.solver.assert_exprs(Not(self.z3_expr.predToZ3(self.query,self.solver)))
+			res = self.solver.check(*self.assumptions)
+			self.stats["checks"] += 1
 			#print(self.solver.assertions)
 			self.solver.pop()
 			if res == unsat:
+				self.unsat = True
 				return None
 
 		# now, go for SAT with bounds
 		self.N = 32
 		self.bound = (1 << 4) - 1
 		while self.N <= 64:
-			self.solver.push()
-			(ret,mismatch) = self._findModel2()
+			(ret,mismatch,model) = self._findModel2()
 			if (not mismatch):
 				break
-			self.solver.pop()
 			self.N = self.N+8
-			if self.N <= 64: print("expanded bit width to "+str(self.N)) 
+			if self.N <= 64:
+				self.stats["width_steps"] += 1
+				print("expanded bit width to "+str(self.N))
 		#print("Assertions")
 		#print(self.solver.assertions())
-		if ret == unsat:
-			res = None
-		elif ret == unknown:
-			res = None
-		elif not mismatch:
-			res = self._getModel()
-		else:
-			res = None
-		if self.N<=64: self.solver.pop()
-		return res
+		if ret == sat and not mismatch:
+			return model
+		return None
 
 	def _setAssertsQuery(self):
-		self.z3_expr = Z3BitVector(self.N)
-		self.z3_expr.toZ3(self.solver,self.asserts,self.query)
+		# the path prefix is already asserted by the session, only the query is new
+		self._useSession(self.N)
+		self.solver.push()
+		self.solver.assert_exprs(Not(self.z3_expr.predToZ3(self.query,self.solver)))
 
 	def _findModel2(self):
 		self._setAssertsQuery()
-		int_vars = self.z3_expr.getIntVars()
+		names = self._coneVars()
+		int_vars = [ v for (name,v) in self.z3_expr.z3_vars.items() if name in names and self.z3_expr._isIntVar(v) ]
 		res = unsat
+		model = None
 		while res == unsat and self.bound <= (1 << (self.N-1))-1:
-			self.solver.push()
-			constraints = self._boundIntegers(int_vars,self.bound)
-			self.solver.assert_exprs(constraints)
-			res = self.solver.check()
+			# the bounds are only enabled through an assumption literal, so growing
+			# them never retracts anything that was asserted
+			bound = self._boundLiteral(int_vars,self.bound)
+			res = self.solver.check(bound,*self.assumptions)
+			self.stats["checks"] += 1
 			if res == unsat:
+				if bound not in self.solver.unsat_core():
+					# unsat whatever the bounds are
+					break
 				self.bound = (self.bound << 1)+1
-				self.solver.pop()
+				self.stats["bound_steps"] += 1
 		if res == sat:
 			# Does concolic agree with Z3? If not, it may be due to overflow
 			model = self._getModel()
-			#print("Match?")
-			#print(self.solver.assertions)
-			self.solver.pop()
-			mismatch = False
-			for a in self.asserts:
-				eval = self.z3_expr.predToZ3(a,self.solver,model)
-				if (not eval):
-					mismatch = True
-					break
-			if (not mismatch):
-				mismatch = not (not self.z3_expr.predToZ3(self.query,self.solver,model))
-			#print(mismatch)
-			return (res,mismatch)
-		elif res == unknown:
-			self.solver.pop()
-		return (res,False)
+		#print("Match?")
+		#print(self.solver.assertions)
+		self.solver.pop()
+		if res != sat:
+			return (res,False,None)
+		mismatch = False
+		for a in self.asserts:
+			eval = self.z3_expr.predToZ3(a,self.solver,model)
+			if (not eval):
+				mismatch = True
+				break
+		if (not mismatch):
+			mismatch = not (not self.z3_expr.predToZ3(self.query,self.solver,model))
+		#print(mismatch)
+		return (res,mismatch,model)
 
 	def _getModel(self):
 		res = {}
 		model = self.solver.model()
+		# the session knows about the whole path, but only variables in the cone of
+		# influence may change, the others keep their concrete values
+		names = self._coneVars()
 		for name in self.z3_expr.z3_vars.keys():
+			if name not in names:
+				continue
 			try:
 				ce = model.eval(self.z3_expr.z3_vars[name])
 				res[name] = ce.as_signed_long()
@@ -132,3 +289,40 @@ class Z3Wrapper(object):
 		bval_neg = BitVecVal(-val-1,self.N,self.solver.ctx)
 		return And([ v <= bval for v in vars]+[ bval_neg <= v for v in vars])
 
+	def _boundLiteral(self,vars,val):
+		"""Asserts the bounds guarded by a fresh literal in the query scope,
+		and returns the literal to be passed as an assumption."""
+		literal = Bool("bound_%d_%d" % (self.N,val),self.solver.ctx)
+		self.solver.assert_exprs(Implies(literal,self._boundIntegers(vars,val)))
+		return literal
+
+	def report(self):
+		"""Summary of the escalation steps taken by all queries so far."""
+		queries = len(self.query_stats)
+		checks = sum([ s["checks"] for s in self.query_stats ])
+		bounds = sum([ s["bound_steps"] for s in self.query_stats ])
+		widths = sum([ s["width_steps"] for s in self.query_stats ])
+		most = max([ s["bound_steps"]+s["width_steps"] for s in self.query_stats ]+[0])
+		return "Solver: %d queries, %d checks, %d bound steps, %d width steps (at most %d in one query)" % \
+			(queries,checks,bounds,widths,most)
+
+	def _coneVars(self):
+		names = set(self.query.getVars())
+		for a in self.asserts:
+			names.update(a.getVars())
+		return names
+
+	def _restrictToCone(self, model):
+		names = self._coneVars()
+		return dict([ (k,v) for (k,v) in model.items() if k in names ])
+
+	def _satisfies(self, model):
+		# concrete evaluation, as done for the mismatch check in _findModel2
+		z3_expr = Z3BitVector(64)
+		try:
+			for a in self.asserts:
+				if not z3_expr.predToZ3(a,None,model):
+					return False
+			return not z3_expr.predToZ3(self.query,None,model)
+		except (KeyError, ZeroDivisionError):
+			return False
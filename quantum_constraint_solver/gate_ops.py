@@ -0,0 +1,56 @@
+from collections import namedtuple
+import re
+
+
+# 量子门操作的中间表示：门的名字，作用的qubit(qiskit中的编号)，以及参数
+# 符号电路直接记录这种形式，约束求解器不再需要解析"cx(0,1)"这样的字符串
+class GateOp(namedtuple("GateOp", ["name", "qubits", "params"])):
+    __slots__ = ()
+
+    def __str__(self):
+        # 和qiskit的调用方式一致，参数在前，qubit在后
+        return "%s(%s)" % (self.name, ",".join([str(a) for a in self.params + self.qubits]))
+
+    __repr__ = __str__
+
+
+# 每个门的参数个数，其余的调用参数都是qubit
+gate_params = {"h": 0, "x": 0, "y": 0, "z": 0, "s": 0, "sdg": 0, "t": 0, "tdg": 0, "sx": 0, "sxdg": 0,
+               "p": 1, "rx": 1, "ry": 1, "rz": 1, "u": 3,
+               "cx": 0, "cnot": 0, "ch": 0, "cs": 0, "csdg": 0, "cz": 0, "csx": 0,
+               "cp": 1, "crx": 1, "cry": 1, "crz": 1, "cu": 4,
+               "swap": 0, "iswap": 0, "cswap": 0, "ccx": 0, "ccz": 0}
+
+
+def _concrete(value):
+    # 符号整数是int的子类，只保留具体值，之后比较GateOp时不会产生新的分支
+    if isinstance(value, int):
+        return int(value)
+    elif isinstance(value, float):
+        return float(value)
+    return value
+
+
+def make_gate_op(name, args):
+    # 根据qiskit方法的调用参数创建GateOp
+    num_params = gate_params[name]
+    args = [_concrete(a) for a in args]
+    return GateOp(name, tuple(args[num_params:]), tuple(args[:num_params]))
+
+
+_operation_pattern = re.compile(r"\s*(\w+)\s*\((.*)\)\s*$")
+
+
+def parse_gate_op(operation):
+    # 兼容原来的字符串形式，例如"cx(0,1)"和"rx(1.57,0)"
+    match = _operation_pattern.match(operation)
+    if match is None or match.group(1) not in gate_params:
+        raise ValueError("Unsupported gate operation: %s" % operation)
+    name = match.group(1)
+    args = [a.strip() for a in match.group(2).split(",") if a.strip() != ""]
+    num_params = gate_params[name]
+    return GateOp(name, tuple([int(a) for a in args[num_params:]]), tuple([float(a) for a in args[:num_params]]))
+
+
+def as_gate_ops(operations):
+    return [op if isinstance(op, GateOp) else parse_gate_op(op) for op in operations]
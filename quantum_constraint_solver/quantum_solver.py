@@ -1,9 +1,13 @@
-import ast
+import time
+
+import numpy as np
 
 from quantum_constraint_solver.symqv.expressions.qbit import Qbits
+from quantum_constraint_solver.symqv.gate_cache import gate_cache
 from quantum_constraint_solver.symqv.models.circuit import Circuit
+from quantum_constraint_solver.symqv.model_parser import parse_model
 from quantum_constraint_solver.qiskit_plugin import operations_to_program
-from quantum_constraint_solver.symqv.expressions.complex import Complexes
+from quantum_constraint_solver.gate_ops import GateOp, as_gate_ops
 
 def eq_constraint(prob_constraint, symbolic_state_list, circuit):
     for index, prob in enumerate(prob_constraint):
@@ -17,44 +21,232 @@ def neq_constraint(prob_constraint, symbolic_state_list, circuit):
         circuit.solver.add(target_state.r ** 2 + target_state.i ** 2 != prob)
     return circuit
 
-def quantum_constraint_solver(num_qbits, operations, prob_constraint, flag):
+def eq_probabilities(prob_constraint, num_states):
+    # 末态的概率就是目标概率，概率之和不为1时无解，交给SMT求解器判断
+    probabilities = np.array(prob_constraint, dtype=float)
+    if len(probabilities) != num_states or np.any(probabilities < 0) or abs(probabilities.sum() - 1) > 1e-9:
+        return None
+    return probabilities
+
+
+def neq_probabilities(prob_constraint, num_states, delta):
+    # 随机的末态，每个状态的概率和目标概率的差都超过分支的delta
+    for i in range(100):
+        probabilities = np.random.dirichlet(np.ones(num_states))
+        if all(abs(probabilities[index] - prob) > delta for index, prob in enumerate(prob_constraint)):
+            return probabilities
+    return None
+
+
+def gt_probabilities(prob_constraint, num_states):
+    # 列出的状态概率大于下界：先满足下界，剩余的概率平均分给所有状态
+    bounds = {}
+    for state, prob in prob_constraint:
+        if not 0 <= state < num_states:
+            return None
+        bounds[state] = max(prob, bounds.get(state, 0))
+    slack = 1 - sum(bounds.values())
+    if slack <= 0:
+        return None
+    probabilities = np.full(num_states, slack / num_states)
+    for state, prob in bounds.items():
+        probabilities[state] += prob
+    return probabilities
+
+
+def lt_probabilities(prob_constraint, num_states):
+    # 列出的状态概率小于上界：按照上界的比例缩小，剩余的概率平均分给其他状态
+    bounds = {}
+    for state, prob in prob_constraint:
+        if not 0 <= state < num_states:
+            return None
+        bounds[state] = min(prob, bounds.get(state, 1))
+    if any(prob <= 0 for prob in bounds.values()):
+        return None
+    total = sum(bounds.values())
+    others = num_states - len(bounds)
+    if others == 0:
+        if total <= 1:
+            return None
+        scale = 1 / total
+    else:
+        scale = min(0.5, 0.5 / total)
+    probabilities = np.full(num_states, 0.0 if others == 0 else (1 - scale * total) / others)
+    for state, prob in bounds.items():
+        probabilities[state] = prob * scale
+    return probabilities
+
+
+def numeric_constraint_solver(num_qbits, operations, prob_constraint, flag, delta=0.01, tolerance=0.00001):
+    """
+    Solve the constraint without SMT: the gates are concrete, so the final state is U * psi_0.
+    Final amplitudes are chosen to match the probabilities (with random phases), psi_0 = U^dagger * psi_f.
+    :param delta: delta of the quantum branch, "!=" moves every probability further than delta from its target.
+    :param tolerance: numerical tolerance of the final probabilities.
+    :return: (initial state, time), or None if the constraint shape is not supported.
+    """
+    start = time.time()
+    num_states = 2 ** num_qbits
+
+    if flag == "==":
+        probabilities = eq_probabilities(prob_constraint, num_states)
+    elif flag == "!=":
+        probabilities = neq_probabilities(prob_constraint, num_states, delta)
+    elif flag == ">":
+        probabilities = gt_probabilities(prob_constraint, num_states)
+    elif flag == "<":
+        probabilities = lt_probabilities(prob_constraint, num_states)
+    else:
+        probabilities = None
+
+    if probabilities is None:
+        return None
+
+    qbit_name = [f"q{i}" for i in range(num_qbits)]
+    try:
+        circuit = Circuit(Qbits(qbit_name), program=operations_to_program(num_qbits, operations))
+        unitary = np.array(circuit.unitary(), dtype=complex)
+    except Exception:
+        return None
+
+    phases = np.exp(1j * np.random.uniform(0, 2 * np.pi, num_states))
+    final_state = np.sqrt(probabilities) * phases
+    initial_state = unitary.conj().T @ final_state
+
+    # 只有酉矩阵的共轭转置才是逆矩阵，不满足时交给SMT求解器
+    if not np.allclose(np.abs(unitary @ initial_state) ** 2, probabilities, atol=tolerance):
+        return None
+
+    return [complex(amplitude) for amplitude in initial_state], time.time() - start
+
+
+def qubit_components(num_qbits, operations):
+    """
+    Connected components of the qubits, two qubits are connected if a gate acts on both.
+    Qubits of different components are never entangled by the circuit.
+    :return: sorted lists of qiskit qubit indices.
+    """
+    parent = list(range(num_qbits))
+
+    def find(q):
+        while parent[q] != q:
+            parent[q] = parent[parent[q]]
+            q = parent[q]
+        return q
+
+    for gate_op in as_gate_ops(operations):
+        for q in gate_op.qubits[1:]:
+            parent[find(q)] = find(gate_op.qubits[0])
+
+    components = {}
+    for q in range(num_qbits):
+        components.setdefault(find(q), []).append(q)
+    return sorted(components.values())
+
+
+def component_operations(component, operations):
+    # 只保留作用在这个分量上的门，qubit重新编号为分量中的位置
+    position = {q: i for i, q in enumerate(component)}
+    return [GateOp(gate_op.name, tuple(position[q] for q in gate_op.qubits), gate_op.params)
+            for gate_op in as_gate_ops(operations) if gate_op.qubits[0] in position]
+
+
+def marginal_probabilities(probabilities, num_qbits, component):
+    # 状态的下标中第i位对应qiskit的第i个qubit，张量的第0维是最高位
+    tensor = np.reshape(probabilities, [2] * num_qbits)
+    axes = tuple(num_qbits - 1 - q for q in range(num_qbits) if q not in component)
+    return np.reshape(np.sum(tensor, axis=axes), -1)
+
+
+def combine_component_states(num_qbits, components, states):
+    """
+    Kronecker product of the initial states of the components, with the qubits moved back to their positions.
+    :return: initial state of the whole circuit.
+    """
+    tensor = np.ones([])
+    # 外积之后张量的维度依次对应每个分量从高到低的qubit
+    order = []
+    for component, state in zip(components, states):
+        tensor = np.multiply.outer(tensor, np.reshape(np.array(state, dtype=complex), [2] * len(component)))
+        order += sorted(component, reverse=True)
+    tensor = np.transpose(tensor, [order.index(q) for q in range(num_qbits - 1, -1, -1)])
+    return np.reshape(tensor, -1)
+
+
+def decomposed_constraint_solver(num_qbits, operations, prob_constraint, flag, method="numeric", delta=0.00001):
+    """
+    Solve the constraint separately for the qubit components that the circuit never entangles.
+    Only equality constraints whose target probabilities are the product of their marginals factor this way.
+    :return: (initial state, time), or None if the circuit or the constraint does not factor.
+    """
+    start = time.time()
+    components = qubit_components(num_qbits, operations)
+
+    if flag != "==" or len(components) < 2:
+        return None
+
+    probabilities = eq_probabilities(prob_constraint, 2 ** num_qbits)
+    if probabilities is None:
+        return None
+
+    marginals = [marginal_probabilities(probabilities, num_qbits, component) for component in components]
+    product = combine_component_states(num_qbits, components, marginals).real
+    if not np.allclose(product, probabilities, atol=delta):
+        return None
+
+    states = []
+    for component, marginal in zip(components, marginals):
+        result = quantum_constraint_solver(len(component), component_operations(component, operations),
+                                           list(marginal), flag, method)
+        if result is None:
+            return None
+        states.append(result[0])
+
+    initial_state = combine_component_states(num_qbits, components, states)
+    return [complex(amplitude) for amplitude in initial_state], time.time() - start
+
+
+def quantum_constraint_solver(num_qbits, operations, prob_constraint, flag, method="numeric", delta=0.01):
+    # delta为量子分支的delta(check_state_eq等的参数)
+    # 电路没有纠缠的qubit分量各自求解，再通过Kronecker积组合
+    result = decomposed_constraint_solver(num_qbits, operations, prob_constraint, flag, method)
+    if result is not None:
+        return result
+
+    # method为"numeric"时先尝试直接计算初始状态，不支持的约束再使用SMT求解器
+    if method == "numeric":
+        result = numeric_constraint_solver(num_qbits, operations, prob_constraint, flag, delta)
+        if result is not None:
+            return result
+
     qbit_name = [f"q{i}" for i in range(num_qbits)]
     symbolic_qubit_list = Qbits(qbit_name)
-    num_operations = len(operations)
 
     # generate symbolic circuit
     circuit = Circuit(symbolic_qubit_list, program=operations_to_program(num_qbits, operations))
 
     circuit.initialize([None for i in range(num_qbits)])
-    final_state_list = [f"psi_{num_operations}_{i}" for i in range(2 ** num_qbits)]
     initial_state_list = [f"psi_{0}_{i}" for i in range(2 ** num_qbits)]
 
-    symbolic_state_list = Complexes(final_state_list)
+    # 合并的门之间没有中间状态，末态的变量名由编码决定
+    symbolic_state_list = circuit.final_state(fuse_gates=True)
 
     if flag == "==":
         circuit = eq_constraint(prob_constraint, symbolic_state_list, circuit)
     elif flag == "!=":
         circuit = neq_constraint(prob_constraint, symbolic_state_list, circuit)
 
-    result, time_full = circuit.prove(overapproximation=False)
+    result, time_full = circuit.prove(overapproximation=False, fuse_gates=True)
 
     # print(result)
-    output = result.stdout.decode("utf-8")
-    quantum_result = output.replace("define-fun", "").replace("() Real", "!").split("\n")[2:-2]
-
-    result_dict = {}
-    for obj in quantum_result:
-        state_name, state_value = obj.split("!")
-        state_name, state_value = state_name[4:], ast.literal_eval(state_value[1:-1])
-        if state_name[4] == "0":
-            result_dict[state_name] = state_value
+    sat_result, model = parse_model(result.stdout.decode("utf-8"))
 
     result_state = []
     for state_obj in initial_state_list:
-        temp1, temp2 = result_dict.get(state_obj + ".r "), result_dict.get(state_obj + ".i ")
-        if type(temp1).__name__ == "list":
+        temp1, temp2 = model.get(state_obj + ".r"), model.get(state_obj + ".i")
+        if isinstance(temp1, list):
             temp1 = temp1[0]
-        if type(temp2).__name__ == "list":
+        if isinstance(temp2, list):
             temp2 = temp2[0]
         result_state.append(complex(temp1, temp2))
 
@@ -62,5 +254,11 @@ def quantum_constraint_solver(num_qbits, operations, prob_constraint, flag):
 
 
 if __name__ == "__main__":
-    result, time = quantum_constraint_solver(2, ["h(0)", "z(0)", "h(1)", "cnot(0,1)"], [0.25, 0.2, 0.2, 0.35], flag="==")
-    print(result)
\ No newline at end of file
+    circuit = Circuit(Qbits(["q0", "q1"]), program=operations_to_program(2, ["h(0)", "z(0)", "h(1)", "cnot(0,1)"]))
+    print(circuit.encoding_size_report())
+    result, time_full = quantum_constraint_solver(2, ["h(0)", "z(0)", "h(1)", "cnot(0,1)"], [0.25, 0.2, 0.2, 0.35], flag="==")
+    print(result, time_full)
+    result, time_full = quantum_constraint_solver(2, ["h(0)", "z(0)", "h(1)", "cnot(0,1)"], [0.25, 0.2, 0.2, 0.35], flag="==",
+                                                  method="smt")
+    print(result, time_full)
+    print(gate_cache.report())
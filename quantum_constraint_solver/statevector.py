@@ -0,0 +1,161 @@
+import cmath
+import math
+
+import numpy as np
+
+from quantum_constraint_solver.gate_ops import as_gate_ops
+
+
+# 轻量的状态向量模拟器，直接执行符号电路记录的GateOp
+# 量子分支只有1-6个qubit，numpy的张量运算比qiskit的transpile和Aer的调用快得多
+# 状态向量的下标和qiskit一致：第i位是第i个qubit，reshape成张量后第0维是最高位的qubit
+
+def _u(theta, phi, lam):
+    return np.array([[math.cos(theta / 2), -cmath.exp(1j * lam) * math.sin(theta / 2)],
+                     [cmath.exp(1j * phi) * math.sin(theta / 2), cmath.exp(1j * (phi + lam)) * math.cos(theta / 2)]])
+
+
+def _p(lam):
+    return np.array([[1, 0], [0, cmath.exp(1j * lam)]])
+
+
+def _rx(theta):
+    return np.array([[math.cos(theta / 2), -1j * math.sin(theta / 2)],
+                     [-1j * math.sin(theta / 2), math.cos(theta / 2)]])
+
+
+def _ry(theta):
+    return np.array([[math.cos(theta / 2), -math.sin(theta / 2)],
+                     [math.sin(theta / 2), math.cos(theta / 2)]])
+
+
+def _rz(lam):
+    return np.array([[cmath.exp(-0.5j * lam), 0], [0, cmath.exp(0.5j * lam)]])
+
+
+def controlled(matrix, num_controls=1):
+    # 控制qubit在前，全部为1时执行matrix
+    dimension = matrix.shape[0] * 2 ** num_controls
+    result = np.eye(dimension, dtype=complex)
+    result[dimension - matrix.shape[0]:, dimension - matrix.shape[0]:] = matrix
+    return result
+
+
+_h = np.array([[1, 1], [1, -1]]) / math.sqrt(2)
+_x = np.array([[0, 1], [1, 0]])
+_y = np.array([[0, -1j], [1j, 0]])
+_z = np.array([[1, 0], [0, -1]])
+_sx = np.array([[1 + 1j, 1 - 1j], [1 - 1j, 1 + 1j]]) / 2
+_swap = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
+_iswap = np.array([[1, 0, 0, 0], [0, 0, 1j, 0], [0, 1j, 0, 0], [0, 0, 0, 1]])
+
+# 门的矩阵，参数是GateOp中的params，矩阵的行列按调用时qubit的顺序排列(第一个qubit是最高位)
+# 和qiskit_plugin.gate_builders支持的门相同
+gate_matrices = {
+    "h": lambda params: _h,
+    "x": lambda params: _x,
+    "y": lambda params: _y,
+    "z": lambda params: _z,
+    "s": lambda params: _p(math.pi / 2),
+    "sdg": lambda params: _p(-math.pi / 2),
+    "t": lambda params: _p(math.pi / 4),
+    "tdg": lambda params: _p(-math.pi / 4),
+    "sx": lambda params: _sx,
+    "sxdg": lambda params: _sx.conj(),
+    "p": lambda params: _p(params[0]),
+    "rx": lambda params: _rx(params[0]),
+    "ry": lambda params: _ry(params[0]),
+    "rz": lambda params: _rz(params[0]),
+    "u": lambda params: _u(params[0], params[1], params[2]),
+    "cx": lambda params: controlled(_x),
+    "cnot": lambda params: controlled(_x),
+    "ch": lambda params: controlled(_h),
+    "cs": lambda params: controlled(_p(math.pi / 2)),
+    "csdg": lambda params: controlled(_p(-math.pi / 2)),
+    "cz": lambda params: controlled(_z),
+    "csx": lambda params: controlled(_sx),
+    "cp": lambda params: controlled(_p(params[0])),
+    "crx": lambda params: controlled(_rx(params[0])),
+    "cry": lambda params: controlled(_ry(params[0])),
+    "crz": lambda params: controlled(_rz(params[0])),
+    "cu": lambda params: controlled(cmath.exp(1j * params[3]) * _u(params[0], params[1], params[2])),
+    "swap": lambda params: _swap,
+    "iswap": lambda params: _iswap,
+    "cswap": lambda params: controlled(_swap),
+    "ccx": lambda params: controlled(_x, 2),
+    "ccz": lambda params: controlled(_z, 2),
+}
+
+
+def gate_matrix(gate_op):
+    if gate_op.name not in gate_matrices:
+        raise Exception(f'Gate {gate_op.name} is not supported.')
+    return gate_matrices[gate_op.name](gate_op.params)
+
+
+def apply_gate(state, num_qubits, matrix, qubits):
+    """
+    Apply a gate to the qubits of a state tensor of shape [2] * num_qubits.
+    :return: new state tensor.
+    """
+    k = len(qubits)
+    axes = [num_qubits - 1 - q for q in qubits]
+    gate = np.reshape(matrix, [2] * (2 * k))
+    # 门的输入维度和状态中这些qubit的维度收缩，结果的前k维是门的输出，再移回原来的位置
+    result = np.tensordot(gate, state, axes=(list(range(k, 2 * k)), axes))
+    return np.moveaxis(result, list(range(k)), axes)
+
+
+def simulate(num_qubits, operations, initial_state=None):
+    """
+    Statevector after executing the operations (GateOps or strings such as "cx(0,1)").
+    :param initial_state: initial state vector, |0...0> if None.
+    :return: state vector of length 2^num_qubits.
+    """
+    if initial_state is None:
+        state = np.zeros(2 ** num_qubits, dtype=complex)
+        state[0] = 1
+    else:
+        state = np.array(initial_state, dtype=complex)
+
+    state = np.reshape(state, [2] * num_qubits)
+    for gate_op in as_gate_ops(operations):
+        state = apply_gate(state, num_qubits, gate_matrix(gate_op), gate_op.qubits)
+    return np.reshape(state, -1)
+
+
+def unitary(num_qubits, operations):
+    # 同时模拟单位矩阵的每一列(张量最后一维)，得到整个电路的矩阵
+    dimension = 2 ** num_qubits
+    state = np.reshape(np.eye(dimension, dtype=complex), [2] * num_qubits + [dimension])
+    for gate_op in as_gate_ops(operations):
+        state = apply_gate(state, num_qubits, gate_matrix(gate_op), gate_op.qubits)
+    return np.reshape(state, [dimension, dimension])
+
+
+def random_states(num_qubits, count, seed=None):
+    # count个随机的归一化状态向量，每一列是一个状态
+    rng = np.random.default_rng(seed)
+    states = rng.normal(size=(2 ** num_qubits, count)) + 1j * rng.normal(size=(2 ** num_qubits, count))
+    return states / np.linalg.norm(states, axis=0)
+
+
+def probabilities(state):
+    return np.abs(state) ** 2
+
+
+def sample(probabilities, shots, batch=1, seed=None):
+    """
+    Sample measurement results of all qubits.
+    :param probabilities: probabilities of the basis states, or a 2-d array with one distribution per row.
+    :param shots: measurements per sample.
+    :param batch: number of samples drawn for each distribution.
+    :return: counts of every basis state, shape (batch, 2^n), or (rows, batch, 2^n) for several distributions.
+    """
+    rng = np.random.default_rng(seed)
+    probabilities = np.asarray(probabilities, dtype=float)
+    # 舍入误差会让概率之和略微偏离1
+    probabilities = probabilities / np.sum(probabilities, axis=-1, keepdims=True)
+    if probabilities.ndim == 1:
+        return rng.multinomial(shots, probabilities, size=batch)
+    return rng.multinomial(shots, probabilities, size=(batch, probabilities.shape[0])).swapaxes(0, 1)
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.gate_ops import as_gate_ops
+
+
+# 探索时每次执行都从头执行相同的门序列，不同的执行只在几个经典分支之后才有区别
+# 这里用前缀树保存门序列，每个节点保存执行到这里的状态向量，新的执行从缓存中最深的前缀继续模拟
+# 前缀树的根由qubit数和初始状态决定
+
+class PrefixNode:
+    __slots__ = ("parent", "gate", "children", "state")
+
+    def __init__(self, parent, gate):
+        self.parent = parent
+        self.gate = gate
+        self.children = {}
+        self.state = None
+
+
+class StatevectorCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        # max_bytes: 缓存的状态向量最多占用的内存
+        self.max_bytes = max_bytes
+        self.roots = {}
+        # 保存了状态向量的节点，按最近使用的顺序排列
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_gates = 0
+        self.applied_gates = 0
+
+    def simulate(self, num_qubits, operations, initial_state=None):
+        """
+        Statevector after executing the operations, resuming from the deepest cached prefix.
+        :return: read-only state vector of length 2^num_qubits.
+        """
+        if initial_state is None:
+            initial_state = np.zeros(2 ** num_qubits, dtype=complex)
+            initial_state[0] = 1
+        initial_state = np.array(initial_state, dtype=complex)
+
+        key = (num_qubits, initial_state.tobytes())
+        if key not in self.roots:
+            self.roots[key] = PrefixNode(None, key)
+        root = self.roots[key]
+
+        # 找到保存了状态向量的最深的前缀
+        gates = as_gate_ops(operations)
+        node = root
+        deepest = (root, 0)
+        for (i, gate) in enumerate(gates):
+            node = node.children.get(gate)
+            if node is None:
+                break
+            if node.state is not None:
+                deepest = (node, i + 1)
+
+        (node, depth) = deepest
+        if depth == 0 and root.state is None:
+            # 被淘汰的根只在没有可用的前缀时重新保存，否则会在查找之前淘汰更有用的状态
+            self._store(root, np.reshape(initial_state, [2] * num_qubits))
+        if depth > 0:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.reused_gates += depth
+        self.applied_gates += len(gates) - depth
+        self._touch(node)
+
+        state = node.state
+        for gate in gates[depth:]:
+            state = statevector.apply_gate(state, num_qubits, statevector.gate_matrix(gate), gate.qubits)
+            child = node.children.get(gate)
+            if child is None:
+                child = PrefixNode(node, gate)
+                node.children[gate] = child
+            node = child
+            self._store(node, state)
+
+        # 淘汰时可能删除了路径上的节点，这里返回的是计算的结果而不是节点中的状态
+        return np.reshape(state, -1)
+
+    def _touch(self, node):
+        if node.state is not None:
+            self.entries.move_to_end(id(node))
+
+    def _store(self, node, state):
+        state.setflags(write=False)
+        if node.state is None:
+            self.size += state.nbytes
+        node.state = state
+        self.entries[id(node)] = node
+        self.entries.move_to_end(id(node))
+
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            (_, evicted) = self.entries.popitem(last=False)
+            self._evict(evicted)
+
+    def _evict(self, node):
+        self.size -= node.state.nbytes
+        node.state = None
+        # 没有状态也没有子节点的节点不再有用，从前缀树中删除
+        while node is not None and node.state is None and len(node.children) == 0:
+            siblings = self.roots if node.parent is None else node.parent.children
+            if siblings.get(node.gate) is node:
+                del siblings[node.gate]
+            node = node.parent
+
+    def clear(self):
+        self.roots.clear()
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_gates = 0
+        self.applied_gates = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def report(self):
+        total_gates = self.reused_gates + self.applied_gates
+        return f'Statevector cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate():.1f}% hit rate), ' \
+               f'{self.reused_gates} of {total_gates} gates reused, ' \
+               f'{self.size // 1024} of {self.max_bytes // 1024} KiB in {len(self.entries)} states'
+
+
+# 同一个进程中的所有电路共享
+statevector_cache = StatevectorCache()
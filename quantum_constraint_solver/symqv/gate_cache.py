@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+import numpy as np
+
+from quantum_constraint_solver.symqv.utils_file.arithmetic import SparseMatrix
+
+# Approximate size of a nonzero entry of the sparse form: list slot, (column, entry) tuple, int and complex
+_sparse_entry_bytes = 124
+# Approximate size of the list of a row of the sparse form
+_sparse_row_bytes = 64
+
+
+class EmbeddedGate:
+    def __init__(self, sparse: SparseMatrix):
+        """
+        Gate embedded into the whole system, only the sparse form used by the state model is kept.
+        :param sparse: sparse matrix of dimension 2^n x 2^n (it is shared between circuits, do not modify it).
+        """
+        self.sparse = sparse
+        self.nbytes = _sparse_entry_bytes * sparse.nonzeros() + _sparse_row_bytes * len(sparse.rows)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Dense matrix, built on every access for the encodings that need it, it is not cached.
+        :return: matrix of dimension 2^n x 2^n.
+        """
+        return self.sparse.to_dense()
+
+
+class GateCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        LRU cache of embedded gate matrices, bounded by memory: the sparse form of an embedded gate of n qbits
+        has at least 2^n entries, so its size grows quickly with the number of qbits.
+        :param max_bytes: maximum size of the sparse forms kept.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[Hashable], build: Callable[[], SparseMatrix]) -> EmbeddedGate:
+        """
+        Embedded gate for a key, built on a miss.
+        :param key: key of the embedded gate, None if it can not be cached (symbolic entries).
+        :param build: function building the sparse matrix of dimension 2^n x 2^n.
+        :return: embedded gate.
+        """
+        if key is None:
+            return EmbeddedGate(build())
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        embedded_gate = EmbeddedGate(build())
+
+        if embedded_gate.nbytes > self.max_bytes:
+            # Larger than the whole cache, it would evict every other gate
+            return embedded_gate
+
+        self.entries[key] = embedded_gate
+        self.size += embedded_gate.nbytes
+
+        while self.size > self.max_bytes:
+            (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+        return embedded_gate
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def report(self) -> str:
+        return f'Gate cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate():.1f}% hit rate), ' \
+               f'{self.size // 1024} of {self.max_bytes // 1024} KiB in {len(self.entries)} gates'
+
+
+def gate_key(name: str, parameter, matrix: np.ndarray, qbit_indices: Tuple[int, ...]) -> Optional[Tuple]:
+    """
+    Key of a gate matrix applied to qbits.
+    :param name: gate name.
+    :param parameter: gate parameter.
+    :param matrix: gate matrix.
+    :param qbit_indices: indices of the qbits the gate is applied to.
+    :return: key, None for symbolic gates.
+    """
+    if matrix is None or matrix.dtype == np.dtype('O'):
+        return None
+
+    # gates created by Gate.__pow__ share their name, the matrix tells them apart
+    return name, str(parameter), tuple(qbit_indices), matrix.tobytes()
+
+
+# Shared by all circuits of the process
+gate_cache = GateCache()
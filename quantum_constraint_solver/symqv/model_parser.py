@@ -0,0 +1,131 @@
+import collections
+import re
+from typing import List, Tuple, Union
+
+# Tokens of solver output: parentheses, dReal intervals, string literals and atoms
+_token = re.compile(r'\s*(?:(\()|(\))|\[([^\]]*)\]|("(?:[^"]|"")*")|([^\s()\[\]"]+))')
+
+_sat_results = ['sat', 'delta-sat', 'unsat', 'unknown']
+
+
+class Interval(list):
+    """
+    dReal interval value [lower, upper].
+    """
+    pass
+
+
+class ModelParser:
+    def __init__(self):
+        """
+        Single pass parser of solver output: the sat result, followed by an S-expression model.
+        Output can be fed line by line while the solver writes it.
+        """
+        self.sat_result = ''
+        self.model = collections.OrderedDict()
+        self.errors = []
+        self._stack = []
+
+    def feed(self, line: str):
+        """
+        Parse one line of solver output.
+        :param line: output line.
+        :return: void.
+        """
+        words = line.split(None, 1)
+
+        if len(words) > 0 and not line[0].isspace() and words[0] in _sat_results:
+            # A new answer starts (also after a solver was restarted in the middle of an answer,
+            # the unfinished expression of the old answer is dropped)
+            self.sat_result = line.rstrip('\n').replace('delta', 'δ')
+            self.model = collections.OrderedDict()
+            self.errors = []
+            self._stack = []
+            return
+
+        position = 0
+
+        while position < len(line):
+            match = _token.match(line, position)
+
+            if match is None:
+                break
+
+            position = match.end()
+            (opening, closing, interval, string, atom) = match.groups()
+
+            if opening is not None:
+                self._stack.append([])
+            elif closing is not None:
+                if len(self._stack) == 0:
+                    continue
+
+                expression = self._stack.pop()
+
+                if len(self._stack) == 0:
+                    self._top_level(expression)
+                else:
+                    self._stack[-1].append(expression)
+            elif len(self._stack) > 0:
+                if interval is not None:
+                    self._stack[-1].append(Interval([float(v) for v in interval.split(',')]))
+                else:
+                    self._stack[-1].append(string if string is not None else atom)
+
+    def _top_level(self, expression: List):
+        if len(expression) > 0 and expression[0] == 'error':
+            self.errors.append(expression[1].strip('"') if len(expression) > 1 else '')
+        elif len(expression) > 0 and expression[0] == 'define-fun':
+            self._define(expression)
+        else:
+            # (model (define-fun ...) ...) or ((define-fun ...) ...)
+            for element in expression:
+                if isinstance(element, list) and len(element) > 0 and element[0] == 'define-fun':
+                    self._define(element)
+
+    def _define(self, expression: List):
+        # (define-fun name () Sort value)
+        if len(expression) >= 5:
+            self.model[expression[1]] = to_value(expression[4])
+
+
+def to_value(expression) -> Union[float, bool, Interval, str]:
+    """
+    Value of a model S-expression.
+    :param expression: parsed S-expression.
+    :return: float, boolean, interval or the verbatim expression if it is not a number.
+    """
+    if isinstance(expression, Interval):
+        return expression
+    elif isinstance(expression, str):
+        if expression == 'true' or expression == 'false':
+            return expression == 'true'
+
+        try:
+            return float(expression.rstrip('?'))
+        except ValueError:
+            return expression
+    elif len(expression) == 2 and expression[0] == '-':
+        value = to_value(expression[1])
+        return -value if isinstance(value, float) else ['-', value]
+    elif len(expression) == 3 and expression[0] == '/':
+        (numerator, denominator) = (to_value(expression[1]), to_value(expression[2]))
+
+        if isinstance(numerator, float) and isinstance(denominator, float):
+            return numerator / denominator
+
+    return expression
+
+
+def parse_model(output: str) -> Tuple[str, collections.OrderedDict]:
+    """
+    Parse complete solver output.
+    :param output: solver output.
+    :return: sat result and model (variable name to value).
+    """
+    parser = ModelParser()
+
+    for line in output.splitlines():
+        parser.feed(line)
+
+    return parser.sat_result, parser.model
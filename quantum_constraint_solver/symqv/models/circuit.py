@@ -13,17 +13,21 @@ from quantum_constraint_solver.symqv.constants import I_matrix, CNOT_matrix, SWA
 # 引入qbit的设定方法
 from quantum_constraint_solver.symqv.expressions.qbit import QbitVal, Qbits
 from quantum_constraint_solver.symqv.expressions.rqbit import RQbitVal, RQbits
-from quantum_constraint_solver.symqv.expressions.complex import Complexes
+from quantum_constraint_solver.symqv.expressions.complex import ComplexVal, Complexes
+from quantum_constraint_solver.symqv.gate_cache import EmbeddedGate, gate_cache, gate_key
 from quantum_constraint_solver.symqv.globals import precision_format
 from quantum_constraint_solver.symqv.models.gate import Gate
 from quantum_constraint_solver.symqv.models.measurement import Measurement
 from quantum_constraint_solver.symqv.models.state_sequence import StateSequence
 from quantum_constraint_solver.symqv.operations.measurements import zero_measurement, one_measurement
+from quantum_constraint_solver.symqv.smt_writer import SmtWriter
 from quantum_constraint_solver.symqv.solver import solve, write_smt_file, SpecificationType
-from quantum_constraint_solver.symqv.utils_file.arithmetic import state_equals, state_equals_value, matrix_vector_multiplication, \
-    complex_kron_n_ary, kron, state_equals_phase_oracle
-from quantum_constraint_solver.symqv.utils_file.helpers import get_qbit_indices, identity_pad_gate, to_complex_matrix, \
-    identity_pad_single_qbit_gates, are_qbits_reversed, are_qbits_adjacent, swap_transform_non_adjacent_gate
+from quantum_constraint_solver.symqv.solver_pool import dreal_pool, z3_pool
+from quantum_constraint_solver.symqv.utils_file.arithmetic import state_equals, state_equals_value, complex_kron_n_ary, \
+    kron, SparseMatrix
+from quantum_constraint_solver.symqv.utils_file.helpers import get_qbit_indices, identity_pad_gate, \
+    identity_pad_single_qbit_gates, are_qbits_reversed, are_qbits_adjacent, swap_transform_non_adjacent_gate, \
+    apply_gate, padded_gate_qbits, non_adjacent_gate_qbits
 
 import subprocess
 
@@ -87,96 +91,166 @@ class Circuit:
 
         self.initial_gate_applications = gates
 
-    def prove(self,
-              dump_smt_encoding: bool = False,
-              dump_solver_output: bool = False,
-              measurement_branch: int = None,
-              file_generation_only: bool = False,
-              synthesize_repair: bool = False,
-              overapproximation: bool = False) -> Union[
-        Tuple[str, collections.OrderedDict, float], Tuple[NamedTemporaryFile, Set[str]]]:
+    def unitary(self) -> np.ndarray:
+        """
+        Compose the unitary of the whole program, embedding each gate as the state model does.
+        :return: unitary matrix of dimension 2^n x 2^n.
+        """
+        unitary = np.eye(2 ** self.num_qbits, dtype=complex)
 
-        return self._prove_state_model(dump_smt_encoding,
-                                       dump_solver_output,
-                                       measurement_branch,
-                                       file_generation_only,
-                                       synthesize_repair,
-                                       overapproximation)
+        for operation in self.program:
+            if isinstance(operation, Measurement) or \
+                    (isinstance(operation, Gate) and operation.oracle_value is not None):
+                raise Exception('Unitary is only defined for programs without measurements and oracles.')
 
-    def _prove_state_model(self,
-                           dump_smt_encoding: bool = False,
-                           dump_solver_output: bool = False,
-                           measurement_branch: int = None,
-                           file_generation_only: bool = False,
-                           synthesize_repair: bool = False,
-                           overapproximation: bool = False) -> Union[Tuple[str, collections.OrderedDict, float],
-    Tuple[NamedTemporaryFile, Set[str]]]:
+            unitary = self._apply_operation(operation, unitary)
+
+        return unitary
+
+    def _operation_factors(self, operation: Union[Gate, List[Gate]]) -> List[Tuple[np.ndarray, List[int]]]:
         """
-        Prove a quantum circuit according to the state model, symbolically encoding states as full vectors.
-        :param dump_smt_encoding:  print the utils_file encoding.
-        :param dump_solver_output: print the verbatim solver random_vector_output.
-        :param measurement_branch: which measurement branch to consider (optional, only used by parallel evaluation).
-        :param file_generation_only: only generate file, don't call solver.
-        :param synthesize_repair: Synthesize repair to make the circuit fulfill the specification.
-        :return: Solver random_vector_output.
+        Gate matrices of an operation (a gate or a list of gates applied in parallel),
+        each with the system qbits it acts on, in application order.
+        :param operation: gate or list of gates.
+        :return: list of (gate matrix, qbit indices in the order of the gate's tensor factors).
         """
-        start_full = time.time()
+        factors = []
+
+        for gate in ([operation] if isinstance(operation, Gate) else operation):
+            qbit_indices = get_qbit_indices([q.get_identifier() for q in self.qbits], gate.arguments)
+
+            if not are_qbits_adjacent(qbit_indices):
+                factors.append((gate.matrix, non_adjacent_gate_qbits(qbit_indices)))
+            else:
+                matrix = gate.matrix if not are_qbits_reversed(qbit_indices) else gate.matrix_swapped
+                factors.append((matrix, padded_gate_qbits(matrix, qbit_indices)))
+
+        return factors
+
+    def _apply_operation(self, operation: Union[Gate, List[Gate]], operand: np.ndarray) -> np.ndarray:
+        """
+        Apply an operation to a state vector or matrix by tensor contraction.
+        :param operation: gate or list of gates.
+        :param operand: state vector of dimension 2^n or matrix with 2^n rows.
+        :return: operation applied to the operand.
+        """
+        for (matrix, gate_qbits) in self._operation_factors(operation):
+            operand = apply_gate(matrix, gate_qbits, self.num_qbits, operand)
+
+        return operand
+
+    def _operation_matrix(self, operation: Union[Gate, List[Gate]]) -> np.ndarray:
+        """
+        Dense matrix of a gate (or a list of gates applied in parallel) on the whole system.
+        :param operation: gate or list of gates.
+        :return: matrix of dimension 2^n x 2^n.
+        """
+        return self._embedded_operation(operation).matrix
+
+    def _embedded_operation(self, operation: Union[Gate, List[Gate]]) -> EmbeddedGate:
+        """
+        Embedded matrix of an operation, shared through the gate cache.
+        :param operation: gate or list of gates.
+        :return: embedded gate.
+        """
+        return self._embedded_run([operation])
+
+    def _embedded_run(self, operations: List[Union[Gate, List[Gate]]]) -> EmbeddedGate:
+        """
+        Sparse product of the embedded matrices of a run of operations, shared through the gate cache.
+        :param operations: operations in application order.
+        :return: embedded gate.
+        """
+        keys = []
+
+        for operation in operations:
+            gate_keys = []
+
+            for gate in ([operation] if isinstance(operation, Gate) else operation):
+                qbit_indices = get_qbit_indices([q.get_identifier() for q in self.qbits], gate.arguments)
+                gate_keys.append(gate_key(gate.name, gate.parameter, gate.matrix, qbit_indices))
+
+            keys.append(None if None in gate_keys else tuple(gate_keys))
+
+        key = None if None in keys else (tuple(keys), self.num_qbits)
+
+        def build():
+            # sparse product of the gates, the dense 2^n x 2^n matrix is never built
+            matrix = None
+
+            for operation in operations:
+                for (gate_matrix, gate_qbits) in self._operation_factors(operation):
+                    factor = SparseMatrix.from_gate(gate_matrix, gate_qbits, self.num_qbits)
+                    matrix = factor if matrix is None else factor.multiply(matrix)
+
+            return matrix
+
+        return gate_cache.get(key, build)
+
+    def _embedded_measurement(self, measurement: np.ndarray, qbit_indices: List[int]) -> EmbeddedGate:
+        """
+        Embedded matrix of a measurement projection, shared through the gate cache.
+        :param measurement: projection on the measured qbits.
+        :param qbit_indices: indices of the measured qbits.
+        :return: embedded gate.
+        """
+        key = gate_key('measurement', None, measurement, qbit_indices)
+
+        if key is not None:
+            key = (key, self.num_qbits)
+
+        gate_qbits = padded_gate_qbits(measurement, qbit_indices)
+        return gate_cache.get(key, lambda: SparseMatrix.from_gate(measurement, gate_qbits, self.num_qbits))
 
+    def _encode_state_model(self,
+                            measurement_branch: int = None,
+                            synthesize_repair: bool = False,
+                            fuse_gates: bool = False) -> StateSequence:
+        """
+        Add the state model of the program to the SMT writer.
+        :param measurement_branch: which measurement branch to consider (optional).
+        :param synthesize_repair: Synthesize repair to make the circuit fulfill the specification.
+        :param fuse_gates: multiply runs of gates into one unitary instead of encoding every intermediate state.
+        :return: state sequence of the encoding.
+        """
         state_sequence = StateSequence(self.qbits)
+        # 电路的状态方程直接写成SMT-LIB，不经过z3表达式
+        self.smt_writer = SmtWriter(rewrites={'distinct': '='})
 
         if self.initial_gate_applications is not None:
             combined_initial_gate = identity_pad_gate(I_matrix, [0], self.num_qbits)
 
+        # gates since the last emitted state
+        fused = None
+
         for (i, operation) in enumerate(self.program):
             if isinstance(operation, Gate) or isinstance(operation, List):
                 if len(state_sequence.measured_states) > 0:
                     raise Exception('Gates after measurement are not supported.')
 
+                if fuse_gates and not (isinstance(operation, Gate) and operation.oracle_value is not None):
+                    # the gate matrices are concrete, only the state after the whole run is needed
+                    if fused is None:
+                        fused = []
+                    fused.append(operation)
+                    continue
+
+                self._emit_fused_state(state_sequence, fused)
+                fused = None
+
                 previous_state = state_sequence.states[-1]
                 next_state = state_sequence.add_state()
 
-                if isinstance(operation, Gate) and operation.oracle_value is None:
-                    qbit_indices = get_qbit_indices([q.get_identifier() for q in self.qbits], operation.arguments)
-
-                    if not are_qbits_adjacent(qbit_indices):
-                        state_operation = swap_transform_non_adjacent_gate(operation.matrix,
-                                                                           qbit_indices,
-                                                                           self.num_qbits)
-                    else:
-                        state_operation = identity_pad_gate(operation.matrix
-                                                            if not are_qbits_reversed(qbit_indices)
-                                                            else operation.matrix_swapped,
-                                                            qbit_indices,
-                                                            self.num_qbits)
-
-                    self.solver.add(state_equals(next_state,
-                                                 matrix_vector_multiplication(to_complex_matrix(state_operation),
-                                                                              previous_state)))
-                elif isinstance(operation, Gate) and operation.oracle_value is not None:
-                    self.solver.add(state_equals_phase_oracle(previous_state, next_state, operation.oracle_value))
+                if isinstance(operation, Gate) and operation.oracle_value is not None:
+                    self.smt_writer.add_phase_oracle(previous_state, next_state, operation.oracle_value)
                 else:
-                    state_operation = identity_pad_gate(I_matrix, [0], self.num_qbits)
+                    state_operation = self._embedded_operation(operation).sparse
 
-                    for operation_element in operation:
-                        qbit_indices = get_qbit_indices([q.get_identifier() for q in self.qbits],
-                                                        operation_element.arguments)
-
-                        if not are_qbits_adjacent(qbit_indices):
-                            state_operation = swap_transform_non_adjacent_gate(operation_element.matrix,
-                                                                               qbit_indices,
-                                                                               self.num_qbits)
-                        else:
-                            state_operation = np.matmul(identity_pad_gate(operation_element.matrix
-                                                                          if not are_qbits_reversed(qbit_indices)
-                                                                          else operation_element.matrix_swapped,
-                                                                          qbit_indices,
-                                                                          self.num_qbits),
-                                                        state_operation)
-
-                    self.solver.add(state_equals(next_state,
-                                                 matrix_vector_multiplication(to_complex_matrix(state_operation),
-                                                                              previous_state)))
+                    self.smt_writer.add_state_equation(next_state, state_operation, previous_state)
             elif isinstance(operation, Measurement):
+                self._emit_fused_state(state_sequence, fused)
+                fused = None
+
                 previous_state = state_sequence.states[-1]
                 exists_measurement_state = len(state_sequence.measured_states) > 0
 
@@ -186,23 +260,18 @@ class Circuit:
                     qbit_index = get_qbit_indices([q.get_identifier() for q in self.qbits], [operation.arguments])[0]
 
                     for (j, measurement_state) in enumerate(measurement_states):
-                        measurement_operation = identity_pad_gate(zero_measurement
-                                                                  if j % 2 == 0
-                                                                  else one_measurement,
-                                                                  [qbit_index],
-                                                                  self.num_qbits)
+                        measurement_operation = self._embedded_measurement(zero_measurement
+                                                                           if j % 2 == 0
+                                                                           else one_measurement,
+                                                                           [qbit_index]).sparse
 
                         if not exists_measurement_state:
-                            self.solver.add(
-                                state_equals(measurement_state,
-                                             matrix_vector_multiplication(to_complex_matrix(measurement_operation),
-                                                                          previous_state)))
+                            self.smt_writer.add_state_equation(measurement_state, measurement_operation,
+                                                               previous_state)
                         else:
                             for state_before_element in previous_state:
-                                self.solver.add(
-                                    state_equals(measurement_state,
-                                                 matrix_vector_multiplication(to_complex_matrix(measurement_operation),
-                                                                              state_before_element)))
+                                self.smt_writer.add_state_equation(measurement_state, measurement_operation,
+                                                                   state_before_element)
                 else:
                     measurement_states = state_sequence.add_measurement_state(len(operation.arguments))
 
@@ -228,22 +297,21 @@ class Circuit:
 
                         combined_measurement = kron(measurement_ops)
 
-                        measurement_operation = identity_pad_gate(combined_measurement,
-                                                                  qbit_indices,
-                                                                  self.num_qbits)
+                        measurement_operation = self._embedded_measurement(combined_measurement,
+                                                                           qbit_indices).sparse
 
                         if not exists_measurement_state:
                             # First measured state
-                            self.solver.add(
-                                state_equals(measurement_state,
-                                             matrix_vector_multiplication(to_complex_matrix(measurement_operation),
-                                                                          previous_state)))
+                            self.smt_writer.add_state_equation(measurement_state, measurement_operation,
+                                                               previous_state)
                         else:
                             # Existing measured states
                             raise Exception('No multi-measurement after other measurements.')
             else:
                 raise Exception('Unsupported operation. Has to be either gate or measurement.')
 
+        self._emit_fused_state(state_sequence, fused)
+
         # 4.1 Repair synthesis:
         if self.final_qbits is not None and synthesize_repair is True:
             raise Exception('State model does not support repair')
@@ -253,7 +321,7 @@ class Circuit:
             final_state_definition = complex_kron_n_ary([qbit.to_complex_list() for qbit in self.final_qbits])
 
             if len(state_sequence.measured_states) == 0:
-                self.solver.add(state_equals(state_sequence.states[-1], final_state_definition))
+                self.smt_writer.add(state_equals(state_sequence.states[-1], final_state_definition))
             else:
                 # build disjunction for the different measurement results
                 disjunction_elements = []
@@ -261,32 +329,116 @@ class Circuit:
                 for final_state in state_sequence.states[-1]:
                     disjunction_elements.append(state_equals(final_state, final_state_definition))
 
-                self.solver.add(Or(disjunction_elements))
+                self.smt_writer.add(Or(disjunction_elements))
+
+        return state_sequence
+
+    def _emit_fused_state(self, state_sequence: StateSequence, fused: List[Union[Gate, List[Gate]]]):
+        """
+        Encode the state after a run of fused gates.
+        :param fused: operations of the run (None if there is no pending run).
+        :return: void.
+        """
+        if fused is None:
+            return
+
+        previous_state = state_sequence.states[-1]
+        next_state = state_sequence.add_state()
+
+        self.smt_writer.add_state_equation(next_state, self._embedded_run(fused).sparse, previous_state)
+
+    def final_state(self, fuse_gates: bool = False) -> List[ComplexVal]:
+        """
+        Final state of the state model encoding, to add constraints on the output of the program.
+        With fused gates intermediate states are skipped, so the name of the final state depends on the encoding.
+        :param fuse_gates: whether the encoding multiplies runs of gates into one unitary.
+        :return: final state (a list of states after a measurement).
+        """
+        return self._encode_state_model(fuse_gates=fuse_gates).states[-1]
+
+    def encoding_size_report(self) -> str:
+        """
+        Compare the size of the state model encoding with and without gate fusion.
+        :return: report of the number of variables and assertions of both encodings.
+        """
+        sizes = []
+
+        for fuse_gates in [False, True]:
+            self._encode_state_model(fuse_gates=fuse_gates)
+            sizes.append((len(self.smt_writer.declarations), len(self.smt_writer.assertions)))
+
+        return f'State model encoding: {sizes[0][0]} variables, {sizes[0][1]} assertions; ' \
+               f'with gate fusion: {sizes[1][0]} variables, {sizes[1][1]} assertions.'
+
+    def prove(self,
+              dump_smt_encoding: bool = False,
+              dump_solver_output: bool = False,
+              measurement_branch: int = None,
+              file_generation_only: bool = False,
+              synthesize_repair: bool = False,
+              overapproximation: bool = False,
+              fuse_gates: bool = False,
+              smt_dump_path: str = None) -> Union[
+        Tuple[str, collections.OrderedDict, float], Tuple[NamedTemporaryFile, Set[str]]]:
+
+        return self._prove_state_model(dump_smt_encoding,
+                                       dump_solver_output,
+                                       measurement_branch,
+                                       file_generation_only,
+                                       synthesize_repair,
+                                       overapproximation,
+                                       fuse_gates,
+                                       smt_dump_path)
+
+    def _prove_state_model(self,
+                           dump_smt_encoding: bool = False,
+                           dump_solver_output: bool = False,
+                           measurement_branch: int = None,
+                           file_generation_only: bool = False,
+                           synthesize_repair: bool = False,
+                           overapproximation: bool = False,
+                           fuse_gates: bool = False,
+                           smt_dump_path: str = None) -> Union[Tuple[str, collections.OrderedDict, float],
+    Tuple[NamedTemporaryFile, Set[str]]]:
+        """
+        Prove a quantum circuit according to the state model, symbolically encoding states as full vectors.
+        :param dump_smt_encoding:  print the utils_file encoding.
+        :param dump_solver_output: print the verbatim solver random_vector_output.
+        :param measurement_branch: which measurement branch to consider (optional, only used by parallel evaluation).
+        :param file_generation_only: only generate file, don't call solver.
+        :param synthesize_repair: Synthesize repair to make the circuit fulfill the specification.
+        :param fuse_gates: multiply runs of gates into one unitary instead of encoding every intermediate state.
+        :param smt_dump_path: also write the SMT-LIB encoding to this file (optional, for debugging).
+        :return: Solver random_vector_output.
+        """
+        start_full = time.time()
+
+        state_sequence = self._encode_state_model(measurement_branch, synthesize_repair, fuse_gates)
+
+        # initialization and specification constraints added by the caller
+        self.smt_writer.add_solver(self.solver)
 
         # 5 Call solver
-        new_sexpr = self.solver.sexpr().replace("distinct", "=")
-        print("circuit.py generate constraint.smt2!!!!!!!!!!!!")
-        with open("test\\temp_file\constraint.smt2", "w+") as file:
-            file.write(new_sexpr)
-            file.write("\n(check-sat)")
-            file.write("\n(get-model)")
+        smt = self.smt_writer.to_string()
 
-        temp_file = NamedTemporaryFile(mode='w+b', suffix='.smt2', delete=False)
+        if dump_smt_encoding:
+            print(smt)
 
-        with open(temp_file.name, "w") as text_file:
-            text_file.write(new_sexpr)
-            text_file.write("\n(check-sat)")
-            text_file.write("\n(get-model)")
+        if smt_dump_path is not None:
+            with open(smt_dump_path, 'w') as file:
+                file.write(smt)
 
         qbit_identifiers = [qbit.get_identifier() for qbit in self.qbits]
 
         dreal_path = '/opt/dreal/4.21.06.2/bin/dreal'
         z3_path = '/usr/local/bin/z3'
         delta = 0.0001
-        command = [dreal_path, '--precision', str(delta), temp_file.name] \
-            if not isinstance(state_sequence.qbits[0], RQbitVal) else [z3_path, temp_file.name]
+        # the problem is sent over stdin to a long-lived solver process, no temporary file
+        pool = dreal_pool(dreal_path, delta) \
+            if not isinstance(state_sequence.qbits[0], RQbitVal) else z3_pool(z3_path)
 
-        result = subprocess.run(command, capture_output=True)
+        output = pool.solve(smt)
+        result = subprocess.CompletedProcess(pool.command, 0, stdout=output.encode("utf-8"))
 
         end_full = time.time()
         time_full = end_full - start_full
@@ -0,0 +1,204 @@
+import collections
+import io
+import re
+from decimal import Decimal
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from z3 import BoolRef, ExprRef, Solver, is_app, Z3_OP_UNINTERPRETED
+
+from quantum_constraint_solver.symqv.expressions.complex import ComplexVal
+from quantum_constraint_solver.symqv.utils_file.arithmetic import SparseMatrix, state_equals, \
+    matrix_vector_multiplication
+from quantum_constraint_solver.symqv.utils_file.helpers import pi
+
+# Functions interpreted by dReal, they are not declared
+_interpreted_functions = ['sin', 'cos']
+
+check_sat_commands = '(check-sat)\n(get-model)\n'
+
+
+def real_literal(value: float) -> str:
+    """
+    SMT-LIB literal of a real number (no exponent notation, negative numbers as (- x)).
+    :param value: number.
+    :return: SMT-LIB term.
+    """
+    text = repr(abs(float(value)))
+
+    if 'inf' in text or 'nan' in text:
+        raise Exception(f'Value {value} can not be written to SMT-LIB.')
+
+    if 'e' in text:
+        text = format(Decimal(text), 'f')
+
+    if '.' not in text:
+        text += '.0'
+
+    return text if value >= 0 else f'(- {text})'
+
+
+def _sum(terms: List[str]) -> str:
+    if len(terms) == 0:
+        return '0.0'
+    elif len(terms) == 1:
+        return terms[0]
+    return f'(+ {" ".join(terms)})'
+
+
+def _term(coefficient: float, symbol: str) -> Optional[str]:
+    if coefficient == 0:
+        return None
+    elif coefficient == 1:
+        return symbol
+    elif coefficient == -1:
+        return f'(- {symbol})'
+    return f'(* {real_literal(coefficient)} {symbol})'
+
+
+class SmtWriter:
+    def __init__(self, rewrites: Dict[str, str] = None):
+        """
+        SMT-LIB encoding written directly from the state model, without building z3 expressions
+        for the gate applications and without serializing the whole z3 solver.
+        :param rewrites: operator substitutions applied to assertions given as z3 expressions (e.g. distinct to =).
+        """
+        self.rewrites = rewrites if rewrites is not None else {}
+        self.declarations = collections.OrderedDict()
+        self.assertions = []
+
+    def declare(self, symbol: str, declaration: str):
+        """
+        Declare a symbol (once), sin and cos are skipped and pi gets its value.
+        :param symbol: name of the symbol.
+        :param declaration: SMT-LIB declaration.
+        :return: void.
+        """
+        if symbol in self.declarations or symbol in _interpreted_functions:
+            return
+
+        if symbol == 'pi':
+            declaration += f'\n(assert (= pi {pi}))'
+
+        self.declarations[symbol] = declaration
+
+    def state_symbols(self, state: List[ComplexVal]) -> List[Tuple[str, str]]:
+        """
+        Declare the variables of a state vector.
+        :param state: state vector of complex variables.
+        :return: symbols of the real and imaginary parts.
+        """
+        symbols = []
+
+        for element in state:
+            for part in [element.r, element.i]:
+                self.declare(part.decl().name(), part.decl().sexpr())
+
+            symbols.append((element.r.sexpr(), element.i.sexpr()))
+
+        return symbols
+
+    def add(self, expression: BoolRef):
+        """
+        Add an assertion given as z3 expression, its uninterpreted symbols are declared.
+        :param expression: z3 boolean expression.
+        :return: void.
+        """
+        self._declare_symbols(expression)
+        assertion = expression.sexpr()
+
+        for (operator, substitute) in self.rewrites.items():
+            assertion = re.sub(rf'\({re.escape(operator)}\b', f'({substitute}', assertion)
+
+        self.assertions.append(f'(assert {assertion})')
+
+    def add_solver(self, solver: Solver):
+        for assertion in solver.assertions():
+            self.add(assertion)
+
+    def add_state_equation(self, next_state: List[ComplexVal], matrix: SparseMatrix, previous_state: List[ComplexVal]):
+        """
+        Assert next_state = matrix * previous_state.
+        :param next_state: state vector after the operation.
+        :param matrix: sparse matrix, symbolic matrices are encoded through z3.
+        :param previous_state: state vector before the operation.
+        :return: void.
+        """
+        if not all([isinstance(entry, complex) for row in matrix.rows for (_, entry) in row]):
+            self.add(state_equals(next_state, matrix_vector_multiplication(matrix, previous_state)))
+            return
+
+        next_symbols = self.state_symbols(next_state)
+        previous_symbols = self.state_symbols(previous_state)
+
+        for (i, row) in enumerate(matrix.rows):
+            real_terms = []
+            imag_terms = []
+
+            # (a + bi)(x + yi) = (ax - by) + (ay + bx)i
+            for (k, entry) in row:
+                (real, imag) = previous_symbols[k]
+                real_terms += [_term(entry.real, real), _term(-entry.imag, imag)]
+                imag_terms += [_term(entry.real, imag), _term(entry.imag, real)]
+
+            real_sum = _sum([t for t in real_terms if t is not None])
+            imag_sum = _sum([t for t in imag_terms if t is not None])
+
+            self.assertions.append(f'(assert (= {next_symbols[i][0]} {real_sum}))')
+            self.assertions.append(f'(assert (= {next_symbols[i][1]} {imag_sum}))')
+
+    def add_phase_oracle(self, previous_state: List[ComplexVal], next_state: List[ComplexVal], oracle_value: int):
+        """
+        Assert next_state = previous_state with the sign of the element oracle_value flipped.
+        :return: void.
+        """
+        if oracle_value > len(previous_state) - 1:
+            raise Exception(f'Oracle value {oracle_value} is not in the value range 0 to {len(previous_state)}.')
+
+        next_symbols = self.state_symbols(next_state)
+        previous_symbols = self.state_symbols(previous_state)
+
+        for (i, (element, next_element)) in enumerate(zip(previous_symbols, next_symbols)):
+            for (previous_part, next_part) in zip(element, next_element):
+                value = f'(- {previous_part})' if i == oracle_value else previous_part
+                self.assertions.append(f'(assert (= {next_part} {value}))')
+
+    def write(self, out: TextIO, commands: str = check_sat_commands):
+        """
+        Write the encoding in one pass.
+        :param out: text stream (file, pipe or string buffer).
+        :param commands: commands after the assertions.
+        :return: void.
+        """
+        for declaration in self.declarations.values():
+            out.write(declaration)
+            out.write('\n')
+
+        for assertion in self.assertions:
+            out.write(assertion)
+            out.write('\n')
+
+        out.write(commands)
+
+    def to_string(self, commands: str = check_sat_commands) -> str:
+        out = io.StringIO()
+        self.write(out, commands)
+        return out.getvalue()
+
+    def _declare_symbols(self, expression: ExprRef):
+        stack = [expression]
+        visited = set()
+
+        while len(stack) > 0:
+            expression = stack.pop()
+            expression_id = expression.get_id()
+
+            if expression_id in visited or not is_app(expression):
+                continue
+
+            visited.add(expression_id)
+            declaration = expression.decl()
+
+            if declaration.kind() == Z3_OP_UNINTERPRETED:
+                self.declare(declaration.name(), declaration.sexpr())
+
+            stack += expression.children()
@@ -1,5 +1,4 @@
 import collections
-import subprocess
 import tempfile
 import time
 from enum import Enum
@@ -7,7 +6,6 @@ from sys import platform
 from typing import List, Union, Dict, Tuple, Set, Optional
 
 import numpy as np
-import pyparsing
 from z3 import Solver, Not, And, Or
 
 from quantum_constraint_solver.symqv.expressions.complex import ComplexVal, Complexes
@@ -16,9 +14,12 @@ from quantum_constraint_solver.symqv.expressions.rqbit import RQbitVal
 from quantum_constraint_solver.symqv.globals import precision_format
 from quantum_constraint_solver.symqv.models.qbit_sequence import QbitSequence
 from quantum_constraint_solver.symqv.models.state_sequence import StateSequence
+from quantum_constraint_solver.symqv.model_parser import ModelParser
+from quantum_constraint_solver.symqv.smt_writer import SmtWriter
+from quantum_constraint_solver.symqv.solver_pool import dreal_pool, z3_pool
 from quantum_constraint_solver.symqv.utils_file.arithmetic import state_not_equals, matrix_vector_multiplication, state_equals, qbit_kron_n_ary, \
     qbit_isclose_to_value
-from quantum_constraint_solver.symqv.utils_file.helpers import build_qbit_constraints, to_complex_matrix, pi
+from quantum_constraint_solver.symqv.utils_file.helpers import build_qbit_constraints
 
 z3_path = '/usr/local/bin/z3'
 dreal_path = None
@@ -60,22 +61,22 @@ def solve(solver: Solver,
     :return: SAT + counterexample or UNSAT.
     """
 
-    temp_file, qbit_identifiers = write_smt_file(solver,
-                                                 qbits,
-                                                 state_sequence,
-                                                 specification,
-                                                 specification_type,
-                                                 is_equality_specification,
-                                                 output_qbits,
-                                                 synthesize_repair,
-                                                 delta,
-                                                 overapproximation,
-                                                 dump_smt_encoding=dump_smt_encoding)
+    smt, qbit_identifiers = build_smt_encoding(solver,
+                                               qbits,
+                                               state_sequence,
+                                               specification,
+                                               specification_type,
+                                               is_equality_specification,
+                                               output_qbits,
+                                               synthesize_repair,
+                                               delta,
+                                               overapproximation,
+                                               dump_smt_encoding=dump_smt_encoding)
     # print("solver.py: generate smt file")
     # print("solver.py temp_file:", temp_file.name)
     # print("solver.py qbit_identifiers:", qbit_identifiers)
 
-    return run_decision_procedure(temp_file.name,
+    return run_decision_procedure(smt,
                                   qbit_identifiers,
                                   state_sequence,
                                   specification,
@@ -97,6 +98,41 @@ def write_smt_file(solver: Solver,
                    overapproximation: bool = False,
                    dump_smt_encoding: bool = False) -> Tuple[tempfile.NamedTemporaryFile, Set[str]]:
     """
+    Write the SMT encoding (see build_smt_encoding) to a temporary file.
+    :return: File and qbit identifiers.
+    """
+    smt, qbit_identifiers = build_smt_encoding(solver,
+                                               qbits,
+                                               state_sequence,
+                                               specification,
+                                               specification_type,
+                                               is_equality_specification,
+                                               output_qbits,
+                                               synthesize_repair,
+                                               delta,
+                                               overapproximation,
+                                               dump_smt_encoding)
+
+    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.smt2', delete=False)
+
+    with temp_file:
+        temp_file.write(smt)
+
+    return temp_file, qbit_identifiers
+
+
+def build_smt_encoding(solver: Solver,
+                       qbits: Union[List[str], List[QbitVal]],
+                       state_sequence: Optional[Union[StateSequence, QbitSequence]],
+                       specification: Optional[Union[List, np.ndarray]],
+                       specification_type: SpecificationType,
+                       is_equality_specification: bool = True,
+                       output_qbits: List[str] = None,
+                       synthesize_repair: bool = False,
+                       delta: float = 0.0001,
+                       overapproximation: bool = False,
+                       dump_smt_encoding: bool = False) -> Tuple[str, Set[str]]:
+    """
     :param solver: solver.
     :param qbits: qbit variables.
     :param state_sequence: state variables.
@@ -108,7 +144,7 @@ def write_smt_file(solver: Solver,
     :param delta: error bound.
     :param overapproximation: whether to overapproximate qbit angle constraints.
     :param dump_smt_encoding: print the SMT encoding.
-    :return: File and qbit identifiers.
+    :return: SMT-LIB script and qbit identifiers.
     """
     if synthesize_repair:
         is_equality_specification = not is_equality_specification
@@ -170,30 +206,27 @@ def write_smt_file(solver: Solver,
                 if is_equality_specification:
                     solver.add(
                         state_not_equals(state_sequence.states[-1],
-                                         matrix_vector_multiplication(to_complex_matrix(specification),
+                                         matrix_vector_multiplication(specification,
                                                                       state_sequence.states[0])))
                 else:
                     solver.add(
                         state_equals(state_sequence.states[-1],
-                                     matrix_vector_multiplication(to_complex_matrix(specification),
+                                     matrix_vector_multiplication(specification,
                                                                   state_sequence.states[0])))
             else:
                 if not is_equality_specification:
                     raise Exception('QbitSequence not supported for spec type matrix and inequality spec.')
 
                 solver.add(state_not_equals(qbit_kron_n_ary(state_sequence.states[-1]),
-                                            matrix_vector_multiplication(to_complex_matrix(specification),
+                                            matrix_vector_multiplication(specification,
                                                                          qbit_kron_n_ary(state_sequence.states[0]))))
         else:
             raise Exception(f'Specification type {specification_type} is not supported.')
 
-    smt_expr = solver.sexpr()
-
-    smt_expr = smt_expr.replace('(declare-fun sin (Real) Real)\n', '')
-    smt_expr = smt_expr.replace('(declare-fun cos (Real) Real)\n', '')
-    smt_expr = smt_expr.replace('(declare-fun pi () Real)\n', f'(declare-fun pi () Real)\n(assert (= pi {pi}))')
-
-    smt_expr += '\n'
+    # sin and cos are not declared and pi gets its value while the assertions are written
+    writer = SmtWriter()
+    writer.add_solver(solver)
+    smt_expr = writer.to_string(commands='\n')
 
     # 2 Constrains degrees of freedom
     qbit_identifiers = set()
@@ -226,16 +259,10 @@ def write_smt_file(solver: Solver,
     if dump_smt_encoding:
         print(smt_expr + solver_params)
 
-    # To file
-    temp_file = tempfile.NamedTemporaryFile(mode='w+b', suffix='.smt2', delete=False)
-
-    with open(temp_file.name, "w") as text_file:
-        text_file.write(smt_expr + solver_params)
-
-    return temp_file, qbit_identifiers
+    return smt_expr + solver_params, qbit_identifiers
 
 
-def run_decision_procedure(temp_file_name: str,
+def run_decision_procedure(smt: str,
                            qbit_identifiers: Set[str],
                            state_sequence: Optional[Union[StateSequence, QbitSequence]],
                            specification: Optional[Union[List, np.ndarray]],
@@ -245,49 +272,21 @@ def run_decision_procedure(temp_file_name: str,
                            dump_solver_output=False) -> Tuple[str, Union[collections.OrderedDict, None]]:
     print('In solver.py run_decision_procedure: Starting solver...')
 
-    sat_result = ''
-    model_dict = collections.OrderedDict({})
-
-    # Run
-    command = [dreal_path, '--precision', str(delta), temp_file_name] \
-        if not isinstance(state_sequence.qbits[0], RQbitVal) else [z3_path, temp_file_name]
-    # print("run_decision_procedure: command", command)
+    # Run on a long-lived solver process, the model is parsed while the solver writes it
+    pool = dreal_pool(dreal_path, delta) \
+        if not isinstance(state_sequence.qbits[0], RQbitVal) else z3_pool(z3_path)
     # print("solver.py dreal_path:", dreal_path)
 
-    result = subprocess.run(command, stdout=subprocess.PIPE)
-
-    # print("solver.py result:", result)
-    output = result.stdout.decode('utf-8')
+    parser = ModelParser()
+    output = pool.solve(smt, on_line=parser.feed)
     # print("solver.py run_decision_procedure random_vector_output:",random_vector_output)
 
     # Print random_vector_output if desired
     if dump_solver_output:
         print(output)
 
-    # Parse random_vector_output
-    output_clean_lines = ''
-
-    for idx, line in enumerate(output.splitlines()):
-        if any(line.startswith(s) for s in ['sat', 'delta-sat', 'unsat', 'unknown']):
-            sat_result = line.replace('delta', 'δ')
-        if "(error" not in line and not line.startswith("(model"):
-            output_clean_lines += line + "\n"
-
-    for match in pyparsing.nestedExpr('(', ')').searchString(output_clean_lines):
-        key = match[0][1]
-
-        if state_sequence.reduced_state_space:
-            value = [bool(str(v).replace('[', '').replace(']', '').replace(',', '')) for v in match[0][4:]]
-        else:
-            try:
-                value = [float(str(v).replace('[', '').replace(']', '').replace(',', '')) for v in match[0][4:]]
-            except ValueError:
-                value = [True if (str(v).replace('[', '').replace(']', '').replace(',', '')) == 'true' else False
-                         for v in match[0][4:]]
-
-        value = value[0] if len(value) == 1 else value
-
-        model_dict[key] = value
+    sat_result = parser.sat_result
+    model_dict = parser.model
 
     model_dict = dict(sorted(model_dict.items()))
 
@@ -387,8 +386,9 @@ def reverse_kronecker_product(kron_state: np.ndarray, delta=0.0001) -> List[Qbit
 
     solver.add(state_equals(kron_state_complexes, qbit_kron_n_ary(output_qbits)))
 
-    smt_expr = solver.sexpr()
-    smt_expr += '\n'
+    writer = SmtWriter()
+    writer.add_solver(solver)
+    smt_expr = writer.to_string(commands='\n')
 
     smt_expr += build_qbit_constraints(qbit_identifiers)
     solver_params = '\n'
@@ -399,67 +399,41 @@ def reverse_kronecker_product(kron_state: np.ndarray, delta=0.0001) -> List[Qbit
     solver_params += '(get-model)\n'
     solver_params += '(exit)\n'
 
-    # To file
-    temp_file = tempfile.NamedTemporaryFile(mode='w+b', suffix='.smt2', delete=False)
-
-    with open(temp_file.name, "w") as text_file:
-        text_file.write(smt_expr + solver_params)
-
     # Run
-    result = subprocess.run([dreal_path, '--precision', str(delta), temp_file.name], stdout=subprocess.PIPE)
-    output = result.stdout.decode('utf-8')
+    parser = ModelParser()
+    dreal_pool(dreal_path, delta).solve(smt_expr + solver_params, on_line=parser.feed)
 
-    if '(error "model is not available")' in output:
+    if any('model is not available' in error for error in parser.errors):
         raise Exception('Model is not available.')
 
-    # Parse random_vector_output
-    output_lines = output.split('\n')
-
-    qbit_vals = []
-
-    for q in qbit_identifiers:
-        q_lines = [line for line in output_lines if line.strip().startswith(f'(define-fun {q}')]
-        qbit_vals.append(_qbit_from_output(q_lines))
-
-    return qbit_vals
+    return [_qbit_from_model(parser.model, q) for q in qbit_identifiers]
 
 
-def _qbit_from_output(q_lines: List[str]) -> QbitVal:
+def _qbit_from_model(model: collections.OrderedDict, qbit_identifier: str) -> QbitVal:
     """
-    Get QbitVal from solver random_vector_output lines.
-    :param q_lines: lines only containing solver random_vector_output for one qbit.
+    Get QbitVal from a parsed solver model.
+    :param model: parsed model.
+    :param qbit_identifier: identifier of the qbit.
     :return: QbitVal.
     """
 
-    def to_float(line: str) -> float:
+    def to_float(key: str) -> float:
         """
         dReal range to float.
-        :param line: dReal model random_vector_output line.
-        :return: float.
+        :param key: model variable.
+        :return: float (middle of the range).
         """
-        elements = line.strip().split(' ')
-
-        if len(elements) == 5:
-            return float(elements[4].replace(')', ''))
-        elif len(elements) == 6:
-            lower = float(elements[4].replace('[', '').replace(',', ''))
-            upper = float(elements[5].replace('])', ''))
-            return (lower + upper) / 2
-        else:
-            print(elements)
-            raise Exception('Parser error.')
-
-    alpha_r = to_float([v for v in q_lines if '.alpha.r' in v][0])
-    alpha_i = to_float([v for v in q_lines if '.alpha.i' in v][0])
-    beta_r = to_float([v for v in q_lines if '.beta.r' in v][0])
-    beta_i = to_float([v for v in q_lines if '.beta.i' in v][0])
-    phi = to_float([v for v in q_lines if '.phi' in v][0])
-    theta = to_float([v for v in q_lines if '.theta' in v][0])
-
-    return QbitVal(alpha=ComplexVal(alpha_r, alpha_i),
-                   beta=ComplexVal(beta_r, beta_i),
-                   phi=phi,
-                   theta=theta)
+        value = model[f'{qbit_identifier}.{key}']
+
+        if isinstance(value, list):
+            return (value[0] + value[1]) / 2
+
+        return value
+
+    return QbitVal(alpha=ComplexVal(to_float('alpha.r'), to_float('alpha.i')),
+                   beta=ComplexVal(to_float('beta.r'), to_float('beta.i')),
+                   phi=to_float('phi'),
+                   theta=to_float('theta'))
 
 
 def _is_sat_result_plausible(model_dict: collections.OrderedDict, specification: Union[List, np.ndarray],
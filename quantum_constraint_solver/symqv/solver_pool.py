@@ -0,0 +1,346 @@
+import atexit
+import itertools
+import queue
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+_command_name = re.compile(r'\(\s*([^\s()]+)(?:\s+(\|[^|]*\||[^\s()|]+))?')
+
+# Commands kept on the base level of an incremental process, the others are sent between (push) and (pop)
+_header_commands = {'set-logic', 'set-option', 'set-info'}
+_declaration_commands = {'declare-fun', 'declare-const', 'define-fun', 'declare-sort', 'define-sort'}
+# Commands of the query that must not change the level structure of the process
+_skipped_commands = {'exit', 'reset', 'push', 'pop'}
+
+# Number of processes of a new pool, callers running queries from several threads raise it
+pool_size = 1
+
+# Above this many declarations on the base level, the process is reset instead of extended
+max_declarations = 100000
+
+_sentinels = itertools.count()
+
+
+def split_commands(smt: str) -> List[str]:
+    """
+    Top-level commands of an SMT-LIB script, comments removed.
+    :param smt: SMT-LIB script.
+    :return: commands as text.
+    """
+    commands = []
+    start = None
+    depth = 0
+    i = 0
+
+    while i < len(smt):
+        char = smt[i]
+
+        if char == ';':
+            end = smt.find('\n', i)
+            i = len(smt) if end == -1 else end
+            continue
+        elif char in '"|':
+            # strings and quoted symbols may contain parentheses
+            end = smt.find(char, i + 1)
+            while char == '"' and end != -1 and smt.startswith('""', end):
+                end = smt.find(char, end + 2)
+            i = len(smt) if end == -1 else end + 1
+            continue
+        elif char == '(':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                commands.append(smt[start:i + 1])
+
+        i += 1
+
+    return commands
+
+
+def split_script(smt: str) -> Tuple[List[str], Dict[str, str], List[str]]:
+    """
+    Split a script into its header (logic and options), its declarations and the commands of the query.
+    :param smt: SMT-LIB script.
+    :return: header commands, declarations by symbol, remaining commands.
+    """
+    header = []
+    declarations = {}
+    commands = []
+
+    for command in split_commands(smt):
+        match = _command_name.match(command)
+        name = match.group(1) if match is not None else ''
+
+        if name in _header_commands:
+            header.append(command)
+        elif name in _declaration_commands and match.group(2) is not None:
+            declarations[match.group(2)] = command
+        elif name not in _skipped_commands:
+            commands.append(command)
+
+    return header, declarations, commands
+
+
+class SolverCrash(Exception):
+    pass
+
+
+class SolverProcess:
+    def __init__(self, command: List[str], incremental: bool):
+        """
+        A long-lived solver process reading SMT-LIB from stdin.
+        :param command: command line of the solver, reading from stdin.
+        :param incremental: whether the solver keeps running between queries. Its declarations stay on the base
+        level and each query runs between (push) and (pop). Otherwise the process answers one query and a new one
+        is started right away for the next query.
+        """
+        self.command = command
+        self.incremental = incremental
+        self.process = None
+        self.lines = None
+        # header and declarations on the base level of the process, None if it has to be reset first
+        self.header = None
+        self.declarations = {}
+        self.resets = 0
+        self.start()
+
+    def start(self):
+        """
+        Start (or restart) the solver process.
+        :return: void.
+        """
+        self.process = subprocess.Popen(self.command,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        universal_newlines=True,
+                                        bufsize=1)
+        self.lines = queue.Queue()
+        self.header = None
+        threading.Thread(target=_read_lines, args=(self.process.stdout, self.lines), daemon=True).start()
+
+    def stop(self):
+        """
+        Kill the solver process.
+        :return: void.
+        """
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        self.process = None
+
+    def query(self, smt: str, timeout: Optional[float] = None,
+              on_line: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Solve an SMT-LIB script.
+        :param smt: SMT-LIB script.
+        :param timeout: seconds to wait for the answer (None waits forever).
+        :param on_line: called with every output line as soon as the solver writes it.
+        :return: solver output, "unknown" if the solver timed out.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        try:
+            if self.incremental:
+                return self._query_incremental(smt, deadline, on_line)
+
+            self._write(smt)
+            self.process.stdin.close()
+            output = self._read_all(deadline, on_line)
+            self.start()
+            return output
+        except queue.Empty:
+            print(f'Solver timed out after {timeout} seconds, restarting it.')
+            self.stop()
+            self.start()
+
+            if on_line is not None:
+                on_line('unknown\n')
+
+            return 'unknown\n'
+
+    def _query_incremental(self, smt: str, deadline: Optional[float],
+                           on_line: Optional[Callable[[str], None]]) -> str:
+        header, declarations, commands = split_script(smt)
+        text = []
+
+        if not self._compatible(header, declarations):
+            text += ['(reset)'] + header
+            self.header = header
+            self.declarations = {}
+            self.resets += 1
+
+        for (symbol, declaration) in declarations.items():
+            if symbol not in self.declarations:
+                text.append(declaration)
+                self.declarations[symbol] = declaration
+
+        # the answer is complete once the solver echoes the sentinel, whatever it printed before
+        sentinel = f'solver-pool-{next(_sentinels)}'
+        text += ['(push 1)'] + commands + ['(pop 1)', f'(echo "{sentinel}")']
+        self._write('\n'.join(text) + '\n')
+        output = self._read_until(sentinel, deadline, on_line)
+
+        if '(error' in output:
+            # a failed declaration may be missing on the base level
+            self.header = None
+
+        return output
+
+    def _compatible(self, header: List[str], declarations: Dict[str, str]) -> bool:
+        # the base level can be extended if no symbol is declared differently
+        if self.header is None or self.header != header:
+            return False
+
+        if len(self.declarations) + len(declarations) > max_declarations:
+            return False
+
+        return all([self.declarations.get(symbol, declaration) == declaration
+                    for (symbol, declaration) in declarations.items()])
+
+    def _write(self, text: str):
+        try:
+            self.process.stdin.write(text)
+            self.process.stdin.flush()
+        except OSError:
+            self.stop()
+            self.start()
+            raise SolverCrash(f'Solver process {self.command[0]} terminated unexpectedly.')
+
+    def _next_line(self, deadline: Optional[float]) -> str:
+        line = self.lines.get(timeout=None if deadline is None else max(deadline - time.time(), 0))
+
+        if line is None:
+            self.stop()
+            self.start()
+            raise SolverCrash(f'Solver process {self.command[0]} terminated unexpectedly.')
+
+        return line
+
+    def _read_until(self, sentinel: str, deadline: Optional[float],
+                    on_line: Optional[Callable[[str], None]]) -> str:
+        output = []
+
+        while True:
+            line = self._next_line(deadline)
+
+            if line.strip() == sentinel:
+                return ''.join(output)
+
+            output.append(line)
+
+            if on_line is not None:
+                on_line(line)
+
+    def _read_all(self, deadline: Optional[float], on_line: Optional[Callable[[str], None]]) -> str:
+        output = []
+
+        while True:
+            line = self.lines.get(timeout=None if deadline is None else max(deadline - time.time(), 0))
+
+            if line is None:
+                return ''.join(output)
+
+            output.append(line)
+
+            if on_line is not None:
+                on_line(line)
+
+
+def _read_lines(stream, lines: queue.Queue):
+    for line in iter(stream.readline, ''):
+        lines.put(line)
+    lines.put(None)
+
+
+class SolverPool:
+    def __init__(self, command: List[str], size: int = 1, incremental: bool = True, timeout: Optional[float] = None):
+        """
+        Pool of solver processes, each query is answered by an idle process.
+        :param command: command line of the solver, reading from stdin.
+        :param size: number of processes.
+        :param incremental: whether the solver keeps running between queries.
+        :param timeout: default timeout per query in seconds.
+        """
+        self.command = command
+        self.incremental = incremental
+        self.timeout = timeout
+        self.processes = []
+        self.idle = queue.Queue()
+        self.grow(size)
+
+    def grow(self, size: int):
+        """
+        Start processes until the pool has at least size of them.
+        :param size: number of processes.
+        :return: void.
+        """
+        while len(self.processes) < size:
+            process = SolverProcess(self.command, self.incremental)
+            self.processes.append(process)
+            self.idle.put(process)
+
+    def solve(self, smt: str, timeout: Optional[float] = None,
+              on_line: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Solve an SMT-LIB script, retrying once if the process crashed.
+        :param smt: SMT-LIB script.
+        :param timeout: seconds to wait for the answer, defaults to the pool timeout.
+        :param on_line: called with every output line as soon as the solver writes it.
+        :return: solver output.
+        """
+        process = self.idle.get()
+
+        try:
+            try:
+                return process.query(smt, timeout if timeout is not None else self.timeout, on_line)
+            except SolverCrash:
+                return process.query(smt, timeout if timeout is not None else self.timeout, on_line)
+        finally:
+            self.idle.put(process)
+
+    def close(self):
+        for process in self.processes:
+            process.stop()
+
+
+_pools: Dict[Tuple[str, ...], SolverPool] = {}
+
+
+def get_pool(command: List[str], incremental: bool = True, size: Optional[int] = None) -> SolverPool:
+    """
+    Shared pool for a solver command line, created on first use.
+    :param command: command line of the solver, reading from stdin.
+    :param incremental: whether the solver keeps running between queries.
+    :param size: minimum number of processes (pool_size if None), an existing pool is grown to it.
+    :return: solver pool.
+    """
+    key = tuple(command)
+    size = pool_size if size is None else size
+
+    if key not in _pools:
+        _pools[key] = SolverPool(command, size=size, incremental=incremental)
+    else:
+        _pools[key].grow(size)
+
+    return _pools[key]
+
+
+def z3_pool(z3_path: str, size: Optional[int] = None) -> SolverPool:
+    return get_pool([z3_path, '-in'], size=size)
+
+
+def dreal_pool(dreal_path: str, delta: float, size: Optional[int] = None) -> SolverPool:
+    # dReal reads the whole problem before solving, its processes are started ahead and used once
+    return get_pool([dreal_path, '--precision', str(delta), '--in'], incremental=False, size=size)
+
+
+@atexit.register
+def _close_pools():
+    for pool in _pools.values():
+        pool.close()
@@ -1,7 +1,7 @@
-from typing import List, Tuple, Union
+from typing import Any, List, Tuple, Union
 
 import numpy as np
-from z3 import And, Not
+from z3 import And, Not, Sum, is_expr, is_rational_value
 
 from quantum_constraint_solver.symqv.constants import to_int
 from quantum_constraint_solver.symqv.expressions.complex import ComplexVal
@@ -263,21 +263,211 @@ def matmul(matrices: List[np.ndarray]) -> np.ndarray:
     return product
 
 
-def matrix_vector_multiplication(matrix: List[List], vector: List) -> List:
-    if len(matrix[0]) != len(vector):
-        raise Exception(f'Matrix column count ({len(matrix[0])}) has to be equal to vector row count ({len(vector)}).')
+class SparseMatrix:
+    def __init__(self, rows: List[List[Tuple[int, Any]]], num_columns: int):
+        """
+        Matrix stored as lists of the nonzero entries of each row.
+        :param rows: for each row, list of (column, entry) pairs of the nonzero entries.
+        :param num_columns: number of columns.
+        """
+        self.rows = rows
+        self.num_columns = num_columns
+
+    @staticmethod
+    def from_dense(matrix: Union[np.ndarray, List[List]]) -> 'SparseMatrix':
+        """
+        Collect the nonzero entries of a dense matrix.
+        :param matrix: concrete numpy matrix or matrix of (symbolic) entries.
+        :return: sparse matrix.
+        """
+        if isinstance(matrix, SparseMatrix):
+            return matrix
+
+        if isinstance(matrix, np.ndarray) and matrix.dtype != np.dtype('O'):
+            # Concrete case: numpy finds the nonzero entries, entries become Python complex numbers
+            rows = [[] for _ in range(matrix.shape[0])]
+            row_indices, column_indices = np.nonzero(matrix)
+
+            for (i, k, entry) in zip(row_indices.tolist(), column_indices.tolist(),
+                                     matrix[row_indices, column_indices].tolist()):
+                rows[i].append((k, complex(entry)))
+
+            return SparseMatrix(rows, matrix.shape[1])
+
+        # Symbolic case: entries are ComplexVals or numbers
+        rows = [[(k, entry) for (k, entry) in enumerate(row) if not _is_zero_entry(entry)] for row in matrix]
+        return SparseMatrix(rows, len(matrix[0]))
+
+    @staticmethod
+    def from_gate(gate: Union[np.ndarray, List[List]], gate_qbits: List[int], num_qbits: int) -> 'SparseMatrix':
+        """
+        Sparse matrix of a gate acting on some qbits of the system, the same matrix as embed_gate.
+        Each nonzero entry of the gate is repeated for every value of the other qbits, so the cost is
+        proportional to the nonzero entries of the result instead of 4^n.
+        :param gate: gate matrix of dimension 2^k x 2^k, its first tensor factor is the most significant qbit.
+        :param gate_qbits: system qbits in the order of the gate's tensor factors.
+        :param num_qbits: number of qbits in the system.
+        :return: sparse matrix of dimension 2^n x 2^n.
+        """
+        k = len(gate_qbits)
+        dimension = 2 ** num_qbits
+
+        # bit of each gate qbit in a system index, qbit 0 is the most significant bit
+        bits = [1 << (num_qbits - 1 - q) for q in gate_qbits]
+        offsets = [sum([bits[j] for j in range(k) if (a >> (k - 1 - j)) & 1]) for a in range(2 ** k)]
+        indices = np.arange(dimension)
+        others = indices[(indices & sum(bits)) == 0].tolist()
+
+        rows = [None] * dimension
+
+        for (a, gate_row) in enumerate(SparseMatrix.from_dense(gate).rows):
+            for other in others:
+                rows[other | offsets[a]] = sorted([(other | offsets[b], entry) for (b, entry) in gate_row],
+                                                  key=lambda pair: pair[0])
+
+        return SparseMatrix(rows, dimension)
+
+    def multiply(self, other: 'SparseMatrix') -> 'SparseMatrix':
+        """
+        Product of two sparse matrices, only products of nonzero entries are computed.
+        :param other: right factor.
+        :return: self * other.
+        """
+        if self.num_columns != len(other.rows):
+            raise Exception(f'Matrix column count ({self.num_columns}) has to be equal to matrix row count '
+                            f'({len(other.rows)}).')
+
+        rows = []
+
+        for row in self.rows:
+            entries = {}
+
+            for (k, entry) in row:
+                for (j, other_entry) in other.rows[k]:
+                    product = entry * other_entry
+                    entries[j] = entries[j] + product if j in entries else product
+
+            rows.append(sorted([(j, entry) for (j, entry) in entries.items() if not _is_zero_entry(entry)],
+                               key=lambda pair: pair[0]))
+
+        return SparseMatrix(rows, other.num_columns)
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Dense matrix, for encodings that need the full matrix.
+        :return: complex numpy matrix, or matrix of objects if there are symbolic entries.
+        """
+        concrete = all([isinstance(entry, (int, float, complex)) for row in self.rows for (_, entry) in row])
+        matrix = np.zeros((len(self.rows), self.num_columns), dtype=complex if concrete else np.dtype('O'))
+
+        for (i, row) in enumerate(self.rows):
+            for (k, entry) in row:
+                matrix[i, k] = entry
+
+        return matrix
+
+    def nonzeros(self) -> int:
+        """
+        :return: number of nonzero entries.
+        """
+        return sum([len(row) for row in self.rows])
+
+
+def _is_zero_value(value) -> bool:
+    if isinstance(value, (int, float, complex)):
+        return value == 0
+    return is_rational_value(value) and value.as_fraction() == 0
+
+
+def _is_zero_entry(entry) -> bool:
+    if isinstance(entry, ComplexVal):
+        return _is_zero_value(entry.r) and _is_zero_value(entry.i)
+    return _is_zero_value(entry)
+
+
+def _scaled(coefficient: float, value):
+    if coefficient == 1:
+        return value
+    elif coefficient == -1:
+        return -value
+    return coefficient * value
 
-    # General case
-    m = len(matrix[0])
-    n = len(matrix)
 
-    output_vector = [ComplexVal(0)] * m
+def _product_terms(entry, element: ComplexVal, real_terms: List, imag_terms: List):
+    """
+    Append the real and imaginary parts of entry * element to the term lists, skipping zero parts.
+    :param entry: matrix entry, number or ComplexVal.
+    :param element: vector element.
+    :return: void.
+    """
+    if isinstance(entry, ComplexVal) and isinstance(entry.r, (int, float)) and isinstance(entry.i, (int, float)):
+        entry = complex(entry.r, entry.i)
+
+    if isinstance(entry, ComplexVal):
+        product = entry * element
+        real_terms.append(product.r)
+        imag_terms.append(product.i)
+        return
 
-    for i in range(m):
-        for k in range(n):
-            if isinstance(matrix[i][k], ComplexVal) and matrix[i][k].r == 0 and matrix[i][k].i == 0:
-                continue
-            else:
-                output_vector[i] += matrix[i][k] * vector[k]
+    entry = complex(entry)
+
+    if entry.real != 0:
+        real_terms.append(_scaled(entry.real, element.r))
+        imag_terms.append(_scaled(entry.real, element.i))
+
+    if entry.imag != 0:
+        real_terms.append(_scaled(-entry.imag, element.i))
+        imag_terms.append(_scaled(entry.imag, element.r))
+
+
+def flat_sum(terms: List):
+    """
+    Sum as a single n-ary addition, constant terms are added up beforehand.
+    :param terms: SMT expressions or numbers.
+    :return: SMT sum or number.
+    """
+    constant = 0
+    expressions = []
+
+    for term in terms:
+        if is_expr(term):
+            expressions.append(term)
+        else:
+            constant += term
+
+    if constant != 0:
+        expressions.append(constant)
+
+    if len(expressions) == 0:
+        return constant
+    elif len(expressions) == 1:
+        return expressions[0]
+
+    return Sum(expressions)
+
+
+def matrix_vector_multiplication(matrix: Union[SparseMatrix, np.ndarray, List[List]], vector: List) -> List:
+    """
+    Product of a matrix with a vector of complex values.
+    Only the nonzero entries of the matrix are multiplied, each output element is one flat sum.
+    :param matrix: sparse matrix, concrete numpy matrix or matrix of (symbolic) entries.
+    :param vector: vector of ComplexVals.
+    :return: product vector.
+    """
+    matrix = SparseMatrix.from_dense(matrix)
+
+    if matrix.num_columns != len(vector):
+        raise Exception(f'Matrix column count ({matrix.num_columns}) has to be equal to vector row count ({len(vector)}).')
+
+    output_vector = []
+
+    for row in matrix.rows:
+        real_terms = []
+        imag_terms = []
+
+        for (k, entry) in row:
+            _product_terms(entry, vector[k], real_terms, imag_terms)
+
+        output_vector.append(ComplexVal(flat_sum(real_terms), flat_sum(imag_terms)))
 
     return output_vector
@@ -3,11 +3,11 @@ from typing import List, Union, Callable
 
 import numpy as np
 
-from quantum_constraint_solver.symqv.constants import I_matrix, SWAP_matrix
+from quantum_constraint_solver.symqv.constants import I_matrix
 from quantum_constraint_solver.symqv.expressions.complex import ComplexVal
 from quantum_constraint_solver.symqv.expressions.qbit import QbitVal
 from quantum_constraint_solver.symqv.globals import precision_format
-from quantum_constraint_solver.symqv.utils_file.arithmetic import matmul, kron
+from quantum_constraint_solver.symqv.utils_file.arithmetic import kron
 
 pi = '(acos -1.0)'  # round(math.pi, 10) #3.141593
 
@@ -98,6 +98,62 @@ def identity_pad_gate(gate: np.ndarray, gate_qbits: List[int], num_qbits: int) -
     return identity_padded_gate
 
 
+def padded_gate_qbits(gate: np.ndarray, gate_qbits: List[int]) -> List[int]:
+    """
+    System qbits a gate acts on when identity padded: the gate starts at the lowest of its qbits.
+    :param gate: gate matrix.
+    :param gate_qbits: qbit indices of the gate.
+    :return: qbit indices in the order of the gate's tensor factors.
+    """
+    start = min(gate_qbits)
+    return [start + i for i in range(int(np.log2(gate.shape[0])))]
+
+
+def non_adjacent_gate_qbits(gate_qbits: List[int]) -> List[int]:
+    """
+    System qbits a two-qbit gate acts on when applied to non-adjacent qbits through SWAP gates.
+    The SWAP network moves the first qbit behind the second one, so the gate's first factor acts on the second qbit.
+    :param gate_qbits: the indices of the qbits to which the gate should be applied to.
+    :return: qbit indices in the order of the gate's tensor factors.
+    """
+    if gate_qbits[0] > gate_qbits[1]:
+        raise Exception("Reverse is not supported.")
+
+    return [gate_qbits[1], gate_qbits[0]]
+
+
+def apply_gate(gate: np.ndarray, gate_qbits: List[int], num_qbits: int, operand: np.ndarray) -> np.ndarray:
+    """
+    Apply a gate to some qbits of a state vector (or of each column of a matrix) by tensor contraction,
+    without building the 2^n x 2^n matrix of the gate.
+    :param gate: gate matrix, its first tensor factor is the most significant qbit.
+    :param gate_qbits: system qbits in the order of the gate's tensor factors.
+    :param num_qbits: number of qbits in the system.
+    :param operand: state vector of dimension 2^n or matrix with 2^n rows.
+    :return: gate applied to the operand.
+    """
+    k = len(gate_qbits)
+    tensor = operand.reshape([2] * num_qbits + list(operand.shape[1:]))
+    gate_tensor = gate.reshape([2] * (2 * k))
+
+    # contract the gate's input axes with the target axes, its output axes then come first
+    result = np.tensordot(gate_tensor, tensor, axes=(list(range(k, 2 * k)), gate_qbits))
+    result = np.moveaxis(result, list(range(k)), gate_qbits)
+
+    return result.reshape(operand.shape)
+
+
+def embed_gate(gate: np.ndarray, gate_qbits: List[int], num_qbits: int) -> np.ndarray:
+    """
+    Dense 2^n x 2^n matrix of a gate acting on some qbits, for encodings that need the full matrix.
+    :param gate: gate matrix.
+    :param gate_qbits: system qbits in the order of the gate's tensor factors.
+    :param num_qbits: number of qbits in the system.
+    :return: embedded gate.
+    """
+    return apply_gate(gate, gate_qbits, num_qbits, np.eye(2 ** num_qbits, dtype=gate.dtype))
+
+
 def identity_pad_single_qbit_gates(gates: List[np.ndarray], gate_qbits: List[int], num_qbits: int) -> np.ndarray:
     """
     Combine multiple single qbit gates while identity padding them.
@@ -120,29 +176,13 @@ def identity_pad_single_qbit_gates(gates: List[np.ndarray], gate_qbits: List[int
 def swap_transform_non_adjacent_gate(gate: np.ndarray, gate_qbits: List[int], num_qbits: int) -> np.ndarray:
     """
     Use SWAP gates to apply a two-qbit gate to non-adjacent qbits.
+    The SWAP network only permutes qbits, so the gate is embedded directly on the permuted qbits.
     :param gate: two-qbit gate meant for two non-adjacent qbits.
     :param gate_qbits: the indices of the qbits to which the gate should be applied to.
     :param num_qbits: number of qbits in circuit.
     :return: Matrix that realizes the gate application to the non-adjacent qbits.
     """
-    if gate_qbits[0] > gate_qbits[1]:
-        raise Exception("Reverse is not supported.")
-
-    num_gate_qbits = gate_qbits[1] - gate_qbits[0] + 1
-    swap_gates = []
-
-    for i in range(num_gate_qbits - 1):
-        swap_gates.append(identity_pad_gate(SWAP_matrix, [i, i + 1], num_gate_qbits))
-
-    identity_padded_gate = identity_pad_gate(gate, [gate_qbits[1] - 1, gate_qbits[1]], num_gate_qbits)
-
-    gates = swap_gates \
-            + [identity_padded_gate] \
-            + swap_gates[::-1]
-
-    transformed_gate = matmul(gates)
-
-    return identity_pad_gate(transformed_gate, [i for i in range(gate_qbits[0], gate_qbits[1] + 1)], num_qbits)
+    return embed_gate(gate, non_adjacent_gate_qbits(gate_qbits), num_qbits)
 
 
 def to_complex_matrix(matrix: Union[np.ndarray, List]) -> List:
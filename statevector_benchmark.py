@@ -0,0 +1,111 @@
+from optparse import OptionParser
+import random
+import timeit
+
+import numpy as np
+from qiskit import Aer, QuantumCircuit, transpile
+
+from concolic.symbolic_types.symbolic_circuit import NewQuantumCircuit
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.gate_ops import gate_params, make_gate_op
+
+
+# 验证内置的状态向量模拟器和Aer的结果一致，并比较每个量子分支的耗时
+# 分支的耗时包括：Aer采样(原来的方式)，qiskit的Statevector，内置模拟器
+
+def random_state(num_qubits):
+    state = np.random.normal(size=2 ** num_qubits) + 1j * np.random.normal(size=2 ** num_qubits)
+    return state / np.linalg.norm(state)
+
+
+def random_gates(num_qubits, length):
+    # 只使用qiskit电路上也有的门(symQV中的cnot就是qiskit的cx)
+    sizes = dict([(name, int(np.log2(statevector.gate_matrices[name]([0.1] * gate_params[name]).shape[0])))
+                  for name in statevector.gate_matrices if hasattr(QuantumCircuit, name)])
+    names = [name for name in sizes if sizes[name] <= num_qubits]
+    gates = []
+    for i in range(length):
+        name = random.choice(names)
+        num_gate_qubits = sizes[name]
+        params = [random.uniform(-np.pi, np.pi) for j in range(gate_params[name])]
+        gates.append(make_gate_op(name, params + random.sample(range(num_qubits), num_gate_qubits)))
+    return gates
+
+
+def qiskit_circuit(state, gates):
+    qc = NewQuantumCircuit(int(np.log2(len(state))))
+    qc.initialize(state)
+    for gate in gates:
+        getattr(qc, gate.name)(*(gate.params + gate.qubits))
+    return qc
+
+
+def aer_statevector(qc):
+    qc = qc.copy()
+    qc.save_statevector()
+    simulator = Aer.get_backend('aer_simulator_statevector')
+    return np.asarray(simulator.run(transpile(qc, simulator)).result().get_statevector())
+
+
+def validate(max_qubits, circuits, length):
+    failures = 0
+    for num_qubits in range(1, max_qubits + 1):
+        for i in range(circuits):
+            state = random_state(num_qubits)
+            gates = random_gates(num_qubits, length)
+            expected = aer_statevector(qiskit_circuit(state, gates))
+            actual = statevector.simulate(num_qubits, gates, state)
+            # 允许全局相位不同
+            if abs(abs(np.vdot(expected, actual)) - 1) > 1e-9:
+                failures += 1
+                print("mismatch:", num_qubits, gates)
+    print("validated %d circuits against Aer, %d mismatches" % (max_qubits * circuits, failures))
+    return failures == 0
+
+
+def aer_sampling_branch(state, gates, shots):
+    qc = qiskit_circuit(state, gates)
+    qc.measure_all()
+    simulator = Aer.get_backend('aer_simulator')
+    return simulator.run(transpile(qc, simulator), shots=shots).result().get_counts()
+
+
+def qiskit_exact_branch(state, gates):
+    return qiskit_circuit(state, gates).probabilities()
+
+
+def numpy_branch(state, gates):
+    return statevector.probabilities(statevector.simulate(int(np.log2(len(state))), gates, state))
+
+
+def measure(fun, number):
+    return min(timeit.repeat(fun, number=number, repeat=3)) / number
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-n", "--number", dest="max_qubits", type="int", help="Maximal number of qubits", default=6)
+    parser.add_option("-g", "--gates", dest="length", type="int", help="Gates per circuit", default=20)
+    parser.add_option("-c", "--circuits", dest="circuits", type="int", help="Validated circuits per qubit number", default=20)
+    parser.add_option("--shots", dest="shots", type="int", help="Shots of the Aer sampling branch", default=10000)
+    (options, args) = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+
+    if not validate(options.max_qubits, options.circuits, options.length):
+        exit(1)
+
+    print("%-8s %16s %16s %16s %10s" % ("qubits", "aer sampling ms", "statevector ms", "numpy ms", "speedup"))
+    for num_qubits in range(1, options.max_qubits + 1):
+        state = random_state(num_qubits)
+        gates = random_gates(num_qubits, options.length)
+        aer = measure(lambda: aer_sampling_branch(state, gates, options.shots), 5) * 1000
+        exact = measure(lambda: qiskit_exact_branch(state, gates), 20) * 1000
+        fast = measure(lambda: numpy_branch(state, gates), 200) * 1000
+        print("%-8d %16.3f %16.3f %16.3f %9.0fx" % (num_qubits, aer, exact, fast, aer / fast))
+
+    probabilities = numpy_branch(random_state(options.max_qubits), random_gates(options.max_qubits, options.length))
+    batched = measure(lambda: statevector.sample(probabilities, options.shots, batch=100), 20) * 1000
+    print("batched sampling: 100 x %d shots on %d qubits in %.3f ms" % (options.shots, options.max_qubits, batched))
@@ -0,0 +1,48 @@
+from optparse import OptionParser
+import timeit
+
+from concolic.symbolic_types import SymbolicInteger
+
+
+# 比较SymbolicInteger和普通int在常见运算上每秒可以执行的次数
+# 被测程序的内层循环中的运算都会经过SymbolicInteger，因此这部分的开销直接影响探索的速度
+
+cases = [("x + 1", lambda x: x + 1),
+         ("x * 3", lambda x: x * 3),
+         ("x % 7", lambda x: x % 7),
+         ("x ^ 5", lambda x: x ^ 5),
+         ("x < 10", lambda x: x < 10),
+         ("x == 3", lambda x: x == 3)]
+
+
+def loop(x, n):
+    # 模拟被测程序中的累加循环
+    for i in range(n):
+        x += 1
+    return x
+
+
+def measure(fun, value, number):
+    return number / min(timeit.repeat(lambda: fun(value), number=number, repeat=3))
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-n", "--number", dest="number", type="int", help="Operations per measurement", default=100000)
+    (options, args) = parser.parse_args()
+
+    concrete = 7
+    symbolic = SymbolicInteger("x", 7)
+
+    print("%-12s %16s %16s %10s" % ("operation", "int ops/s", "symbolic ops/s", "slowdown"))
+    for (name, fun) in cases:
+        int_rate = measure(fun, concrete, options.number)
+        sym_rate = measure(fun, symbolic, options.number)
+        print("%-12s %16.0f %16.0f %9.1fx" % (name, int_rate, sym_rate, int_rate / sym_rate))
+
+    length = 100
+    number = max(options.number // length, 1)
+    int_rate = measure(lambda x: loop(x, length), concrete, number) * length
+    sym_rate = measure(lambda x: loop(x, length), symbolic, number) * length
+    print("%-12s %16.0f %16.0f %9.1fx" % ("x += 1", int_rate, sym_rate, int_rate / sym_rate))
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("z3")
+pytest.importorskip("quantum_constraint_solver.symqv.expressions.complex")
+
+from quantum_constraint_solver.symqv.utils_file.arithmetic import SparseMatrix
+from quantum_constraint_solver.symqv.utils_file.helpers import embed_gate
+
+
+def _random_gate(num_qbits, seed):
+    rng = np.random.default_rng(seed)
+    gate = rng.normal(size=(2 ** num_qbits, 2 ** num_qbits)) + 1j * rng.normal(size=(2 ** num_qbits, 2 ** num_qbits))
+    # a few zeros, they must not show up in the sparse form
+    gate[0, 1] = 0
+    return gate
+
+
+@pytest.mark.parametrize("gate_qbits", [[0], [3], [1, 2], [2, 1], [0, 3], [3, 0, 1]])
+def test_from_gate_matches_the_embedded_gate(gate_qbits):
+    gate = _random_gate(len(gate_qbits), seed=len(gate_qbits))
+
+    sparse = SparseMatrix.from_gate(gate, gate_qbits, 4)
+
+    assert np.allclose(sparse.to_dense(), embed_gate(gate, gate_qbits, 4))
+    assert sparse.nonzeros() == np.count_nonzero(gate) * 2 ** (4 - len(gate_qbits))
+    assert all([[k for (k, _) in row] == sorted([k for (k, _) in row]) for row in sparse.rows])
+
+
+def test_from_gate_of_a_permutation_has_one_entry_per_row():
+    cnot = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+
+    sparse = SparseMatrix.from_gate(cnot, [2, 0], 3)
+
+    assert [len(row) for row in sparse.rows] == [1] * 8
+    # control q2 is the least significant bit, target q0 the most significant one
+    assert sparse.rows[0b001] == [(0b101, 1)]
+    assert sparse.rows[0b100] == [(0b100, 1)]
+
+
+def test_multiply():
+    first = SparseMatrix.from_gate(_random_gate(1, seed=1), [0], 3)
+    second = SparseMatrix.from_gate(_random_gate(2, seed=2), [2, 1], 3)
+
+    product = second.multiply(first)
+
+    assert np.allclose(product.to_dense(), second.to_dense() @ first.to_dense())
+
+
+def test_multiply_drops_cancelled_entries():
+    h = SparseMatrix.from_gate(np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2), [1], 2)
+
+    identity = h.multiply(h)
+
+    assert identity.nonzeros() == 4
+    assert np.allclose(identity.to_dense(), np.eye(4))
@@ -0,0 +1,73 @@
+from concolic.cex_cache import CounterexampleCache
+
+
+def _never(model):
+    raise AssertionError("the model should not be evaluated")
+
+
+def test_exact_hit():
+    cache = CounterexampleCache()
+    cache.store(frozenset(["a", "b"]), {"x": 1})
+
+    assert cache.lookup(frozenset(["b", "a"]), _never) == (True, {"x": 1})
+    assert cache.hits == 1
+
+
+def test_unsat_subset_prunes_superset():
+    cache = CounterexampleCache()
+    cache.store(frozenset(["a", "b"]), None)
+
+    assert cache.lookup(frozenset(["a", "b", "c"]), _never) == (True, None)
+    assert cache.lookup(frozenset(["a", "c"]), _never) == (False, None)
+
+
+def test_superset_model_is_reused_without_evaluation():
+    cache = CounterexampleCache()
+    cache.store(frozenset(["a", "b", "c"]), {"x": 1})
+
+    assert cache.lookup(frozenset(["a", "b"]), _never) == (True, {"x": 1})
+
+
+def test_subset_model_is_checked():
+    cache = CounterexampleCache()
+    cache.store(frozenset(["a"]), {"x": 1})
+
+    assert cache.lookup(frozenset(["a", "b"]), lambda model: False) == (False, None)
+    assert cache.lookup(frozenset(["a", "b"]), lambda model: model["x"] == 1) == (True, {"x": 1})
+
+
+def test_lookup_evaluates_a_bounded_number_of_models():
+    cache = CounterexampleCache(probes=4)
+    for i in range(100):
+        cache.store(frozenset(["a", "x%d" % i]), {"x": i})
+    evaluated = []
+
+    def satisfies(model):
+        evaluated.append(model)
+        return False
+
+    assert cache.lookup(frozenset(["a", "b"]), satisfies) == (False, None)
+    assert len(evaluated) == 0
+    cache.store(frozenset(["b"]), {"x": -1})
+    assert cache.lookup(frozenset(["a", "b", "c"]), satisfies) == (False, None)
+    assert len(evaluated) <= 4
+    assert {"x": -1} in evaluated
+
+
+def test_eviction_updates_index():
+    cache = CounterexampleCache(max_size=2)
+    cache.store(frozenset(["a"]), None)
+    cache.store(frozenset(["b"]), None)
+    cache.store(frozenset(["c"]), None)
+
+    assert "a" not in cache.index
+    assert cache.lookup(frozenset(["a", "d"]), _never) == (False, None)
+    assert cache.lookup(frozenset(["c", "d"]), _never) == (True, None)
+
+
+def test_shared_file(tmp_path):
+    path = str(tmp_path / "cex.db")
+    CounterexampleCache(path=path).store(frozenset(["a", "b"]), None)
+
+    cache = CounterexampleCache(path=path)
+    assert cache.lookup(frozenset(["a", "b", "c"]), _never) == (True, None)
@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("z3")
+pytest.importorskip("quantum_constraint_solver.symqv.operations.gates")
+
+from quantum_constraint_solver.symqv.expressions.qbit import Qbits
+from quantum_constraint_solver.symqv.models.circuit import Circuit
+from quantum_constraint_solver.symqv.operations.gates import CNOT, H, X
+
+
+def test_gate_list_with_non_adjacent_gate_applies_every_gate():
+    qbits = Qbits(["q0", "q1", "q2"])
+    (q0, q1, q2) = qbits
+
+    parallel = Circuit(qbits, program=[[X(q1), CNOT(q0, q2)]]).unitary()
+    sequential = Circuit(qbits, program=[X(q1), CNOT(q0, q2)]).unitary()
+
+    assert np.allclose(parallel, sequential)
+
+
+def test_fused_states_are_allocated_by_the_state_sequence():
+    qbits = Qbits(["q0", "q1"])
+    (q0, q1) = qbits
+    circuit = Circuit(qbits, program=[H(q0), CNOT(q0, q1), X(q1)])
+
+    assert str(circuit.final_state(fuse_gates=False)[0].r) == 'psi_3_0.r'
+    assert str(circuit.final_state(fuse_gates=True)[0].r) == 'psi_1_0.r'
+    assert set([name for name in circuit.smt_writer.declarations if name.startswith('psi_')]) == \
+           set([f'psi_{k}_{j}.{part}' for k in range(2) for j in range(4) for part in 'ri'])
+
+
+def test_embedded_run_is_the_sparse_unitary():
+    qbits = Qbits(["q0", "q1", "q2"])
+    (q0, q1, q2) = qbits
+    circuit = Circuit(qbits, program=[H(q0), CNOT(q0, q2), [X(q1), H(q2)], CNOT(q2, q1)])
+
+    embedded = circuit._embedded_run(circuit.program)
+
+    assert np.allclose(embedded.matrix, circuit.unitary())
+    # the CNOTs and X permute the entries, each H doubles them: 4 nonzeros per row
+    assert embedded.sparse.nonzeros() == 8 * 4
@@ -0,0 +1,152 @@
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("z3")
+pytest.importorskip("qiskit")
+pytest.importorskip("quantum_constraint_solver.symqv.expressions.qbit")
+
+import concolic.explore as explore
+from concolic.cex_cache import CounterexampleCache
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.gate_ops import parse_gate_op
+
+
+def _engine(quantum_solver):
+    engine = explore.ExplorationEngine.__new__(explore.ExplorationEngine)
+    engine.quantum_solver = quantum_solver
+    engine.solver_queries = engine.solver_flips = 0
+    engine.candidates = 1
+    engine.candidate_queries = engine.candidate_found = engine.candidate_flips = engine.candidate_total = 0
+    engine.symbolic_inputs = {"qc": types.SimpleNamespace(qubits_num=1)}
+    return engine
+
+
+def _query(op, target, result, gates=("h(0)",)):
+    gates = tuple(parse_gate_op(gate) for gate in gates)
+    expr = types.SimpleNamespace(op=op, args=(None, gates, target, 0.01))
+    return types.SimpleNamespace(symtype=types.SimpleNamespace(expr=expr), result=result,
+                                 getVars=lambda: ["qc"])
+
+
+def test_solver_state_that_flips_the_branch_is_used(monkeypatch):
+    calls = []
+
+    def solver(num_qbits, operations, prob_constraint, flag, method, delta):
+        calls.append((flag, method))
+        return [1, 1j], 0.0
+
+    monkeypatch.setattr(explore, "quantum_constraint_solver", solver)
+    engine = _engine("numeric")
+    # h|+i> is uniform, the branch == (1, 0) was taken as True before
+    state = engine._solveCircuitState(_query("==", (1.0, 0.0), True))
+
+    assert calls == [("!=", "numeric")]
+    assert np.allclose(state, np.array([1, 1j]) / np.sqrt(2))
+    assert (engine.solver_queries, engine.solver_flips) == (1, 1)
+
+
+def test_solver_state_that_does_not_flip_is_rejected(monkeypatch):
+    monkeypatch.setattr(explore, "quantum_constraint_solver", lambda *args: ([1, 0], 0.0))
+    engine = _engine("numeric")
+    # h|0> is uniform as well, so the branch == (0.5, 0.5) stays True
+    assert engine._solveCircuitState(_query("==", (0.5, 0.5), True)) is None
+    assert (engine.solver_queries, engine.solver_flips) == (1, 0)
+
+
+def test_solver_failure_falls_back(monkeypatch):
+    def solver(*args):
+        raise Exception("dReal not found")
+
+    monkeypatch.setattr(explore, "quantum_constraint_solver", solver)
+    engine = _engine("smt")
+    assert engine._solveCircuitState(_query("==", (0.5, 0.5), True)) is None
+
+
+def _seeded_candidates(monkeypatch):
+    random_states = statevector.random_states
+    monkeypatch.setattr(statevector, "random_states", lambda num_qubits, count: random_states(num_qubits, count, seed=1))
+
+
+def test_candidate_that_flips_the_branch_is_returned(monkeypatch):
+    _seeded_candidates(monkeypatch)
+    engine = _engine(None)
+    engine.candidates = 64
+    # the branch p0 > 0.5 was False before, a flipping state has p0 >= 0.49 after h
+    state = engine._findCircuitState([], _query(">", ((0, 0.5),), False))
+
+    after_h = statevector.probabilities(statevector.unitary(1, [parse_gate_op("h(0)")]) @ np.array(state))
+    assert after_h[0] >= 0.49
+    assert (engine.candidate_queries, engine.candidate_found, engine.candidate_total) == (1, 1, 64)
+    assert 0 < engine.candidate_flips < 64
+    assert "1 of 1 queries flipped" in engine.candidateReport()
+
+
+def test_no_candidate_flips_the_branch(monkeypatch):
+    _seeded_candidates(monkeypatch)
+    engine = _engine(None)
+    engine.candidates = 64
+    # no probability is below zero, nothing flips the False branch
+    state = engine._findCircuitState([], _query("<", ((0, -1.0),), False))
+
+    assert np.allclose(state, statevector.random_states(1, 64)[:, 0])
+    assert (engine.candidate_queries, engine.candidate_found, engine.candidate_flips) == (1, 0, 0)
+    assert "0 of 1 queries flipped, 0.0% of the candidates" in engine.candidateReport()
+
+
+def test_candidate_must_keep_the_earlier_branches(monkeypatch):
+    _seeded_candidates(monkeypatch)
+    engine = _engine(None)
+    engine.candidates = 64
+    # the outer branch p0 > 0.3 was True and the inner p0 < 0.5 False, a flip keeping both needs 0.29 <= p0 <= 0.51
+    outer = _query(">", ((0, 0.3),), True, gates=())
+    inner = _query("<", ((0, 0.5),), False, gates=())
+    state = engine._findCircuitState([outer], inner)
+
+    assert 0.29 <= statevector.probabilities(np.array(state))[0] <= 0.51
+    assert engine.candidate_found == 1
+    alone = _engine(None)
+    alone.candidates = 64
+    alone._findCircuitState([], inner)
+    assert engine.candidate_flips < alone.candidate_flips
+
+
+def test_no_candidate_keeps_the_earlier_branches(monkeypatch):
+    _seeded_candidates(monkeypatch)
+    engine = _engine(None)
+    engine.candidates = 64
+    # the outer branch needs p0 >= 0.79 and flipping the inner one p1 >= 0.49
+    outer = _query(">", ((0, 0.8),), True, gates=())
+    inner = _query(">", ((1, 0.5),), False, gates=())
+    engine._findCircuitState([outer], inner)
+
+    assert (engine.candidate_found, engine.candidate_flips) == (0, 0)
+
+
+def test_worker_stats_are_summed_by_the_coordinator(monkeypatch):
+    worker = _engine(None)
+    worker.solver = types.SimpleNamespace(query_stats=[{"checks": 1}], cache=CounterexampleCache(8))
+    worker.solver.cache.hits = 5
+
+    def find_model(asserts, query):
+        worker.candidate_queries += 1
+        worker.candidate_flips += 3
+        worker.solver.query_stats.append({"checks": 2})
+        worker.solver.cache.misses += 1
+        return None
+
+    worker._findModel = find_model
+    monkeypatch.setattr(explore, "_worker", worker)
+    coordinator = _engine(None)
+    coordinator.solver = types.SimpleNamespace(query_stats=[], cache=CounterexampleCache(8))
+
+    for _ in range(2):
+        stats, result = explore._workerExplore({}, [], _query("==", (0.5, 0.5), True), [])
+        assert result is None
+        coordinator._addStats(stats)
+
+    # only what the tasks did is returned, not what the worker counted before
+    assert (coordinator.candidate_queries, coordinator.candidate_flips) == (2, 6)
+    assert coordinator.solver.query_stats == [{"checks": 2}, {"checks": 2}]
+    assert (coordinator.solver.cache.hits, coordinator.solver.cache.misses) == (0, 2)
@@ -0,0 +1,53 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("z3")
+pytest.importorskip("quantum_constraint_solver.symqv.expressions.complex")
+
+from quantum_constraint_solver.symqv.gate_cache import GateCache
+from quantum_constraint_solver.symqv.utils_file.arithmetic import SparseMatrix
+
+
+def identity(num_qbits):
+    return lambda: SparseMatrix.from_gate(np.eye(2, dtype=complex), [0], num_qbits)
+
+
+def test_hit_returns_shared_gate():
+    cache = GateCache()
+    first = cache.get("a", identity(2))
+
+    assert cache.get("a", identity(2)) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(None, identity(2)) is not first
+
+
+def test_bounded_by_bytes():
+    gate_size = GateCache().get("a", identity(3)).nbytes
+    cache = GateCache(max_bytes=2 * gate_size)
+    cache.get("a", identity(3))
+    cache.get("b", identity(3))
+    cache.get("a", identity(3))
+    cache.get("c", identity(3))
+
+    # b was the least recently used gate
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size == 2 * gate_size
+
+
+def test_gate_larger_than_cache_is_not_kept():
+    cache = GateCache(max_bytes=GateCache().get("small", identity(2)).nbytes)
+    cache.get("small", identity(2))
+    large = cache.get("large", identity(4))
+
+    assert large.matrix.shape == (16, 16)
+    assert list(cache.entries) == ["small"]
+
+
+def test_only_the_sparse_form_is_kept():
+    cnot = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+    gate = GateCache().get("cx", lambda: SparseMatrix.from_gate(cnot, [0, 1], 3))
+
+    assert "matrix" not in vars(gate)
+    assert gate.sparse.nonzeros() == 8
+    # the dense matrix is only built on demand
+    assert np.allclose(gate.matrix, np.kron(cnot, np.eye(2)))
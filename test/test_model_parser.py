@@ -0,0 +1,93 @@
+from quantum_constraint_solver.symqv.model_parser import Interval, ModelParser, parse_model
+
+
+def _feed(lines):
+    parser = ModelParser()
+    for line in lines:
+        parser.feed(line)
+    return parser
+
+
+def test_z3_model():
+    sat_result, model = parse_model('sat\n'
+                                    '(\n'
+                                    '  (define-fun b () Bool\n'
+                                    '    true)\n'
+                                    '  (define-fun a () Real\n'
+                                    '    0.5)\n'
+                                    ')\n')
+
+    assert sat_result == 'sat'
+    assert list(model.items()) == [('b', True), ('a', 0.5)]
+
+
+def test_dreal_intervals():
+    sat_result, model = parse_model('delta-sat with delta = 0.0001\n'
+                                    '(model\n'
+                                    '  (define-fun psi_0 () Real [0.70710, 0.70712])\n'
+                                    '  (define-fun psi_1 () Real [-0.5, -0.25])\n'
+                                    ')\n')
+
+    assert sat_result == 'δ-sat with δ = 0.0001'
+    assert isinstance(model['psi_0'], Interval)
+    assert model['psi_0'] == [0.7071, 0.70712]
+    assert model['psi_1'] == [-0.5, -0.25]
+
+
+def test_negative_and_rational_values():
+    sat_result, model = parse_model('sat\n'
+                                    '(model\n'
+                                    '  (define-fun a () Real (- 0.5))\n'
+                                    '  (define-fun b () Real (/ 1.0 4.0))\n'
+                                    '  (define-fun c () Real (- (/ 3.0 4.0)))\n'
+                                    '  (define-fun d () Real 0.3333333333?)\n'
+                                    '  (define-fun e () Real (/ x 2.0))\n'
+                                    ')\n')
+
+    assert model['a'] == -0.5
+    assert model['b'] == 0.25
+    assert model['c'] == -0.75
+    assert model['d'] == 0.3333333333
+    # not a number, kept as the parsed expression
+    assert model['e'] == ['/', 'x', '2.0']
+
+
+def test_define_fun_spanning_several_lines():
+    parser = _feed(['sat', '(', '  (define-fun', '     a', '     ()', '     Real', '     (-', '       (/ 1.0',
+                    '          8.0)))', '  (define-fun b () Real 2.0)'])
+    # the model is read when its outer expression is complete
+    assert len(parser.model) == 0
+
+    parser.feed(')')
+    assert list(parser.model.items()) == [('a', -0.125), ('b', 2.0)]
+
+
+def test_errors_are_collected():
+    parser = _feed(['(error "line 3 column 10: unknown constant x")', '(error)'])
+    assert parser.errors == ['line 3 column 10: unknown constant x', '']
+
+    # a new answer drops the errors of the previous one
+    parser.feed('sat')
+    assert parser.errors == []
+    parser.feed('(error "line 5 column 1: model is not available")')
+    assert parser.sat_result == 'sat'
+    assert parser.errors == ['line 5 column 1: model is not available']
+    assert len(parser.model) == 0
+
+
+def test_new_answer_resets_the_model():
+    parser = _feed(['sat', '(model', '  (define-fun a () Real 1.0)', ')', 'unsat'])
+    assert parser.sat_result == 'unsat'
+    assert len(parser.model) == 0
+
+    # the solver was restarted in the middle of an answer
+    parser = _feed(['sat', '(model', '  (define-fun a () Real 1.0)', '  (define-fun b () Real',
+                    'sat', '(model', '  (define-fun c () Real 3.0)', ')'])
+    assert parser.sat_result == 'sat'
+    assert list(parser.model.items()) == [('c', 3.0)]
+
+
+def test_names_starting_with_a_sat_result_are_not_answers():
+    parser = _feed(['sat', '(model', '  (define-fun satisfied () Bool', 'false)', ')'])
+    assert parser.sat_result == 'sat'
+    assert list(parser.model.items()) == [('satisfied', False)]
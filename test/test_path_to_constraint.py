@@ -0,0 +1,52 @@
+import pickle
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from concolic.path_to_constraint import PathToConstraint
+from concolic.symbolic_types import SymbolicInteger, symbolic_type
+
+
+def _program(a, b):
+    if a > 0:
+        if b == a + 1:
+            return 1
+        return 2
+    if b < 3:
+        return 3
+    return 4
+
+
+def _run(path, values):
+    symbolic_type.SymbolicObject.SI = path
+    path.reset(None)
+    try:
+        _program(SymbolicInteger("a", values[0]), SymbolicInteger("b", values[1]))
+    finally:
+        symbolic_type.SymbolicObject.SI = None
+
+
+def _tree(constraint):
+    return [(str(c.predicate), c.processed, _tree(c)) for c in constraint.children]
+
+
+def test_merged_paths_build_the_same_tree_as_whichBranch():
+    executions = [(1, 0), (1, 2), (-1, 0), (1, 2), (-1, 5), (0, 3)]
+
+    added = []
+    sequential = PathToConstraint(lambda c: added.append(str(c.predicate)))
+    for values in executions:
+        _run(sequential, values)
+
+    # every worker records its own execution, the predicates travel pickled to the coordinator
+    merged_added = []
+    merged = PathToConstraint(lambda c: merged_added.append(str(c.predicate)))
+    for values in executions:
+        worker = PathToConstraint(lambda c: None)
+        _run(worker, values)
+        merged.mergePath(pickle.loads(pickle.dumps(worker.getCurrentPath())))
+
+    assert _tree(merged.root_constraint) == _tree(sequential.root_constraint)
+    assert merged_added == added
+    assert len(added) == 6
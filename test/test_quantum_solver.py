@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("z3")
+pytest.importorskip("quantum_constraint_solver.symqv.expressions.qbit")
+
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.qiskit_plugin import operations_to_program
+from quantum_constraint_solver.quantum_solver import neq_probabilities, gt_probabilities, lt_probabilities, \
+    numeric_constraint_solver, qubit_components, combine_component_states, decomposed_constraint_solver
+from quantum_constraint_solver.symqv.expressions.qbit import Qbits
+from quantum_constraint_solver.symqv.models.circuit import Circuit
+
+
+def _final_probabilities(num_qbits, operations, state):
+    circuit = Circuit(Qbits([f"q{i}" for i in range(num_qbits)]), program=operations_to_program(num_qbits, operations))
+    return np.abs(np.array(circuit.unitary(), dtype=complex) @ np.array(state, dtype=complex)) ** 2
+
+
+def test_neq_probabilities_leave_the_branch_delta():
+    np.random.seed(0)
+    probabilities = neq_probabilities([0.25, 0.25, 0.25, 0.25], 4, 0.1)
+
+    assert np.all(np.abs(probabilities - 0.25) > 0.1)
+
+
+def test_bounds_reject_states_out_of_range():
+    assert gt_probabilities([(4, 0.5)], 4) is None
+    assert gt_probabilities([(-1, 0.5)], 4) is None
+    assert lt_probabilities([(4, 0.5)], 4) is None
+    assert gt_probabilities([(3, 0.5)], 4)[3] > 0.5
+    assert lt_probabilities([(3, 0.1)], 4)[3] < 0.1
+
+
+def test_numeric_solver_flips_eq_branch_by_its_delta():
+    np.random.seed(0)
+    operations = ["h(0)", "cx(0,1)"]
+
+    (state, _) = numeric_constraint_solver(2, operations, [0.25, 0.25, 0.25, 0.25], "!=", delta=0.1)
+
+    probabilities = statevector.probabilities(statevector.simulate(2, operations, state))
+    assert np.all(np.abs(probabilities - 0.25) > 0.1)
+
+
+def test_components_of_a_circuit():
+    assert qubit_components(5, ["h(0)", "cx(0,3)", "ry(0.3,1)", "h(4)", "cx(4,1)"]) == [[0, 3], [1, 4], [2]]
+    assert qubit_components(3, ["ccx(0,1,2)"]) == [[0, 1, 2]]
+
+
+def test_decomposed_solver_on_eq():
+    np.random.seed(0)
+    operations = ["h(0)", "cx(0,2)", "ry(0.3,1)"]
+    components = qubit_components(3, operations)
+    marginals = [[0.1, 0.2, 0.3, 0.4], [0.75, 0.25]]
+    target = combine_component_states(3, components, marginals).real
+
+    (state, _) = decomposed_constraint_solver(3, operations, list(target), "==")
+
+    assert np.isclose(np.linalg.norm(state), 1)
+    assert np.allclose(_final_probabilities(3, operations, state), target)
+
+
+def test_decomposed_solver_needs_a_product_target():
+    operations = ["h(0)", "cx(0,2)", "ry(0.3,1)"]
+    # qubit 1 is only 1 when qubits 0 and 2 are 1, the target does not factor
+    entangled = [0.5, 0, 0, 0, 0, 0, 0, 0.5]
+
+    assert decomposed_constraint_solver(3, operations, entangled, "==") is None
+    assert decomposed_constraint_solver(3, operations, [0.125] * 8, "!=") is None
+    assert decomposed_constraint_solver(2, ["h(0)", "cx(0,1)"], [0.5, 0, 0, 0.5], "==") is None
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from concolic.constraint import Constraint
+from concolic.search_strategy import createFrontier
+
+
+def _tree():
+    # root -> a -> (a1 -> a11, a2), root -> b
+    root = Constraint(None, None)
+    a = root.addChild("a")
+    a1 = a.addChild("a1")
+    a11 = a1.addChild("a11")
+    a2 = a.addChild("a2")
+    b = root.addChild("b")
+    return root, [a, a1, a11, a2, b]
+
+
+def _drain(frontier):
+    order = []
+    while len(frontier) > 0:
+        order.append(frontier.select().predicate)
+    return order
+
+
+def test_bfs_is_first_in_first_out():
+    frontier = createFrontier("bfs")
+    for c in _tree()[1]:
+        frontier.add(c)
+    assert _drain(frontier) == ["a", "a1", "a11", "a2", "b"]
+
+
+def test_dfs_is_last_in_first_out():
+    frontier = createFrontier("dfs")
+    for c in _tree()[1]:
+        frontier.add(c)
+    assert _drain(frontier) == ["b", "a2", "a11", "a1", "a"]
+
+
+def test_shortest_orders_by_path_length_then_creation():
+    frontier = createFrontier("shortest")
+    for c in reversed(_tree()[1]):
+        frontier.add(c)
+    assert _drain(frontier) == ["a", "b", "a1", "a2", "a11"]
+
+
+def test_new_result_first_prefers_constraints_of_productive_runs():
+    (_, (a, a1, a11, a2, b)) = _tree()
+    frontier = createFrontier("new-result")
+    frontier.add(a)
+    frontier.add(a1)
+    frontier.executionFinished(False)
+    frontier.add(a11)
+    frontier.add(a2)
+    frontier.executionFinished(True)
+    # b is still in the current run when select is called, it counts as an unproductive one
+    frontier.add(b)
+    assert len(frontier) == 5
+    assert _drain(frontier) == ["a11", "a2", "a", "a1", "b"]
+
+
+def test_random_path_selects_every_constraint_once():
+    random.seed(1)
+    frontier = createFrontier("random-path")
+    for c in _tree()[1]:
+        frontier.add(c)
+    order = _drain(frontier)
+    assert sorted(order) == ["a", "a1", "a11", "a2", "b"]
+    assert len(frontier) == 0
+
+
+def test_random_path_favours_shallow_constraints():
+    # b is chosen at the root with probability 1/2, a11 is below three random choices
+    random.seed(2)
+    first = []
+    for _ in range(400):
+        frontier = createFrontier("random-path")
+        for c in _tree()[1]:
+            frontier.add(c)
+        first.append(frontier.select().predicate)
+    assert first.count("b") > 150
+    assert first.count("a11") < first.count("b")
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        createFrontier("best-first")
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("qiskit")
+
+from concolic.symbolic_types import SymbolicInteger
+
+
+def test_constants_fold_away():
+    x = SymbolicInteger("x", 3)
+
+    assert (x + 1 + 1 - 2).toString() == "x#3"
+    assert (x * 2 - x).toString() == "x#3"
+    assert (2 * (x + 1) - 2 * x) == 2
+    assert type(2 * (x + 1) - 2 * x) is int
+
+
+def test_equal_linear_expressions_share_one_node():
+    x = SymbolicInteger("x", 3)
+    y = SymbolicInteger("y", 4)
+
+    assert (x + y).expr is (y + x).expr
+    assert (x + y).toString() == "(+ x#3, y#4)"
+    assert (x * y + 1 - 1).expr is (x * y).expr
+    assert (x * y - x * y) == 0
+
+
+def test_equalities_move_constants_to_the_right():
+    x = SymbolicInteger("x", 3)
+    y = SymbolicInteger("y", 4)
+
+    assert (x + 1 == y - 2).toString() == "(== (- x#3, y#4), -3)"
+    assert ((x + 2) * 3 == 9).toString() == "(== (* x#3, 3), 3)"
+    # without variables the comparison is decided while building it
+    assert (x - x == 0) is True
+    assert (x + y != y + x) is False
+
+
+def test_inequalities_are_not_rearranged():
+    # moving terms across < is not sound on bitvectors because of overflow
+    x = SymbolicInteger("x", 3)
+    y = SymbolicInteger("y", 4)
+
+    assert (x - y + 2 < 5).toString() == "(< (+ (- x#3, y#4), 2), 5)"
@@ -0,0 +1,99 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+z3 = pytest.importorskip("z3")
+pytest.importorskip("quantum_constraint_solver.symqv.expressions.complex")
+
+from quantum_constraint_solver.symqv.expressions.complex import ComplexVal
+from quantum_constraint_solver.symqv.model_parser import parse_model
+from quantum_constraint_solver.symqv.smt_writer import SmtWriter
+from quantum_constraint_solver.symqv.utils_file.arithmetic import SparseMatrix, matrix_vector_multiplication, \
+    state_equals, state_equals_value
+
+Z3 = shutil.which('z3') or shutil.which('z3', path=os.path.dirname(sys.executable))
+
+H = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+S = np.diag([1, 1j])
+CNOT = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+
+
+def _state(name, size):
+    return [ComplexVal(z3.Real(f'{name}_{i}_r'), z3.Real(f'{name}_{i}_i')) for i in range(size)]
+
+
+# the same circuit step encoded by the writer and by the former path: z3 terms, solver.sexpr(), distinct -> =
+def _encodings(extra_assertions):
+    previous = _state('psi_0', 4)
+    following = _state('psi_1', 4)
+    matrix = SparseMatrix.from_gate(CNOT, [0, 1], 2).multiply(SparseMatrix.from_gate(S @ H, [0], 2))
+    initial = np.array([0.6, 0.8j, 0, 0])
+    # the initialization written with != relies on the distinct -> = rewrite, as in the circuit model
+    assertions = [previous[0].r != initial[0].real] + \
+                 [state_equals_value(element, value) for (element, value) in zip(previous[1:], initial[1:])] + \
+                 extra_assertions(following)
+
+    writer = SmtWriter(rewrites={'distinct': '='})
+    writer.add_state_equation(following, matrix, previous)
+
+    for assertion in assertions:
+        writer.add(assertion)
+
+    solver = z3.Solver()
+    solver.add(state_equals(following, matrix_vector_multiplication(matrix, previous)))
+    solver.add(assertions)
+
+    expected = matrix.to_dense().astype(complex) @ initial
+    return writer, solver.sexpr().replace('distinct', '='), expected
+
+
+def _solve(smt):
+    solver = z3.Solver()
+    solver.from_string(smt)
+    result = solver.check()
+
+    if result != z3.sat:
+        return result, None
+
+    model = solver.model()
+    return result, dict((d.name(), float(model[d].as_fraction())) for d in model.decls())
+
+
+def test_writer_matches_the_solver_sexpr():
+    writer, sexpr, expected = _encodings(lambda state: [])
+    smt = writer.to_string(commands='')
+
+    assert 'distinct' not in smt
+    (result, model) = _solve(smt)
+    assert (result, model) == _solve(sexpr)
+    assert result == z3.sat
+    assert model['psi_0_0_r'] == pytest.approx(0.6)
+
+    for (i, value) in enumerate(expected):
+        assert model[f'psi_1_{i}_r'] == pytest.approx(value.real)
+        assert model[f'psi_1_{i}_i'] == pytest.approx(value.imag)
+
+
+def test_writer_matches_the_solver_sexpr_when_unsat():
+    writer, sexpr, expected = _encodings(lambda state: [state[3].i == 0.5])
+
+    assert _solve(writer.to_string(commands=''))[0] == z3.unsat
+    assert _solve(sexpr)[0] == z3.unsat
+
+
+@pytest.mark.skipif(Z3 is None, reason='z3 binary not found')
+def test_writer_output_is_accepted_by_the_z3_binary():
+    writer, sexpr, expected = _encodings(lambda state: [])
+    output = subprocess.run([Z3, '-in'], input=writer.to_string(), capture_output=True, text=True).stdout
+
+    (sat_result, model) = parse_model(output)
+    assert sat_result == 'sat'
+    assert 'error' not in output
+
+    for (i, value) in enumerate(expected):
+        assert model[f'psi_1_{i}_r'] == pytest.approx(value.real)
+        assert model[f'psi_1_{i}_i'] == pytest.approx(value.imag)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from quantum_constraint_solver.symqv.solver_pool import SolverPool, get_pool, split_script
+
+# answers every (get-model) with a model spanning several lines, every (check-sat) with sat
+# and every (echo "...") with its string
+FAKE_SOLVER = r'''
+import re
+import sys
+for line in sys.stdin:
+    if "(get-model)" in line:
+        print("(\n  (define-fun x () Real\n    1.0)\n)", flush=True)
+    elif "(check-sat)" in line:
+        print("sat", flush=True)
+    for text in re.findall(r'\(echo "([^"]*)"\)', line):
+        print(text, flush=True)
+'''
+
+MODEL = '(\n  (define-fun x () Real\n    1.0)\n)\n'
+
+Z3 = shutil.which('z3') or shutil.which('z3', path=os.path.dirname(sys.executable))
+
+
+def test_split_script():
+    smt = '(set-logic QF_NRA)\n(declare-fun x () Real)\n; (assert (= x 0))\n' \
+          '(define-fun |a(b| () Real 1.0)\n(assert (= x ";)"))\n(check-sat)\n(exit)\n'
+
+    header, declarations, commands = split_script(smt)
+
+    assert header == ['(set-logic QF_NRA)']
+    assert declarations == {'x': '(declare-fun x () Real)', '|a(b|': '(define-fun |a(b| () Real 1.0)'}
+    assert commands == ['(assert (= x ";)"))', '(check-sat)']
+
+
+def test_multi_line_model_followed_by_atom():
+    pool = SolverPool([sys.executable, '-c', FAKE_SOLVER], timeout=10)
+
+    try:
+        assert pool.solve('(get-model)\n(check-sat)\n') == MODEL + 'sat\n'
+        # nothing of the previous answer is left for the next query on the same process
+        assert pool.solve('(get-model)\n') == MODEL
+        assert pool.solve('(check-sat)\n(get-model)\n') == 'sat\n' + MODEL
+    finally:
+        pool.close()
+
+
+def test_pool_size():
+    command = [sys.executable, '-c', FAKE_SOLVER]
+
+    try:
+        assert len(get_pool(command, size=2).processes) == 2
+        # the shared pool is grown, never shrunk
+        assert len(get_pool(command, size=3).processes) == 3
+        assert len(get_pool(command).processes) == 3
+    finally:
+        get_pool(command).close()
+
+
+@pytest.mark.skipif(Z3 is None, reason='z3 binary not found')
+def test_error_does_not_shift_the_answers():
+    pool = SolverPool([Z3, '-in'], timeout=10)
+
+    try:
+        # y is not declared, z3 prints an error before the answer of (check-sat)
+        output = pool.solve('(declare-fun x () Int)\n(assert (= y 1))\n(check-sat)\n')
+        assert output.startswith('(error') and output.endswith('sat\n')
+
+        output = pool.solve('(declare-fun x () Int)\n(assert (= x 1))\n(assert (= x 2))\n(check-sat)\n')
+        assert output == 'unsat\n'
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(Z3 is None, reason='z3 binary not found')
+def test_queries_share_declarations_between_push_and_pop():
+    pool = SolverPool([Z3, '-in'], timeout=10)
+    process = pool.processes[0]
+
+    try:
+        assert pool.solve('(declare-fun x () Int)\n(assert (= x 1))\n(check-sat)\n') == 'sat\n'
+        # the assertion of the previous query is popped, the declaration is kept
+        assert pool.solve('(declare-fun x () Int)\n(declare-fun y () Int)\n(assert (= x 2))\n'
+                          '(assert (= y x))\n(check-sat)\n(get-value (y))\n') == 'sat\n((y 2))\n'
+        assert process.resets == 1
+
+        # x with another sort needs a fresh process state
+        assert pool.solve('(declare-fun x () Real)\n(assert (= x 0.5))\n(check-sat)\n') == 'sat\n'
+        assert process.resets == 2
+    finally:
+        pool.close()
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.gate_ops import GateOp, gate_params
+
+_params = (0.3, 1.1, -0.7, 0.4)
+_qubits = (2, 0, 1)
+# qiskit 1.0 removed the cnot alias
+_qiskit_names = {"cnot": "cx"}
+
+
+def _gate_op(name):
+    num_qubits = int(math.log2(statevector.gate_matrices[name](_params).shape[0]))
+    return GateOp(name, _qubits[:num_qubits], _params[:gate_params[name]])
+
+
+def _initial_state():
+    return statevector.random_states(3, 1, seed=7)[:, 0]
+
+
+def test_every_gate_has_a_matrix():
+    assert set(gate_params) == set(statevector.gate_matrices)
+
+
+def test_qubit_order_matches_qiskit():
+    # qubit 0 is the lowest bit: cx(0,1) maps |01> to |11>
+    state = statevector.simulate(2, ["x(0)", "cx(0,1)"])
+    assert np.allclose(state, [0, 0, 0, 1])
+
+
+@pytest.mark.parametrize("name", sorted(statevector.gate_matrices))
+def test_gate_matches_qiskit_statevector(name):
+    qiskit = pytest.importorskip("qiskit")
+    from qiskit.quantum_info import Statevector
+
+    gate_op = _gate_op(name)
+    circuit = qiskit.QuantumCircuit(3)
+    getattr(circuit, _qiskit_names.get(name, name))(*(gate_op.params + gate_op.qubits))
+    expected = Statevector(_initial_state()).evolve(circuit)
+
+    state = statevector.simulate(3, [gate_op], _initial_state())
+    assert np.allclose(state, expected.data)
+    assert np.allclose(statevector.probabilities(state), expected.probabilities())
+
+
+def test_unitary_matches_simulate():
+    gates = [_gate_op(name) for name in sorted(statevector.gate_matrices)]
+    state = statevector.simulate(3, gates, _initial_state())
+    assert np.allclose(statevector.unitary(3, gates) @ _initial_state(), state)
@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from quantum_constraint_solver import statevector
+from quantum_constraint_solver.statevector_cache import StatevectorCache
+
+
+def test_resumes_from_the_deepest_cached_prefix():
+    cache = StatevectorCache()
+    first = ["h(0)", "cx(0,1)", "x(1)"]
+    second = ["h(0)", "cx(0,1)", "z(0)"]
+
+    assert np.allclose(cache.simulate(2, first), statevector.simulate(2, first))
+    assert (cache.hits, cache.misses, cache.reused_gates, cache.applied_gates) == (0, 1, 0, 3)
+
+    assert np.allclose(cache.simulate(2, second), statevector.simulate(2, second))
+    assert (cache.hits, cache.misses, cache.reused_gates, cache.applied_gates) == (1, 1, 2, 4)
+
+    # the whole circuit is cached, nothing is applied
+    assert np.allclose(cache.simulate(2, first), statevector.simulate(2, first))
+    assert (cache.reused_gates, cache.applied_gates) == (5, 4)
+
+
+def test_initial_states_have_separate_roots():
+    cache = StatevectorCache()
+    one = [0, 1, 0, 0]
+
+    cache.simulate(2, ["h(0)"])
+    state = cache.simulate(2, ["h(0)"], one)
+
+    assert np.allclose(state, statevector.simulate(2, ["h(0)"], one))
+    assert cache.hits == 0
+    assert len(cache.roots) == 2
+
+
+def test_states_are_read_only():
+    state = StatevectorCache().simulate(1, ["h(0)"])
+    with pytest.raises(ValueError):
+        state[0] = 0
+
+
+def test_evicts_least_recently_used_states_by_bytes():
+    # a 1-qubit state takes 32 bytes, the cache holds 3 of them
+    cache = StatevectorCache(max_bytes=96)
+    cache.simulate(1, ["h(0)", "x(0)"])
+    assert cache.size == 96 and len(cache.entries) == 3
+
+    # one more gate evicts the initial state, the oldest entry
+    cache.simulate(1, ["h(0)", "x(0)", "z(0)"])
+    assert cache.size == 96 and len(cache.entries) == 3
+    root = next(iter(cache.roots.values()))
+    assert root.state is None
+
+    # the prefix h(0) is still cached even though the root was evicted
+    cache.simulate(1, ["h(0)", "y(0)"])
+    assert cache.hits == 2 and cache.reused_gates == 3
+    assert np.allclose(cache.simulate(1, ["h(0)", "y(0)"]), statevector.simulate(1, ["h(0)", "y(0)"]))
+    assert cache.size <= cache.max_bytes
+
+
+def test_evicted_leaves_are_pruned_from_the_tree():
+    cache = StatevectorCache(max_bytes=64)
+    cache.simulate(1, ["x(0)"])
+    cache.simulate(1, ["z(0)"])
+
+    # x(0) lost its state and has no children, so it is removed
+    root = next(iter(cache.roots.values()))
+    assert [str(gate) for gate in root.children] == ["z(0)"]
+    assert len(cache.entries) == 2
+
+
+def test_clear():
+    cache = StatevectorCache()
+    cache.simulate(2, ["h(0)"])
+    cache.clear()
+    assert cache.roots == {} and cache.size == 0 and cache.hit_rate() == 0.0
@@ -0,0 +1,155 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("qiskit")
+
+from concolic.symbolic_types.symbolic_circuit import MeasurementSchedule, SymbolicCircuit, check_bounds_batch, \
+    state_bounds
+from quantum_constraint_solver import statevector
+
+
+def test_the_likely_outcome_is_taken_and_the_other_one_recorded():
+    schedule = MeasurementSchedule()
+    schedule.start([])
+
+    assert schedule.decide(0.8) is True
+    assert schedule.decide(0.3) is False
+    assert schedule.taken == [True, False]
+    assert schedule.probability == pytest.approx(0.8 * 0.7)
+    assert [forced for (probability, forced) in schedule.pending] == [[False], [True, True]]
+    assert [probability for (probability, forced) in schedule.pending] == pytest.approx([0.2, 0.8 * 0.3])
+
+
+def test_next_follows_the_alternatives_by_probability():
+    schedule = MeasurementSchedule()
+    schedule.start([])
+    schedule.decide(0.8)
+    schedule.decide(0.3)
+
+    assert schedule.next() == [True, True]
+    assert schedule.probability == pytest.approx(0.24)
+    assert schedule.next() == [False]
+    assert schedule.probability == pytest.approx(0.2)
+    assert schedule.next() is None
+
+
+def test_forced_outcomes_keep_the_probability_of_the_prefix():
+    schedule = MeasurementSchedule()
+    schedule.start([True, True], 0.24)
+
+    # the forced outcomes are taken even when unlikely, the prefix probability is already known
+    assert schedule.decide(0.8) is True
+    assert schedule.decide(0.3) is True
+    assert schedule.probability == pytest.approx(0.24)
+    assert schedule.pending == []
+
+    # after the prefix the alternatives are weighted by it
+    assert schedule.decide(0.9) is True
+    assert schedule.probability == pytest.approx(0.24 * 0.9)
+    assert len(schedule.pending) == 1
+    assert schedule.pending[0][0] == pytest.approx(0.24 * 0.1)
+    assert schedule.pending[0][1] == [True, True, False]
+
+
+def test_unlikely_alternatives_are_dropped():
+    schedule = MeasurementSchedule()
+    schedule.start([])
+
+    schedule.decide(0.9995)
+    assert schedule.pending == []
+
+    # 0.05 on its own is kept, but not below a prefix of probability 0.01
+    schedule.start([], 0.01)
+    schedule.decide(0.95)
+    assert schedule.pending == []
+    schedule.start([])
+    schedule.decide(0.95)
+    assert len(schedule.pending) == 1
+
+
+def test_next_stops_when_nothing_is_pending():
+    schedule = MeasurementSchedule()
+    assert schedule.next() is None
+
+    schedule.start([])
+    schedule.decide(1.0)
+    schedule.decide(0.0)
+    assert schedule.taken == [True, False]
+    assert schedule.next() is None
+
+
+def _circuit(state, gates):
+    qc = SymbolicCircuit("qc", np.array(state, dtype=complex))
+    for (name, args) in gates:
+        getattr(qc, name)(*args)
+    return qc
+
+
+def test_exact_probabilities_use_the_qiskit_qubit_order():
+    # x on qubit 0 sets the least significant bit of the state index
+    qc = _circuit([1, 0, 0, 0], [("x", (0,))]).getConcrValue()
+    assert not qc.sampling
+    assert np.allclose(qc.exact_probabilities(), [0, 1, 0, 0])
+    qc = _circuit([1, 0, 0, 0], [("x", (1,))]).getConcrValue()
+    assert np.allclose(qc.exact_probabilities(), [0, 0, 1, 0])
+
+
+def test_exact_probabilities_match_the_statevector_simulator():
+    state = statevector.random_states(3, 1, seed=3)[:, 0]
+    gates = [("h", (0,)), ("cx", (0, 2)), ("ry", (0.3, 1)), ("t", (2,)), ("swap", (1, 2)), ("ccx", (0, 1, 2))]
+    symbolic = _circuit(state, gates)
+    qc = symbolic.getConcrValue()
+
+    expected = statevector.probabilities(statevector.simulate(3, symbolic.gates, state))
+    assert np.allclose(qc.exact_probabilities(), expected)
+    assert np.allclose(qc.probabilities(), expected)
+
+
+def test_bounds_are_inclusive():
+    # probabilities [0, 1, 0, 0], all the bounds below are exact in floating point
+    qc = _circuit([1, 0, 0, 0], [("x", (0,))]).getConcrValue()
+
+    assert qc.check_state_eq([0.125, 0.875, 0, 0], delta=0.125)
+    assert not qc.check_state_eq([0.125, 0.875, 0, 0], delta=0.0625)
+    assert qc.check_state_gt([(1, 1.125)], delta=0.125)
+    assert not qc.check_state_gt([(1, 1.25)], delta=0.125)
+    assert qc.check_state_gt([(0, 0.125)], delta=0.125)
+    assert qc.check_state_lt([(0, -0.125)], delta=0.125)
+    assert not qc.check_state_lt([(0, -0.25)], delta=0.125)
+    assert qc.check_state_lt([(1, 0.875)], delta=0.125)
+    assert not qc.check_state_gt([(2, 0.5)])
+    assert qc.check_state_lt([(2, 0.5)])
+
+
+@pytest.mark.parametrize("op", ["==", ">", "<"])
+def test_branches_match_the_bounds_on_the_simulated_probabilities(op):
+    rng = np.random.default_rng(7)
+    gates = [("h", (1,)), ("cx", (1, 0)), ("rx", (0.7, 0))]
+    for state in statevector.random_states(2, 20, seed=5).T:
+        symbolic = _circuit(state, gates)
+        probabilities = statevector.probabilities(statevector.simulate(2, symbolic.gates, state))
+        delta = 0.05
+        if op == "==":
+            target = list(probabilities + rng.uniform(-0.08, 0.08, size=4))
+            expected = all(abs(probabilities - target) <= delta)
+            branch = symbolic.check_state_eq(target, delta)
+        else:
+            target = [(int(s), float(rng.uniform(0, 1))) for s in rng.choice(4, size=2, replace=False)]
+            if op == ">":
+                expected = all(probabilities[s] >= p - delta for (s, p) in target)
+                branch = symbolic.check_state_gt(target, delta)
+            else:
+                expected = all(probabilities[s] <= p + delta for (s, p) in target)
+                branch = symbolic.check_state_lt(target, delta)
+
+        # the concrete branch, the expression read by the engine and the batched check agree
+        assert bool(branch) == expected
+        assert branch.expr.op == op
+        bounds = state_bounds(op, branch.expr.args[2], delta)
+        assert check_bounds_batch(bounds, probabilities[:, None])[0] == expected
+        assert symbolic.getConcrValue().check_bounds(bounds) == expected
+
+
+def test_unknown_branch_operator_is_rejected():
+    with pytest.raises(ValueError):
+        state_bounds("!=", [0.5, 0.5], 0.01)
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("qiskit")
+
+from concolic.symbolic_types import SymbolicCircuit, SymbolicInteger
+
+
+def test_expressions_of_two_executions_keep_their_values():
+    first = SymbolicInteger("a", 1) + 2 > 0
+    second = SymbolicInteger("a", 5) + 2 > 0
+
+    assert first.symbolicEq(second)
+    assert first.toString() == "(> (+ a#1, 2), 0)"
+    assert second.toString() == "(> (+ a#5, 2), 0)"
+
+
+def test_quantum_predicates_of_two_executions_keep_their_circuits():
+    first = SymbolicCircuit("qc", [1, 0])
+    first.x(0)
+    first_branch = first.check_state_eq([0, 1])
+    second = SymbolicCircuit("qc", [0, 1])
+    second.x(0)
+    second_branch = second.check_state_eq([0, 1])
+
+    assert first_branch.symbolicEq(second_branch)
+    assert first_branch.expr.args[0] is first
+    assert second_branch.expr.args[0] is second
+    assert bool(first_branch.getConcrValue())
+    assert not bool(second_branch.getConcrValue())
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip("z3")
+pytest.importorskip("qiskit")
+
+from concolic.predicate import Predicate
+from concolic.symbolic_types import SymbolicInteger
+from concolic.z3_wrap import VariablePartition, Z3Wrapper
+
+
+def test_unsat_outside_cone_does_not_prune_query():
+    a = SymbolicInteger("a", 0)
+    b = SymbolicInteger("b", 0)
+    # b > 5 and b < 3 contradict each other, but the query only depends on a
+    path = [Predicate(b > 5, True), Predicate(b < 3, True), Predicate(a > 1, True)]
+    solver = Z3Wrapper()
+
+    model = solver.findCounterexample(path[::-1], Predicate(a < 10, True))
+
+    assert model == {"a": 10}
+    assert not solver.unsat
+
+
+def test_unsat_inside_cone_is_reported():
+    a = SymbolicInteger("a", 0)
+    b = SymbolicInteger("b", 0)
+    path = [Predicate(b > 5, True), Predicate(b < 3, True), Predicate(a > 1, True)]
+    solver = Z3Wrapper()
+
+    assert solver.findCounterexample(path[::-1], Predicate(b == 4, False)) is None
+    assert solver.unsat
+
+
+def test_cached_model_check_uses_floor_division():
+    a = SymbolicInteger("a", 0)
+    solver = Z3Wrapper()
+    solver.asserts = [Predicate(a // 2 == -2, True)]
+    solver.query = Predicate(a > 0, True)
+
+    assert solver._satisfies({"a": -3})
+    assert not solver._satisfies({"a": -5})
+    assert not solver._satisfies({"b": 1})
+
+
+def test_partition_joins_variables_of_a_predicate():
+    a = SymbolicInteger("a", 0)
+    b = SymbolicInteger("b", 0)
+    c = SymbolicInteger("c", 0)
+    pa, pb, pc = Predicate(a > 1, True), Predicate(b > 1, True), Predicate(c > 1, True)
+    partition = VariablePartition()
+
+    partition.sync([pa, pb, pc])
+    assert len(partition.partitions()) == 3
+    assert partition.cone(Predicate(a < 5, True)) == [pa]
+
+    pab = Predicate(a + b > 3, True)
+    partition.sync([pa, pb, pc, pab])
+    assert len(partition.partitions()) == 2
+    assert partition.cone(Predicate(a < 5, True)) == [pa, pb, pab]
+    assert partition.cone(Predicate(c < 5, True)) == [pc]
+
+
+def test_partition_undoes_unions_when_the_path_changes():
+    a = SymbolicInteger("a", 0)
+    b = SymbolicInteger("b", 0)
+    c = SymbolicInteger("c", 0)
+    pa, pb = Predicate(a > 1, True), Predicate(b > 1, True)
+    partition = VariablePartition()
+    partition.sync([pa, pb, Predicate(a + b > 3, True), Predicate(c > 1, True)])
+
+    # only the common prefix is kept, the union of a and b and the variable c are undone
+    partition.sync([pa, pb, Predicate(b < 0, True)])
+    assert len(partition.partitions()) == 2
+    assert partition.cone(Predicate(a < 5, True)) == [pa]
+    assert "c" not in partition.parent
+    assert partition.size == {"a": 1, "b": 1}
+
+    partition.sync([])
+    assert partition.path == [] and partition.undo == []
+    assert partition.parent == {} and partition.size == {}